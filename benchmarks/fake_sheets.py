@@ -0,0 +1,229 @@
+"""In-process замена gspread_asyncio для нагрузочных прогонов без обращения к Google.
+
+Повторяет ту часть API клиента/таблицы/листа, которую использует core/g_sheets.py,
+и умеет имитировать задержку сети, ошибки 5xx, ответы 429 и таймауты уже
+применённой записи (для проверки идемпотентности).
+"""
+import asyncio
+import random
+import time
+from collections import Counter, defaultdict, deque
+from typing import Any, Dict, List, Optional
+
+import gspread
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, message: str):
+        self.status_code = status_code
+        self.text = message
+
+    def json(self):
+        return {"error": {"code": self.status_code, "message": self.text}}
+
+
+class FakeSheetsBackend:
+    """Общее состояние фейка: настройки сбоев, содержимое листов и счётчики вызовов."""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0, quota_per_minute: int = 0, lost_response_rate: float = 0.0,
+                 seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.quota_per_minute = quota_per_minute
+        self.lost_response_rate = lost_response_rate
+        self.random = random.Random(seed)
+        self.sheets: Dict[str, List[List[Any]]] = {}
+        self.col_counts: Dict[str, int] = {}
+        self.row_counts: Dict[str, int] = {}
+        self.hidden_columns: Dict[int, set] = {}
+        self.write_times: Dict[str, float] = {}
+        self.header: List[Any] = []
+        self.calls = Counter()
+        self.failures = Counter()
+        self.calls_by_credential = Counter()
+        self._recent_calls = defaultdict(deque)
+
+    @property
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+    async def api_call(self, method: str, credential: str = "default"):
+        """Квота, как и в Sheets API, считается отдельно для каждого сервисного аккаунта."""
+        self.calls[method] += 1
+        self.calls_by_credential[credential] += 1
+        delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            await asyncio.sleep(delay)
+        if self.quota_per_minute:
+            now = time.monotonic()
+            recent_calls = self._recent_calls[credential]
+            while recent_calls and now - recent_calls[0] > 60:
+                recent_calls.popleft()
+            if len(recent_calls) >= self.quota_per_minute:
+                self._fail(method, 429, "Quota exceeded for quota metric 'Write requests' per minute per user.")
+            recent_calls.append(now)
+        if self.rate_limit_rate and self.random.random() < self.rate_limit_rate:
+            self._fail(method, 429, "Rate limit exceeded.")
+        if self.error_rate and self.random.random() < self.error_rate:
+            self._fail(method, 500, "Internal error encountered.")
+
+    def written_rows(self) -> int:
+        return sum(1 for rows in self.sheets.values() for row in rows if row and row != self.header)
+
+    def duplicate_rows(self) -> int:
+        seen, duplicates = set(), 0
+        for rows in self.sheets.values():
+            for row in rows:
+                if row == self.header:
+                    continue
+                if row and row[0] in seen:
+                    duplicates += 1
+                elif row:
+                    seen.add(row[0])
+        return duplicates
+
+    def _fail(self, method: str, status_code: int, message: str):
+        self.failures[(method, status_code)] += 1
+        raise gspread.exceptions.APIError(FakeResponse(status_code, message))
+
+
+class FakeWorksheet:
+    def __init__(self, backend: FakeSheetsBackend, title: str, sheet_id: int, credential: str = "default"):
+        self.backend = backend
+        self.credential = credential
+        self.title = title
+        self.id = sheet_id
+
+    @property
+    def rows(self) -> List[List[Any]]:
+        return self.backend.sheets[self.title]
+
+    @property
+    def col_count(self) -> int:
+        return self.backend.col_counts.get(self.title, 26)
+
+    @property
+    def row_count(self) -> int:
+        return self.backend.row_counts.get(self.title, 1000)
+
+    def _record_write(self, method: str, values: List[List[Any]]):
+        now = time.monotonic()
+        for row in values:
+            if row:
+                self.backend.write_times.setdefault(str(row[0]), now)
+        if self.backend.lost_response_rate and self.backend.random.random() < self.backend.lost_response_rate:
+            self.backend._fail(method, 503, "The service is currently unavailable (response lost).")
+
+    async def append_rows(self, values: List[List[Any]], value_input_option=None, **kwargs):
+        await self.backend.api_call("append_rows", self.credential)
+        self.rows.extend(list(row) for row in values)
+        self.backend.row_counts[self.title] = max(self.row_count, len(self.rows))
+        self._record_write("append_rows", values)
+        return {"updates": {"updatedRows": len(values)}}
+
+    async def update(self, values: List[List[Any]], range_name: str = "A1", value_input_option=None, **kwargs):
+        await self.backend.api_call("update", self.credential)
+        start_row, _ = gspread.utils.a1_to_rowcol(range_name)
+        last_row = start_row + len(values) - 1
+        if last_row > self.row_count:
+            self.backend._fail("update", 400, f"Range ('{self.title}'!{range_name}) exceeds grid limits. "
+                                              f"Max rows: {self.row_count}")
+        while len(self.rows) < last_row:
+            self.rows.append([])
+        for offset, row in enumerate(values):
+            self.rows[start_row - 1 + offset] = list(row)
+        self._record_write("update", values)
+        return {"updatedRows": len(values)}
+
+    async def batch_get(self, ranges: List[str], **kwargs) -> List[List[List[Any]]]:
+        await self.backend.api_call("batch_get", self.credential)
+        result = []
+        for range_name in ranges:
+            start, end = range_name.split(":")
+            if start.isdigit():
+                result.append([[str(value) for value in self.rows[int(start) - 1]]] if len(self.rows) >= int(start) else [])
+                continue
+            col = gspread.utils.a1_to_rowcol(f"{start}1")[1]
+            values = [[str(row[col - 1])] if len(row) >= col and row[col - 1] != "" else [] for row in self.rows]
+            while values and not values[-1]:
+                values.pop()
+            result.append(values)
+        return result
+
+    async def col_values(self, col: int, **kwargs) -> List[Optional[str]]:
+        await self.backend.api_call("col_values", self.credential)
+        values = [str(row[col - 1]) if len(row) >= col and row[col - 1] != "" else None for row in self.rows]
+        while values and values[-1] is None:
+            values.pop()
+        return values
+
+
+class FakeSpreadsheet:
+    def __init__(self, backend: FakeSheetsBackend, key: str, credential: str = "default"):
+        self.backend = backend
+        self.credential = credential
+        self.id = key
+        self.title = f"Fake {key}"
+
+    async def batch_update(self, body: dict) -> dict:
+        await self.backend.api_call("batch_update", self.credential)
+        titles = list(self.backend.sheets)
+        for request in body.get("requests", []):
+            if "appendDimension" in request:
+                append = request["appendDimension"]
+                counts, default = ((self.backend.col_counts, 26) if append["dimension"] == "COLUMNS"
+                                   else (self.backend.row_counts, 1000))
+                title = titles[append["sheetId"]]
+                counts[title] = counts.get(title, default) + append["length"]
+            if "updateDimensionProperties" in request:
+                dimension_range = request["updateDimensionProperties"]["range"]
+                self.backend.hidden_columns.setdefault(dimension_range["sheetId"], set()).update(
+                    range(dimension_range["startIndex"], dimension_range["endIndex"]))
+        return {"replies": [{} for _ in body.get("requests", [])]}
+
+    async def worksheet(self, title: str) -> FakeWorksheet:
+        await self.backend.api_call("worksheet", self.credential)
+        if title not in self.backend.sheets:
+            raise gspread.exceptions.WorksheetNotFound(title)
+        return FakeWorksheet(self.backend, title, list(self.backend.sheets).index(title), self.credential)
+
+    async def worksheets(self) -> List[FakeWorksheet]:
+        await self.backend.api_call("worksheets", self.credential)
+        return [FakeWorksheet(self.backend, title, index, self.credential) for index, title in enumerate(self.backend.sheets)]
+
+    async def add_worksheet(self, title: str, rows: int = 1000, cols: int = 26, index: int = None) -> FakeWorksheet:
+        await self.backend.api_call("add_worksheet", self.credential)
+        if title in self.backend.sheets:
+            self.backend._fail("add_worksheet", 400, f'A sheet with the name "{title}" already exists.')
+        self.backend.sheets[title] = []
+        self.backend.row_counts[title] = rows
+        self.backend.col_counts[title] = cols
+        return FakeWorksheet(self.backend, title, list(self.backend.sheets).index(title), self.credential)
+
+
+class FakeClient:
+    def __init__(self, backend: FakeSheetsBackend, credential: str = "default"):
+        self.backend = backend
+        self.credential = credential
+
+    async def open_by_key(self, key: str) -> FakeSpreadsheet:
+        await self.backend.api_call("open_by_key", self.credential)
+        return FakeSpreadsheet(self.backend, key, self.credential)
+
+
+class FakeClientManager:
+    """Заменяет AsyncioGspreadClientManager: authorize() не ходит в сеть."""
+
+    def __init__(self, backend: FakeSheetsBackend, sheet_names: List[str] = (), header: List[Any] = (),
+                 credential: str = "default"):
+        self.backend = backend
+        self.credential = credential
+        backend.header = [str(value) for value in header]
+        for name in sheet_names:
+            backend.sheets.setdefault(name, [list(backend.header)] if header else [])
+
+    async def authorize(self) -> FakeClient:
+        return FakeClient(self.backend, self.credential)
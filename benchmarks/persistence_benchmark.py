@@ -0,0 +1,242 @@
+"""Загрузка, запись и память persistence в зависимости от числа пользователей.
+
+Запуск из корня проекта:
+    python -m benchmarks.persistence_benchmark --users 1000 10000 100000 --flushes 10
+    python -m benchmarks.persistence_benchmark --users 10000 --legacy-bot-data
+
+Для каждого числа пользователей и каждого backend'а генерирует синтетические
+user_data, bot_data и словари разговоров того же вида, что у бота: частично
+заполненные анкеты кандидатов, ответы опроса о климате, состояние главного меню.
+Данные записываются во временную папку, затем в отдельном процессе измеряются:
+- время загрузки при старте (как в Application.initialize);
+- прирост RSS после загрузки;
+- время одного цикла сохранения, как его делает Application раз в update_interval:
+  изменились один пользователь, один ключ разговора и bot_data;
+- время до данных первого пользователя (для SQLite они читаются лениво).
+
+--legacy-bot-data добавляет в bot_data users_interacted и candidate_check_info,
+как было до переноса их в отдельные таблицы.
+"""
+import argparse
+import asyncio
+import json
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from copy import deepcopy
+from pathlib import Path
+
+from telegram.ext import PicklePersistence
+
+from core.persistence import SQLitePersistence
+from models import ClimateState, MainMenuState, RecruitmentState
+
+# Файл и конструктор в том виде, в каком их создаёт main.py
+BACKENDS = {
+    "pickle": ("bot_persistence.pkl", lambda path: PicklePersistence(filepath=path)),
+    "sqlite": ("bot_persistence.sqlite", lambda path: SQLitePersistence(filepath=path)),
+}
+
+RECRUITMENT_ANSWERS = [
+    ("full_name", lambda rng, uid: f"Иванов Иван {uid}"),
+    ("first_name", lambda rng, uid: "Иван"),
+    ("age", lambda rng, uid: str(rng.randint(18, 45))),
+    ("family_info", lambda rng, uid: "Живу с родителями, есть младший брат"),
+    ("vacancy_source", lambda rng, uid: rng.choice(["hh.ru", "Друзья", "Instagram", "Авито"])),
+    ("selected_vacancies", lambda rng, uid: rng.sample(["waiter", "cook", "barista", "host"], 2)),
+    ("applied_position", lambda rng, uid: "Официант, Бариста"),
+    ("reason_for_choice", lambda rng, uid: "Нравится работать с людьми, хочу развиваться в ресторанном деле."),
+    ("preferred_restaurant", lambda rng, uid: "Марчеллис на Невском"),
+    ("knows_marcellis", lambda rng, uid: rng.choice(["Да", "Нет"])),
+    ("night_shifts", lambda rng, uid: rng.choice(["Да", "Нет"])),
+    ("weekly_shifts", lambda rng, uid: str(rng.randint(2, 6))),
+    ("mobile_phone", lambda rng, uid: f"+79{rng.randint(100000000, 999999999)}"),
+    ("social_link", lambda rng, uid: f"https://vk.com/id{uid}"),
+    ("city", lambda rng, uid: "Санкт-Петербург"),
+    ("address", lambda rng, uid: "ул. Пушкина, д. 10, кв. 5"),
+    ("marital_status", lambda rng, uid: "Не женат / не замужем"),
+    ("children", lambda rng, uid: "Нет"),
+    ("health_assessment", lambda rng, uid: "Хорошее"),
+    ("attitude_to_appearance", lambda rng, uid: "Положительное"),
+    ("education_name", lambda rng, uid: "СПбГУ"),
+    ("graduation_year", lambda rng, uid: "2020"),
+]
+
+CLIMATE_KEYS = [
+    "climate_expectations", "climate_best_ability", "climate_praise", "climate_development_care",
+    "climate_opinion", "climate_mission", "climate_colleague_success", "climate_friends",
+    "climate_growth_opportunity", "climate_support", "climate_importance", "climate_team_part",
+]
+
+CONVERSATION_NAMES = ("recruitment_conv", "climate_survey_conv", "main_conversation_handler")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark of persistence load/flush time and memory against user count")
+    parser.add_argument("--users", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=list(BACKENDS))
+    parser.add_argument("--flushes", type=int, default=10, help="Сколько циклов сохранения измерять")
+    parser.add_argument("--recruiting-share", type=float, default=0.3, help="Доля пользователей посреди анкеты")
+    parser.add_argument("--climate-share", type=float, default=0.2, help="Доля пользователей посреди опроса")
+    parser.add_argument("--legacy-bot-data", action="store_true")
+    parser.add_argument("--seed", type=int, default=1)
+    # Внутренние режимы: каждый замер идёт в отдельном процессе, чтобы RSS не смешивался.
+    parser.add_argument("--child", choices=["prepare", "measure"], help=argparse.SUPPRESS)
+    parser.add_argument("--backend", help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def make_population(users: int, args) -> tuple:
+    rng = random.Random(args.seed)
+    user_data = {}
+    conversations = {name: {} for name in CONVERSATION_NAMES}
+    for user_id in range(1, users + 1):
+        key = (user_id, user_id)
+        conversations["main_conversation_handler"][key] = MainMenuState.MAIN
+        roll = rng.random()
+        if roll < args.recruiting_share:
+            answered = rng.randint(1, len(RECRUITMENT_ANSWERS))
+            data = {"conversations": {"recruitment_conv": True}, "chat_id": user_id,
+                    "preselected_restaurant_code": "nevsky", "preselected_restaurant_name": "Марчеллис на Невском",
+                    "current_question_num": answered + 1}
+            data.update({name: make(rng, user_id) for name, make in RECRUITMENT_ANSWERS[:answered]})
+            user_data[user_id] = data
+            conversations["recruitment_conv"][key] = rng.choice(list(RecruitmentState))
+        elif roll < args.recruiting_share + args.climate_share:
+            answered = rng.randint(0, len(CLIMATE_KEYS))
+            data = {"_in_climate_survey": True, "chat_id": user_id, "climate_restaurant": "Марчеллис на Невском",
+                    "climate_restaurant_code": "nevsky", "climate_gender": rng.choice(["Мужской", "Женский"]),
+                    "climate_position": "Официант", "climate_recommend": str(rng.randint(1, 10))}
+            data.update({name: rng.choice(["Да", "Нет", "Скорее да"]) for name in CLIMATE_KEYS[:answered]})
+            user_data[user_id] = data
+            conversations["climate_survey_conv"][key] = rng.choice(list(ClimateState))
+        else:
+            user_data[user_id] = {}
+
+    bot_data = {"last_telegram_update_ts": time.time()}
+    if args.legacy_bot_data:
+        bot_data["users_interacted"] = set(range(1, users + 1))
+        bot_data["candidate_check_info"] = {
+            user_id: {"position": "Официант", "full_name": f"Иванов Иван {user_id}", "address": "ул. Пушкина, д. 10",
+                      "phone": "+79990000000", "timestamp": time.time()}
+            for user_id in range(1, users + 1, 10)
+        }
+    return user_data, bot_data, conversations
+
+
+def current_rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # Не Linux: пиковый RSS (на macOS в байтах, на Linux в килобайтах).
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+async def prepare(args):
+    user_data, bot_data, conversations = make_population(args.users[0], args)
+    path = Path(args.path)
+    # Заполнение не измеряется; on_flush=True, чтобы pickle не переписывался на каждый ключ.
+    if args.backend == "pickle":
+        persistence = PicklePersistence(filepath=path, on_flush=True)
+    else:
+        persistence = SQLitePersistence(filepath=path)
+    await persistence.get_bot_data()
+    for user_id, data in user_data.items():
+        await persistence.update_user_data(user_id, data)
+    await persistence.update_bot_data(bot_data)
+    for name, states in conversations.items():
+        for key, state in states.items():
+            await persistence.update_conversation(name, key, state)
+    await persistence.flush()
+
+
+async def measure(args):
+    path = Path(args.path)
+    rng = random.Random(args.seed + 1)
+    users = args.users[0]
+
+    rss_before = current_rss_mb()
+    persistence = BACKENDS[args.backend][1](path)
+    started = time.perf_counter()
+    user_data = await persistence.get_user_data()
+    await persistence.get_chat_data()
+    bot_data = await persistence.get_bot_data()
+    for name in CONVERSATION_NAMES:
+        await persistence.get_conversations(name)
+    load_seconds = time.perf_counter() - started
+    rss_mb = current_rss_mb() - rss_before
+
+    user_id = rng.randint(1, users)
+    started = time.perf_counter()
+    await persistence.refresh_user_data(user_id, dict(user_data.get(user_id, {})))
+    first_user_seconds = time.perf_counter() - started
+
+    flush_timings = []
+    for _ in range(args.flushes):
+        user_id = rng.randint(1, users)
+        data = dict(user_data.get(user_id, {}))
+        await persistence.refresh_user_data(user_id, data)
+        data["current_question_num"] = data.get("current_question_num", 0) + 1
+        bot_data["last_telegram_update_ts"] = time.time()
+        started = time.perf_counter()
+        await asyncio.gather(
+            persistence.update_bot_data(deepcopy(bot_data)),
+            persistence.update_user_data(user_id, deepcopy(data)),
+            persistence.update_conversation("recruitment_conv", (user_id, user_id), RecruitmentState.AGE),
+        )
+        await persistence.flush()
+        flush_timings.append(time.perf_counter() - started)
+
+    size_mb = sum(p.stat().st_size for p in path.parent.glob(f"{path.name}*")) / 1024 / 1024
+    print(json.dumps({
+        "load": load_seconds, "rss_mb": rss_mb, "first_user": first_user_seconds,
+        "flush_avg": statistics.mean(flush_timings), "flush_max": max(flush_timings), "size_mb": size_mb,
+    }))
+
+
+def run_child(mode: str, backend: str, users: int, path: Path, args) -> str:
+    command = [sys.executable, "-m", "benchmarks.persistence_benchmark", "--child", mode, "--backend", backend,
+               "--path", str(path), "--users", str(users), "--flushes", str(args.flushes),
+               "--recruiting-share", str(args.recruiting_share), "--climate-share", str(args.climate_share),
+               "--seed", str(args.seed)]
+    if args.legacy_bot_data:
+        command.append("--legacy-bot-data")
+    return subprocess.run(command, check=True, capture_output=True, text=True).stdout
+
+
+def format_ms(seconds: float) -> str:
+    return f"{seconds * 1000:.1f} ms"
+
+
+def run(args):
+    print(f"{'users':>8} {'backend':>8} {'load':>11} {'RSS':>9} {'1st user':>10} "
+          f"{'flush avg':>11} {'flush max':>11} {'on disk':>9}")
+    for users in args.users:
+        with tempfile.TemporaryDirectory() as tmp:
+            for backend in args.backends:
+                path = Path(tmp) / BACKENDS[backend][0]
+                run_child("prepare", backend, users, path, args)
+                result = json.loads(run_child("measure", backend, users, path, args).strip().splitlines()[-1])
+                print(f"{users:>8} {backend:>8} {format_ms(result['load']):>11} {result['rss_mb']:>6.1f} MB "
+                      f"{format_ms(result['first_user']):>10} {format_ms(result['flush_avg']):>11} "
+                      f"{format_ms(result['flush_max']):>11} {result['size_mb']:>6.1f} MB")
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    if arguments.child == "prepare":
+        asyncio.run(prepare(arguments))
+    elif arguments.child == "measure":
+        asyncio.run(measure(arguments))
+    else:
+        run(arguments)
@@ -0,0 +1,145 @@
+"""Нагрузочный прогон batch writer'а Google Sheets на фейковом клиенте.
+
+Запуск из корня проекта:
+    python -m benchmarks.sheets_writer_benchmark --rows 2000 --latency 0.3 --error-rate 0.01 --quota-per-minute 60
+
+Ставит N строк в sheets_queue (во временной БД) по всем листам из settings, запускает
+batch_writer_task и печатает время разбора очереди, число API-вызовов на строку
+и задержку от постановки в очередь до записи (p50/p99).
+"""
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from core import settings
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark of the Google Sheets batch writer")
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--enqueue-rate", type=float, default=0, help="Строк в секунду; 0 - всё сразу")
+    parser.add_argument("--latency", type=float, default=0.2, help="Задержка одного API-вызова, сек")
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Доля ответов 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Доля ответов 429")
+    parser.add_argument("--lost-response-rate", type=float, default=0.0,
+                        help="Доля записей, применённых в таблице, но завершившихся ошибкой 503")
+    parser.add_argument("--quota-per-minute", type=int, default=0,
+                        help="Квота вызовов в минуту на сервисный аккаунт; 0 - без квоты")
+    parser.add_argument("--credentials", type=int, default=1, help="Число сервисных аккаунтов в пуле")
+    parser.add_argument("--strategy", default=settings.SHEETS_CREDENTIAL_STRATEGY, choices=["round_robin", "least_throttled"])
+    parser.add_argument("--batch-size", type=int, default=settings.SHEETS_BATCH_SIZE)
+    parser.add_argument("--max-rows-per-worksheet", type=int, default=settings.SHEETS_MAX_ROWS_PER_WORKSHEET)
+    parser.add_argument("--batch-interval", type=float, default=0.5)
+    parser.add_argument("--retry-wait", type=float, default=0.5)
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args()
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class _BenchBot:
+    def __init__(self):
+        self.notifications = 0
+
+    async def send_message(self, *args, **kwargs):
+        self.notifications += 1
+
+
+class _BenchApplication:
+    def __init__(self):
+        self.bot = _BenchBot()
+        self.bot_data = {}
+
+
+async def count_pending() -> int:
+    result = await database.execute_query("SELECT COUNT(*) as count FROM sheets_queue WHERE is_processed = 0", fetch="one")
+    return result['count'] if result else 0
+
+
+async def enqueue_rows(sheet_names, rows: int, rate: float, enqueue_times: dict):
+    for i in range(rows):
+        marker = f"bench-{i}"
+        enqueue_times[marker] = time.monotonic()
+        await database.add_to_sheets_db_queue(sheet_names[i % len(sheet_names)], [marker, "benchmark", i])
+        if rate:
+            await asyncio.sleep(1 / rate)
+
+
+async def run(args):
+    sheet_names = sorted({value for key, value in vars(settings).items() if key.endswith("_SHEET_NAME")})
+    backend = FakeSheetsBackend(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                                rate_limit_rate=args.rate_limit_rate, quota_per_minute=args.quota_per_minute,
+                                lost_response_rate=args.lost_response_rate, seed=args.seed)
+    sheets_pool = SheetsClientPool(
+        [SheetsCredential(f"sa-{i + 1}", FakeClientManager(backend, sheet_names, header=["Маркер", "Источник", "№"],
+                                                           credential=f"sa-{i + 1}"))
+         for i in range(args.credentials)],
+        strategy=args.strategy, cooldown_seconds=settings.SHEETS_CREDENTIAL_COOLDOWN_SECONDS)
+    application = _BenchApplication()
+
+    await database.init_db()
+    enqueue_times = {}
+    stop_event = asyncio.Event()
+    started = time.monotonic()
+    enqueue_task = asyncio.create_task(enqueue_rows(sheet_names, args.rows, args.enqueue_rate, enqueue_times))
+    writer = asyncio.create_task(g_sheets.batch_writer_task(application, stop_event, sheets_pool, application.bot_data))
+
+    while time.monotonic() - started < args.timeout:
+        await asyncio.sleep(0.1)
+        if enqueue_task.done() and await count_pending() == 0:
+            break
+    drain_time = time.monotonic() - started
+
+    stop_event.set()
+    writer.cancel()
+    await asyncio.gather(writer, enqueue_task, return_exceptions=True)
+
+    latencies = [backend.write_times[marker] - ts for marker, ts in enqueue_times.items() if marker in backend.write_times]
+    written = backend.written_rows()
+    dead = await database.count_sheets_dead_letter()
+
+    print(f"Листов: {len(sheet_names)}, строк поставлено: {args.rows}, записано: {written}, в dead letter: {dead}, "
+          f"осталось в очереди: {await count_pending()}, дублей: {backend.duplicate_rows()}")
+    print(f"Листов после ротации: {len(backend.sheets)}")
+    print(f"Время разбора очереди: {drain_time:.2f} c ({written / drain_time:.1f} строк/с)")
+    print(f"API-вызовов: {backend.total_calls} ({backend.total_calls / max(written, 1):.3f} на строку) "
+          f"{dict(backend.calls)}")
+    if args.credentials > 1:
+        print(f"Вызовов по аккаунтам: {dict(backend.calls_by_credential)}")
+    if backend.failures:
+        print(f"Сбоев API: {dict(backend.failures)}")
+    if latencies:
+        print(f"Задержка очередь→запись: p50={statistics.median(latencies):.2f} c, "
+              f"p99={percentile(latencies, 99):.2f} c, max={max(latencies):.2f} c")
+    print(f"Уведомлений админам: {application.bot.notifications}")
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    # Настройки нужно поменять до импорта g_sheets: из них собираются retry и circuit breaker.
+    settings.BATCH_INTERVAL = arguments.batch_interval
+    settings.SHEETS_BATCH_SIZE = arguments.batch_size
+    settings.SHEETS_MAX_ROWS_PER_WORKSHEET = arguments.max_rows_per_worksheet
+    settings.SHEETS_RETRY_MIN_WAIT_SECONDS = arguments.retry_wait
+    settings.SHEETS_RETRY_MAX_WAIT_SECONDS = arguments.retry_wait
+    settings.SHEETS_BREAKER_RECOVERY_SECONDS = max(arguments.retry_wait * 4, 1)
+    settings.SHEETS_CREDENTIAL_COOLDOWN_SECONDS = max(arguments.retry_wait * 4, 1)
+    settings.ADMIN_IDS = {0}
+
+    from core import database, g_sheets
+    from core.sheets_pool import SheetsClientPool, SheetsCredential
+    from benchmarks.fake_sheets import FakeClientManager, FakeSheetsBackend
+
+    database.DATABASE_FILE = Path(tempfile.mkdtemp()) / "sheets_benchmark.sqlite"
+    asyncio.run(run(arguments))
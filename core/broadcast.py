@@ -0,0 +1,204 @@
+"""Фоновые рассылки.
+
+Задание и статус каждого получателя хранятся в broadcast_jobs / broadcast_recipients,
+поэтому после перезапуска рассылка продолжается с тех, кому ещё не отправлено.
+Воркер отправляет не быстрее BROADCAST_MESSAGES_PER_SECOND и периодически
+редактирует сообщение с прогрессом у админа, запустившего рассылку. RetryAfter
+выдерживает и повторяет общий лимитер (core/rate_limiter.py); если он исчерпал
+попытки, получатель остаётся в очереди.
+"""
+import asyncio
+import json
+import logging
+import time
+from datetime import timedelta
+from typing import Awaitable, Callable, List, Optional
+
+from telegram import InlineKeyboardMarkup
+from telegram.error import BadRequest, Forbidden, RetryAfter, TelegramError
+from telegram.ext import Application
+
+from core import settings, database
+from core.rate_limiter import RequestPriority
+
+logger = logging.getLogger(__name__)
+
+STATUS_PENDING = "pending"
+STATUS_SENT = "sent"
+STATUS_FAILED = "failed"
+STATUS_BLOCKED = "blocked"
+
+BlockedUsersCallback = Callable[[List[int]], Awaitable[None]]
+
+_new_job_event = asyncio.Event()
+
+
+def retry_after_seconds(error: RetryAfter) -> float:
+    retry_after = error.retry_after
+    return retry_after.total_seconds() if isinstance(retry_after, timedelta) else float(retry_after)
+
+
+def format_progress(job: dict, counts: dict, finished: bool = False) -> str:
+    total = sum(counts.values())
+    sent, blocked, failed = counts.get(STATUS_SENT, 0), counts.get(STATUS_BLOCKED, 0), counts.get(STATUS_FAILED, 0)
+    header = "✅ <b>Рассылка завершена</b>" if finished else "📣 <b>Рассылка идёт</b>"
+    return (f"{header} (#{job['id']})\n"
+            f"Отправлено: {sent} из {total}\n"
+            f"Заблокировали бота: {blocked}, ошибки: {failed}\n"
+            f"Осталось: {counts.get(STATUS_PENDING, 0)}")
+
+
+async def start_broadcast(application: Application, kind: str, text: str, reply_markup: Optional[InlineKeyboardMarkup],
+                          created_by: int, user_ids: List[int]) -> Optional[int]:
+    """Создаёт задание и сообщение с прогрессом; отправкой занимается broadcast_worker_task."""
+    job_id = await database.create_broadcast_job(
+        kind, text, reply_markup.to_json() if reply_markup else None, created_by, user_ids
+    )
+    if job_id is None:
+        return None
+    try:
+        message = await application.bot.send_message(
+            created_by, format_progress({"id": job_id}, {STATUS_PENDING: len(set(user_ids))}), parse_mode="HTML"
+        )
+        await database.set_broadcast_progress_message(job_id, message.chat_id, message.message_id)
+    except TelegramError as e:
+        logger.warning(f"Could not send progress message for broadcast {job_id}: {e}")
+    logger.info(f"Broadcast {job_id} ({kind}) created by {created_by} for {len(user_ids)} recipients.")
+    _new_job_event.set()
+    return job_id
+
+
+async def has_running_broadcast() -> bool:
+    return bool(await database.get_running_broadcast_jobs())
+
+
+class BroadcastSender:
+    """Отправка одного задания с бюджетом сообщений в секунду."""
+
+    def __init__(self, application: Application, job: dict, on_blocked: Optional[BlockedUsersCallback]):
+        self.application = application
+        self.job = job
+        self.on_blocked = on_blocked
+        self.reply_markup = (InlineKeyboardMarkup.de_json(json.loads(job['reply_markup_json']), application.bot)
+                             if job['reply_markup_json'] else None)
+        self.interval = 1 / settings.BROADCAST_MESSAGES_PER_SECOND
+        self._next_send_at = 0.0
+        self._last_progress_at = 0.0
+        self.blocked_ids: List[int] = []
+
+    async def _wait_for_budget(self):
+        delay = self._next_send_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        self._next_send_at = max(self._next_send_at, time.monotonic()) + self.interval
+
+    async def send_one(self, user_id: int, attempts: int) -> tuple:
+        await self._wait_for_budget()
+        try:
+            await self.application.bot.send_message(user_id, self.job['text'], reply_markup=self.reply_markup,
+                                                    rate_limit_args=RequestPriority.BULK)
+            return user_id, STATUS_SENT, None
+        except RetryAfter as e:
+            # Лимитер уже выдержал паузы и исчерпал повторы; флуд-контроль не вина получателя,
+            # поэтому он остаётся в очереди независимо от числа попыток, а следующая отправка ждёт в лимитере.
+            return user_id, STATUS_PENDING, str(e)[:300]
+        except Forbidden as e:
+            self.blocked_ids.append(user_id)
+            return user_id, STATUS_BLOCKED, str(e)[:300]
+        except BadRequest as e:
+            return user_id, STATUS_FAILED, str(e)[:300]
+        except TelegramError as e:
+            # Сетевые ошибки и таймауты: оставляем в очереди, пока есть попытки.
+            status = STATUS_FAILED if attempts + 1 >= settings.BROADCAST_MAX_ATTEMPTS else STATUS_PENDING
+            return user_id, status, str(e)[:300]
+
+    async def report_progress(self, force: bool = False, finished: bool = False):
+        if not self.job['progress_message_id']:
+            return
+        if not force and time.monotonic() - self._last_progress_at < settings.BROADCAST_PROGRESS_INTERVAL_SECONDS:
+            return
+        self._last_progress_at = time.monotonic()
+        counts = await database.get_broadcast_counts(self.job['id'])
+        try:
+            await self.application.bot.edit_message_text(
+                format_progress(self.job, counts, finished), chat_id=self.job['progress_chat_id'],
+                message_id=self.job['progress_message_id'], parse_mode="HTML",
+                rate_limit_args=RequestPriority.NOTIFICATION
+            )
+        except RetryAfter as e:
+            self._last_progress_at += retry_after_seconds(e)
+        except TelegramError as e:
+            if "Message is not modified" not in str(e):
+                logger.warning(f"Could not update progress of broadcast {self.job['id']}: {e}")
+
+    async def record_result(self, result: tuple, stop_event: asyncio.Event) -> bool:
+        """Записывает статус получателя. Пока запись не удалась, рассылка стоит: иначе
+        получатель остался бы pending и получил бы сообщение повторно."""
+        delay = settings.BROADCAST_DB_RETRY_MIN_SECONDS
+        while not await database.update_broadcast_recipients(self.job['id'], [result]):
+            if stop_event.is_set():
+                logger.error(f"Broadcast {self.job['id']}: could not record result for user {result[0]} before shutdown, "
+                             f"the message may be sent to them again after restart.")
+                return False
+            logger.error(f"Broadcast {self.job['id']}: could not record result for user {result[0]}, pausing for {delay}s.")
+            try:
+                await asyncio.wait_for(stop_event.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+            delay = min(delay * 2, settings.BROADCAST_DB_RETRY_MAX_SECONDS)
+        return True
+
+    async def run(self, stop_event: asyncio.Event) -> bool:
+        """Отправляет ожидающим получателям. True, если задание закончено, False - если остановлено."""
+        job_id = self.job['id']
+        await self.report_progress(force=True)
+        while not stop_event.is_set():
+            recipients = await database.get_pending_broadcast_recipients(job_id, settings.BROADCAST_BATCH_SIZE)
+            if not recipients:
+                break
+            for recipient in recipients:
+                if stop_event.is_set():
+                    break
+                result = await self.send_one(recipient['user_id'], recipient['attempts'])
+                if not await self.record_result(result, stop_event):
+                    break
+                await self.report_progress()
+            if self.blocked_ids and self.on_blocked:
+                await self.on_blocked(self.blocked_ids)
+            self.blocked_ids = []
+
+        if stop_event.is_set():
+            await self.report_progress(force=True)
+            return False
+        await database.finish_broadcast_job(job_id, "done")
+        await self.report_progress(force=True, finished=True)
+        counts = await database.get_broadcast_counts(job_id)
+        logger.info(f"Broadcast {job_id} finished: {counts}")
+        return True
+
+
+async def broadcast_worker_task(application: Application, stop_event: asyncio.Event, bot_data,
+                                on_blocked: Optional[BlockedUsersCallback] = None):
+    while not stop_event.is_set():
+        try:
+            _new_job_event.clear()
+            for job in await database.get_running_broadcast_jobs():
+                if stop_event.is_set():
+                    break
+                logger.info(f"Running broadcast {job['id']} ({job['kind']}).")
+                await BroadcastSender(application, job, on_blocked).run(stop_event)
+
+            stop_waiter = asyncio.create_task(stop_event.wait())
+            job_waiter = asyncio.create_task(_new_job_event.wait())
+            try:
+                await asyncio.wait([stop_waiter, job_waiter], return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                stop_waiter.cancel()
+                job_waiter.cancel()
+        except asyncio.CancelledError:
+            break
+        except Exception as e:
+            logger.error(f"Error in broadcast worker task: {e}", exc_info=True)
+            await asyncio.sleep(settings.BROADCAST_PROGRESS_INTERVAL_SECONDS)
+
+    logger.info("Broadcast worker task finished.")
@@ -0,0 +1,75 @@
+import logging
+import time
+from enum import Enum
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class BreakerState(Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Размыкается после N ошибок подряд, затем пропускает один пробный запрос."""
+
+    def __init__(self, name: str, failure_threshold: int, recovery_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = BreakerState.CLOSED
+        self.consecutive_failures = 0
+        self.last_error: Optional[str] = None
+        self.opened_at: Optional[float] = None
+        self.outage_started_at: Optional[float] = None
+        self._probe_in_flight = False
+
+    @property
+    def is_closed(self) -> bool:
+        return self.state == BreakerState.CLOSED
+
+    def allow_request(self) -> bool:
+        if self.state == BreakerState.CLOSED:
+            return True
+        if self.state == BreakerState.OPEN:
+            if time.monotonic() - self.opened_at < self.recovery_timeout:
+                return False
+            self.state = BreakerState.HALF_OPEN
+            self._probe_in_flight = False
+            logger.info(f"Circuit breaker '{self.name}' is half-open, sending a probe request.")
+        if self._probe_in_flight:
+            return False
+        self._probe_in_flight = True
+        return True
+
+    def record_success(self):
+        if self.state != BreakerState.CLOSED:
+            logger.info(f"Circuit breaker '{self.name}' closed after a successful request.")
+        self.state = BreakerState.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.outage_started_at = None
+        self._probe_in_flight = False
+
+    def release_probe(self):
+        """Пробный запрос завершился, не дав ответа о доступности сервиса
+        (например, в батче не нашлось строк для записи): разрешаем следующую пробу."""
+        self._probe_in_flight = False
+
+    def record_failure(self, error: BaseException):
+        self.consecutive_failures += 1
+        self.last_error = str(error)
+        self._probe_in_flight = False
+        if self.state == BreakerState.HALF_OPEN:
+            self._open()
+            logger.warning(f"Circuit breaker '{self.name}' probe failed, staying open: {error}")
+        elif self.state == BreakerState.CLOSED and self.consecutive_failures >= self.failure_threshold:
+            self.outage_started_at = time.time()
+            self._open()
+            logger.error(f"Circuit breaker '{self.name}' opened after {self.consecutive_failures} consecutive failures.")
+
+    def _open(self):
+        self.state = BreakerState.OPEN
+        self.opened_at = time.monotonic()
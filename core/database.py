@@ -2,12 +2,17 @@ import asyncio
 import sqlite3
 import logging
 import json
+import time
+import uuid
 from typing import List, Tuple, Optional, Dict, Any
 
 from core.settings import DATABASE_FILE
 
 logger = logging.getLogger(__name__)
 
+# Не больше 999 параметров в одном запросе у старых сборок SQLite.
+INTERACTED_USERS_DELETE_CHUNK = 500
+
 
 class DatabaseError(Exception):
     pass
@@ -41,7 +46,46 @@ async def execute_query(query: str, params: tuple = (), fetch: Optional[str] = N
         return None if fetch else 0
 
 
+def _execute_transaction_sync(statements: List[Tuple[str, tuple]]):
+    try:
+        with sqlite3.connect(DATABASE_FILE) as conn:
+            cursor = conn.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL;")
+            cursor.execute("PRAGMA foreign_keys = ON;")
+            for query, params in statements:
+                cursor.execute(query, params)
+            conn.commit()
+    except sqlite3.Error as e:
+        logger.error(f"Database error in transaction of {len(statements)} statements: {e}", exc_info=True)
+        raise DatabaseError(f"Database transaction failed: {e}")
+
+
+async def execute_transaction(statements: List[Tuple[str, tuple]]) -> bool:
+    try:
+        await asyncio.to_thread(_execute_transaction_sync, statements)
+        return True
+    except DatabaseError:
+        return False
+
+
+async def _add_column_if_missing(table: str, column: str, definition: str):
+    columns = await execute_query(f"PRAGMA table_info({table})", fetch="all")
+    if columns and column not in {col['name'] for col in columns}:
+        await execute_query(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        logger.info(f"Migrated table '{table}': added column '{column}'.")
+
+
+async def _run_migration_once(name: str, statements: List[Tuple[str, tuple]]):
+    """Выполняет миграцию данных один раз: отметка в schema_migrations пишется в той же транзакции."""
+    if await execute_query("SELECT 1 FROM schema_migrations WHERE name = ?", (name,), fetch="one"):
+        return
+    marker = ("INSERT INTO schema_migrations (name, applied_at) VALUES (?, ?)", (name, time.time()))
+    if await execute_transaction([*statements, marker]):
+        logger.info(f"Applied migration '{name}'.")
+
+
 async def init_db():
+    await execute_query("CREATE TABLE IF NOT EXISTS schema_migrations (name TEXT PRIMARY KEY, applied_at REAL NOT NULL);")
     query_managers = "CREATE TABLE IF NOT EXISTS managers (user_id INTEGER NOT NULL, restaurant_code TEXT NOT NULL, full_name TEXT, username TEXT, PRIMARY KEY (user_id, restaurant_code));"
     await execute_query(query_managers)
     query_pending_managers = "CREATE TABLE IF NOT EXISTS pending_managers (user_id INTEGER PRIMARY KEY, full_name TEXT NOT NULL, username TEXT, restaurant_code TEXT NOT NULL, restaurant_name TEXT NOT NULL, request_time REAL NOT NULL);"
@@ -52,12 +96,39 @@ async def init_db():
     await execute_query(query_surveys)
     query_sheets_queue = "CREATE TABLE IF NOT EXISTS sheets_queue (id INTEGER PRIMARY KEY AUTOINCREMENT, sheet_name TEXT NOT NULL, data_json TEXT NOT NULL, created_at REAL NOT NULL, attempts INTEGER DEFAULT 0, is_processed BOOLEAN DEFAULT 0);"
     await execute_query(query_sheets_queue)
+    query_sheets_dead_letter = "CREATE TABLE IF NOT EXISTS sheets_dead_letter (id INTEGER PRIMARY KEY, sheet_name TEXT NOT NULL, data_json TEXT NOT NULL, created_at REAL NOT NULL, attempts INTEGER DEFAULT 0, error TEXT, failed_at REAL NOT NULL);"
+    await execute_query(query_sheets_dead_letter)
+    query_export_cursors = "CREATE TABLE IF NOT EXISTS export_cursors (sink_name TEXT PRIMARY KEY, last_id INTEGER NOT NULL);"
+    await execute_query(query_export_cursors)
+    query_export_row_keys = "CREATE TABLE IF NOT EXISTS export_row_keys (sink_name TEXT NOT NULL, row_key TEXT NOT NULL, PRIMARY KEY (sink_name, row_key));"
+    await execute_query(query_export_row_keys)
+    await _add_column_if_missing("sheets_queue", "row_key", "TEXT")
+    await _add_column_if_missing("sheets_dead_letter", "row_key", "TEXT")
+    await _add_column_if_missing("sheets_queue", "processed_at", "REAL")
+    await _add_column_if_missing("sheets_queue", "claimed_by", "TEXT")
+    await _add_column_if_missing("sheets_queue", "claimed_until", "REAL")
+    # Раньше created_at писался по монотонным часам event loop; такие ожидающие записи считаем поставленными сейчас.
+    await _run_migration_once("sheets_queue_wall_clock_created_at", [
+        ("UPDATE sheets_queue SET created_at = ? WHERE is_processed = 0 AND created_at < 1000000000", (time.time(),)),
+    ])
+    await execute_query("CREATE INDEX IF NOT EXISTS idx_sheets_queue_pending ON sheets_queue (is_processed, created_at)")
+    await execute_query("CREATE INDEX IF NOT EXISTS idx_sheets_queue_processed_at ON sheets_queue (processed_at)")
     query_candidate_restaurants = "CREATE TABLE IF NOT EXISTS candidate_restaurants (user_id INTEGER PRIMARY KEY, restaurant_code TEXT NOT NULL);"
     await execute_query(query_candidate_restaurants)
     query_feedback_history = "CREATE TABLE IF NOT EXISTS feedback_history (feedback_id TEXT PRIMARY KEY, manager_id INTEGER NOT NULL, message_id INTEGER, candidate_id INTEGER NOT NULL, candidate_name TEXT NOT NULL, job_data_json TEXT NOT NULL, created_at REAL NOT NULL, decision_at REAL, decision_by_id INTEGER, status TEXT);"
     await execute_query(query_feedback_history)
     query_employees = "CREATE TABLE IF NOT EXISTS employees (user_id INTEGER PRIMARY KEY, full_name TEXT, restaurant_code TEXT, is_active BOOLEAN DEFAULT 1, added_at REAL);"
     await execute_query(query_employees)
+    query_interacted_users = "CREATE TABLE IF NOT EXISTS interacted_users (user_id INTEGER PRIMARY KEY, first_seen_at REAL NOT NULL);"
+    await execute_query(query_interacted_users)
+    query_ttl_store = "CREATE TABLE IF NOT EXISTS ttl_store (namespace TEXT NOT NULL, key TEXT NOT NULL, value_json TEXT NOT NULL, expires_at REAL NOT NULL, PRIMARY KEY (namespace, key));"
+    await execute_query(query_ttl_store)
+    await execute_query("CREATE INDEX IF NOT EXISTS idx_ttl_store_expires_at ON ttl_store (namespace, expires_at)")
+    query_broadcast_jobs = "CREATE TABLE IF NOT EXISTS broadcast_jobs (id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, text TEXT NOT NULL, reply_markup_json TEXT, created_by INTEGER NOT NULL, created_at REAL NOT NULL, status TEXT NOT NULL DEFAULT 'running', progress_chat_id INTEGER, progress_message_id INTEGER, finished_at REAL);"
+    await execute_query(query_broadcast_jobs)
+    query_broadcast_recipients = "CREATE TABLE IF NOT EXISTS broadcast_recipients (job_id INTEGER NOT NULL, user_id INTEGER NOT NULL, status TEXT NOT NULL DEFAULT 'pending', attempts INTEGER DEFAULT 0, error TEXT, sent_at REAL, PRIMARY KEY (job_id, user_id));"
+    await execute_query(query_broadcast_recipients)
+    await execute_query("CREATE INDEX IF NOT EXISTS idx_broadcast_recipients_status ON broadcast_recipients (job_id, status)")
     logger.info("Database initialized successfully.")
 
 
@@ -142,22 +213,112 @@ async def move_pending_feedback_to_history(candidate_id: int, decision_by_id: in
 
 
 async def add_to_sheets_db_queue(sheet_name: str, data: list):
-    query = "INSERT INTO sheets_queue (sheet_name, data_json, created_at) VALUES (?, ?, ?)"
+    query = "INSERT INTO sheets_queue (sheet_name, data_json, created_at, row_key) VALUES (?, ?, ?, ?)"
     data_json = json.dumps(data, ensure_ascii=False)
-    created_at = asyncio.get_event_loop().time()
-    await execute_query(query, (sheet_name, data_json, created_at))
+    await execute_query(query, (sheet_name, data_json, time.time(), uuid.uuid4().hex))
 
 
-async def get_sheets_queue_batch(limit: int = 50) -> List[Dict[str, Any]]:
-    query = "SELECT id, sheet_name, data_json, attempts FROM sheets_queue WHERE is_processed = 0 ORDER BY created_at LIMIT ?"
-    result = await execute_query(query, (limit,), fetch="all")
-    return result if result else []
+def _claim_sheets_queue_batch_sync(worker_id: str, limit: int, lease_seconds: float) -> List[Dict[str, Any]]:
+    now = time.time()
+    try:
+        with sqlite3.connect(DATABASE_FILE) as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL;")
+            # IMMEDIATE берёт блокировку на запись сразу, чтобы два процесса не забрали одни и те же записи.
+            cursor.execute("BEGIN IMMEDIATE")
+            rows = cursor.execute(
+                "SELECT id, sheet_name, data_json, attempts, row_key FROM sheets_queue "
+                "WHERE is_processed = 0 AND (claimed_until IS NULL OR claimed_until < ?) ORDER BY created_at LIMIT ?",
+                (now, limit)).fetchall()
+            if rows:
+                cursor.execute(
+                    f"UPDATE sheets_queue SET claimed_by = ?, claimed_until = ? WHERE id IN ({','.join(['?'] * len(rows))})",
+                    (worker_id, now + lease_seconds, *[row['id'] for row in rows]))
+            conn.commit()
+            return [dict(row) for row in rows]
+    except sqlite3.Error as e:
+        logger.error(f"Database error while claiming sheets queue batch: {e}", exc_info=True)
+        raise DatabaseError(f"Database operation failed: {e}")
+
+
+async def claim_sheets_queue_batch(worker_id: str, limit: int, lease_seconds: float) -> List[Dict[str, Any]]:
+    """Забирает необработанные записи, не занятые другим writer'ом, на lease_seconds."""
+    try:
+        return await asyncio.to_thread(_claim_sheets_queue_batch_sync, worker_id, limit, lease_seconds)
+    except DatabaseError:
+        return []
+
+
+async def release_sheets_queue_claims(worker_id: str):
+    query = "UPDATE sheets_queue SET claimed_by = NULL, claimed_until = NULL WHERE claimed_by = ? AND is_processed = 0"
+    await execute_query(query, (worker_id,))
+
+
+async def get_sheets_queue_after(last_id: int, limit: int) -> List[Dict[str, Any]]:
+    query = "SELECT id, sheet_name, data_json, created_at, row_key FROM sheets_queue WHERE id > ? ORDER BY id LIMIT ?"
+    return await execute_query(query, (last_id, limit), fetch="all") or []
+
+
+async def get_export_cursor(sink_name: str) -> int:
+    result = await execute_query("SELECT last_id FROM export_cursors WHERE sink_name = ?", (sink_name,), fetch="one")
+    return result['last_id'] if result else 0
+
+
+async def get_exported_row_keys(sink_name: str, row_keys: List[str]) -> set:
+    if not row_keys: return set()
+    query = f"SELECT row_key FROM export_row_keys WHERE sink_name = ? AND row_key IN ({','.join(['?'] * len(row_keys))})"
+    rows = await execute_query(query, (sink_name, *row_keys), fetch="all") or []
+    return {row['row_key'] for row in rows}
+
+
+async def set_export_cursor(sink_name: str, last_id: int, row_keys: List[str] = ()) -> bool:
+    """Сдвигает курсор получателя и в той же транзакции запоминает выгруженные ключи строк."""
+    statements = [("INSERT OR IGNORE INTO export_row_keys (sink_name, row_key) VALUES (?, ?)", (sink_name, row_key))
+                  for row_key in row_keys]
+    statements.append(("INSERT OR REPLACE INTO export_cursors (sink_name, last_id) VALUES (?, ?)", (sink_name, last_id)))
+    return await execute_transaction(statements)
 
 
 async def mark_sheets_queue_items_processed(item_ids: List[int]):
     if not item_ids: return
-    query = f"UPDATE sheets_queue SET is_processed = 1 WHERE id IN ({','.join(['?'] * len(item_ids))})"
-    await execute_query(query, tuple(item_ids))
+    query = f"UPDATE sheets_queue SET is_processed = 1, processed_at = ? WHERE id IN ({','.join(['?'] * len(item_ids))})"
+    await execute_query(query, (time.time(), *item_ids))
+
+
+def _archive_filter(sheet_name: str, since: float, until: float) -> Tuple[str, tuple]:
+    return "is_processed = 1 AND sheet_name = ? AND created_at >= ? AND created_at < ?", (sheet_name, since, until)
+
+
+async def count_sheets_queue_archive(sheet_name: str, since: float, until: float) -> int:
+    condition, params = _archive_filter(sheet_name, since, until)
+    result = await execute_query(f"SELECT COUNT(*) as count FROM sheets_queue WHERE {condition}", params, fetch="one")
+    return result['count'] if result else 0
+
+
+async def get_sheets_queue_archive_page(sheet_name: str, since: float, until: float, after_id: int, limit: int) -> List[Dict[str, Any]]:
+    """Уже записанные строки листа за период, постранично по id."""
+    condition, params = _archive_filter(sheet_name, since, until)
+    query = f"SELECT id, sheet_name, data_json, created_at, row_key FROM sheets_queue WHERE {condition} AND id > ? ORDER BY id LIMIT ?"
+    return await execute_query(query, (*params, after_id, limit), fetch="all") or []
+
+
+async def enqueue_sheets_queue_copies(item_ids: List[int], sheet_name: str) -> bool:
+    """Ставит копии записей в очередь для листа sheet_name с теми же ключами строк."""
+    if not item_ids: return True
+    query = (f"INSERT INTO sheets_queue (sheet_name, data_json, created_at, row_key) "
+             f"SELECT ?, data_json, ?, row_key FROM sheets_queue WHERE id IN ({','.join(['?'] * len(item_ids))}) ORDER BY id")
+    return await execute_transaction([(query, (sheet_name, time.time(), *item_ids))])
+
+
+async def get_sheets_queue_stats() -> List[Dict[str, Any]]:
+    query = "SELECT sheet_name, COUNT(*) as depth, MIN(created_at) as oldest_created_at FROM sheets_queue WHERE is_processed = 0 GROUP BY sheet_name"
+    return await execute_query(query, fetch="all") or []
+
+
+async def count_sheets_rows_processed_since(since: float) -> int:
+    result = await execute_query("SELECT COUNT(*) as count FROM sheets_queue WHERE processed_at >= ?", (since,), fetch="one")
+    return result['count'] if result else 0
 
 
 async def increment_sheets_queue_attempts(item_ids: List[int]):
@@ -166,6 +327,57 @@ async def increment_sheets_queue_attempts(item_ids: List[int]):
     await execute_query(query, tuple(item_ids))
 
 
+async def move_sheets_queue_items_to_dead_letter(failed_items: List[Tuple[int, str]]):
+    if not failed_items: return
+    failed_at = time.time()
+    insert_query = "INSERT OR REPLACE INTO sheets_dead_letter (id, sheet_name, data_json, created_at, attempts, error, failed_at, row_key) SELECT id, sheet_name, data_json, created_at, attempts + 1, ?, ?, row_key FROM sheets_queue WHERE id = ?"
+    delete_query = "DELETE FROM sheets_queue WHERE id = ?"
+    statements = []
+    for item_id, error in failed_items:
+        statements.append((insert_query, (error, failed_at, item_id)))
+        statements.append((delete_query, (item_id,)))
+    if await execute_transaction(statements):
+        logger.warning(f"Moved {len(failed_items)} sheets queue items to dead letter table.")
+
+
+async def get_sheets_dead_letter_items(limit: int = 50, sheet_name: Optional[str] = None) -> List[Dict[str, Any]]:
+    if sheet_name:
+        query = "SELECT id, sheet_name, data_json, attempts, error, failed_at FROM sheets_dead_letter WHERE sheet_name = ? ORDER BY id LIMIT ?"
+        return await execute_query(query, (sheet_name, limit), fetch="all") or []
+    query = "SELECT id, sheet_name, data_json, attempts, error, failed_at FROM sheets_dead_letter ORDER BY id LIMIT ?"
+    return await execute_query(query, (limit,), fetch="all") or []
+
+
+async def count_sheets_dead_letter() -> int:
+    result = await execute_query("SELECT COUNT(*) as count FROM sheets_dead_letter", fetch="one")
+    return result['count'] if result else 0
+
+
+async def replay_sheets_dead_letter(item_ids: Optional[List[int]] = None, sheet_name: Optional[str] = None) -> int:
+    """Возвращает записи из dead letter обратно в sheets_queue с обнулёнными попытками."""
+    conditions, params = [], []
+    if item_ids:
+        conditions.append(f"id IN ({','.join(['?'] * len(item_ids))})")
+        params.extend(item_ids)
+    if sheet_name:
+        conditions.append("sheet_name = ?")
+        params.append(sheet_name)
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    rows = await execute_query(f"SELECT id FROM sheets_dead_letter{where}", tuple(params), fetch="all")
+    if not rows: return 0
+    ids = [row['id'] for row in rows]
+    placeholders = ','.join(['?'] * len(ids))
+    statements = [
+        (f"INSERT INTO sheets_queue (sheet_name, data_json, created_at, row_key) SELECT sheet_name, data_json, created_at, row_key FROM sheets_dead_letter WHERE id IN ({placeholders}) ORDER BY id", tuple(ids)),
+        (f"DELETE FROM sheets_dead_letter WHERE id IN ({placeholders})", tuple(ids)),
+    ]
+    if not await execute_transaction(statements):
+        return 0
+    logger.info(f"Replayed {len(ids)} items from sheets dead letter table back to the queue.")
+    return len(ids)
+
+
 async def add_manager(user_id: int, restaurant_code: str, full_name: str, username: Optional[str]):
     query = "INSERT OR REPLACE INTO managers (user_id, restaurant_code, full_name, username) VALUES (?, ?, ?, ?)"
     await execute_query(query, (user_id, restaurant_code, full_name, username))
@@ -235,14 +447,20 @@ async def remove_pending_manager(user_id: int):
     logger.info(f"Removed pending manager request for user {user_id}.")
 
 
-async def add_pending_feedback(feedback_id: str, manager_id: int, message_id: int, candidate_id: int,
-                               candidate_name: str,
-                               job_data: dict, created_at: float):
+async def add_pending_feedback_many(tasks: List[Tuple[str, int, int]], candidate_id: int, candidate_name: str,
+                                    job_data: dict, created_at: float) -> bool:
+    """tasks: (feedback_id, manager_id, message_id) по каждому получателю анкеты; пишутся одной транзакцией."""
+    if not tasks:
+        return True
     query = "INSERT INTO pending_feedback (feedback_id, manager_id, message_id, candidate_id, candidate_name, job_data_json, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)"
     job_data_json = json.dumps(job_data, ensure_ascii=False)
-    await execute_query(query,
-                        (feedback_id, manager_id, message_id, candidate_id, candidate_name, job_data_json, created_at))
-    logger.info(f"Added pending feedback task {feedback_id} for manager {manager_id} about candidate {candidate_id}.")
+    success = await execute_transaction([
+        (query, (feedback_id, manager_id, message_id, candidate_id, candidate_name, job_data_json, created_at))
+        for feedback_id, manager_id, message_id in tasks
+    ])
+    if success:
+        logger.info(f"Added {len(tasks)} pending feedback tasks about candidate {candidate_id}.")
+    return success
 
 
 async def get_pending_feedback_for_manager(manager_id: int) -> List[Dict[str, Any]]:
@@ -341,6 +559,113 @@ async def delete_user_data(user_id: int):
     logger.info(f"Successfully deleted data for user_id: {user_id}")
 
 
+async def get_interacted_user_ids() -> List[int]:
+    result = await execute_query("SELECT user_id FROM interacted_users ORDER BY user_id", fetch="all")
+    return [row['user_id'] for row in result] if result else []
+
+
+async def add_interacted_users(user_ids: List[int]) -> bool:
+    now = time.time()
+    query = "INSERT OR IGNORE INTO interacted_users (user_id, first_seen_at) VALUES (?, ?)"
+    return await execute_transaction([(query, (user_id, now)) for user_id in user_ids])
+
+
+async def remove_interacted_users(user_ids: List[int]) -> bool:
+    statements = []
+    for start in range(0, len(user_ids), INTERACTED_USERS_DELETE_CHUNK):
+        chunk = user_ids[start:start + INTERACTED_USERS_DELETE_CHUNK]
+        placeholders = ",".join("?" * len(chunk))
+        statements.append((f"DELETE FROM interacted_users WHERE user_id IN ({placeholders})", tuple(chunk)))
+    return await execute_transaction(statements)
+
+
+async def ttl_store_set_many(namespace: str, entries: List[Tuple[str, Any, float]]) -> bool:
+    query = "INSERT OR REPLACE INTO ttl_store (namespace, key, value_json, expires_at) VALUES (?, ?, ?, ?)"
+    return await execute_transaction([
+        (query, (namespace, key, json.dumps(value, ensure_ascii=False), expires_at)) for key, value, expires_at in entries
+    ])
+
+
+async def ttl_store_load(namespace: str) -> List[Dict[str, Any]]:
+    query = "SELECT key, value_json, expires_at FROM ttl_store WHERE namespace = ?"
+    result = await execute_query(query, (namespace,), fetch="all")
+    entries = []
+    for row in result or []:
+        try:
+            entries.append({'key': row['key'], 'value': json.loads(row['value_json']), 'expires_at': row['expires_at']})
+        except ValueError:
+            logger.error(f"Skipping corrupted ttl_store entry {namespace}/{row['key']}.")
+    return entries
+
+
+async def ttl_store_delete_expired(namespace: str, now: float):
+    await execute_query("DELETE FROM ttl_store WHERE namespace = ? AND expires_at <= ?", (namespace, now))
+
+
+def _create_broadcast_job_sync(kind: str, text: str, reply_markup_json: Optional[str], created_by: int,
+                               user_ids: List[int]) -> int:
+    try:
+        with sqlite3.connect(DATABASE_FILE) as conn:
+            cursor = conn.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL;")
+            cursor.execute(
+                "INSERT INTO broadcast_jobs (kind, text, reply_markup_json, created_by, created_at) VALUES (?, ?, ?, ?, ?)",
+                (kind, text, reply_markup_json, created_by, time.time()))
+            job_id = cursor.lastrowid
+            cursor.executemany("INSERT OR IGNORE INTO broadcast_recipients (job_id, user_id) VALUES (?, ?)",
+                               [(job_id, user_id) for user_id in user_ids])
+            conn.commit()
+            return job_id
+    except sqlite3.Error as e:
+        logger.error(f"Database error while creating broadcast job: {e}", exc_info=True)
+        raise DatabaseError(f"Database operation failed: {e}")
+
+
+async def create_broadcast_job(kind: str, text: str, reply_markup_json: Optional[str], created_by: int,
+                               user_ids: List[int]) -> Optional[int]:
+    """Создаёт задание рассылки вместе со списком получателей одной транзакцией."""
+    try:
+        return await asyncio.to_thread(_create_broadcast_job_sync, kind, text, reply_markup_json, created_by, user_ids)
+    except DatabaseError:
+        return None
+
+
+async def get_broadcast_job(job_id: int) -> Optional[Dict[str, Any]]:
+    return await execute_query("SELECT * FROM broadcast_jobs WHERE id = ?", (job_id,), fetch="one")
+
+
+async def get_running_broadcast_jobs() -> List[Dict[str, Any]]:
+    return await execute_query("SELECT * FROM broadcast_jobs WHERE status = 'running' ORDER BY id", fetch="all") or []
+
+
+async def set_broadcast_progress_message(job_id: int, chat_id: int, message_id: int):
+    query = "UPDATE broadcast_jobs SET progress_chat_id = ?, progress_message_id = ? WHERE id = ?"
+    await execute_query(query, (chat_id, message_id, job_id))
+
+
+async def finish_broadcast_job(job_id: int, status: str):
+    await execute_query("UPDATE broadcast_jobs SET status = ?, finished_at = ? WHERE id = ?", (status, time.time(), job_id))
+
+
+async def get_pending_broadcast_recipients(job_id: int, limit: int) -> List[Dict[str, Any]]:
+    query = "SELECT user_id, attempts FROM broadcast_recipients WHERE job_id = ? AND status = 'pending' ORDER BY user_id LIMIT ?"
+    return await execute_query(query, (job_id, limit), fetch="all") or []
+
+
+async def update_broadcast_recipients(job_id: int, results: List[Tuple[int, str, Optional[str]]]) -> bool:
+    """results: (user_id, новый статус, ошибка). Статус pending означает ещё одну неудачную попытку."""
+    now = time.time()
+    query = ("UPDATE broadcast_recipients SET status = ?, error = ?, attempts = attempts + 1, "
+             "sent_at = CASE WHEN ? = 'sent' THEN ? ELSE sent_at END WHERE job_id = ? AND user_id = ?")
+    return await execute_transaction([(query, (status, error, status, now, job_id, user_id)) for user_id, status, error in results])
+
+
+async def get_broadcast_counts(job_id: int) -> Dict[str, int]:
+    query = "SELECT status, COUNT(*) AS count FROM broadcast_recipients WHERE job_id = ? GROUP BY status"
+    result = await execute_query(query, (job_id,), fetch="all") or []
+    return {row['status']: row['count'] for row in result}
+
+
 async def remove_manager(user_id: int, restaurant_code: str):
     query = "DELETE FROM managers WHERE user_id = ? AND restaurant_code = ?"
     await execute_query(query, (user_id, restaurant_code))
@@ -1,37 +1,80 @@
 import asyncio
+import functools
 import gspread
 import gspread_asyncio
 import html
+import httpx
 import logging
 import requests
 import json
-from collections import defaultdict
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
-from typing import List, Any
+import os
+import re
+import socket
+import time
+from collections import OrderedDict, defaultdict
+from datetime import datetime
+from tenacity import retry, stop_any, stop_after_attempt, wait_exponential, retry_if_exception
+from typing import Dict, Iterable, List, Any, Tuple
 
+from google.auth.exceptions import RefreshError
 from google.oauth2.service_account import Credentials
 from telegram.ext import Application
-from telegram.constants import ParseMode
 
 from core import settings, database
+from core.circuit_breaker import CircuitBreaker, BreakerState
+from core.monitoring import notify_admins, sheets_api_latency
+from core.sheets_http import HttpSheetsClientManager
+from core.sheets_pool import SheetsClientPool, SheetsCredential
+from core.sinks import LOCAL_TIMEZONE, ExportSink, build_local_sinks
 
 logger = logging.getLogger(__name__)
 
-GSPREAD_RETRY_ERRORS = (
-    gspread.exceptions.APIError,
-    requests.exceptions.ConnectionError,
-    requests.exceptions.Timeout,
-    requests.exceptions.RequestException,
-    gspread.exceptions.GSpreadException,
-    TimeoutError,
+MAX_WRITE_ATTEMPTS = 3
+# Имя этого процесса в sheets_queue.claimed_by
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+sheets_breaker = CircuitBreaker(
+    "google_sheets",
+    failure_threshold=settings.SHEETS_BREAKER_FAILURE_THRESHOLD,
+    recovery_timeout=settings.SHEETS_BREAKER_RECOVERY_SECONDS,
 )
 
-MAX_WRITE_ATTEMPTS = 3
+
+def is_outage_error(error: BaseException) -> bool:
+    """Сбой на стороне Google или сети (а не ошибка в самих данных)."""
+    if isinstance(error, gspread.exceptions.APIError):
+        status_code = getattr(error.response, "status_code", None)
+        return status_code is None or status_code == 429 or status_code >= 500
+    return isinstance(error, (requests.exceptions.RequestException, httpx.TransportError, TimeoutError))
+
+
+def is_config_error(error: BaseException) -> bool:
+    """Ошибка настройки: ключ сервисного аккаунта, права доступа или имя листа.
+    Данные тут ни при чём, поэтому записи остаются в очереди, пока её не исправят."""
+    if isinstance(error, gspread.exceptions.APIError):
+        return getattr(error.response, "status_code", None) in (401, 403, 404)
+    return isinstance(error, (RefreshError, gspread.exceptions.WorksheetNotFound, gspread.exceptions.SpreadsheetNotFound))
+
+
+def is_service_response_error(error: BaseException) -> bool:
+    """Ошибка пришла ответом от Google (400, 403, нет листа): сервис доступен."""
+    return isinstance(error, (gspread.exceptions.APIError, gspread.exceptions.WorksheetNotFound,
+                              gspread.exceptions.SpreadsheetNotFound))
+
+
+def is_rotated_throttle(error: BaseException) -> bool:
+    """429 одного сервисного аккаунта, который пул обошёл: Google доступен через другие."""
+    return getattr(error, "sheets_pool_rotated", False)
+
+
+def _stop_if_breaker_open(retry_state) -> bool:
+    return not sheets_breaker.is_closed
+
 
 retry_gspread_operation = retry(
-    stop=stop_after_attempt(5),
-    wait=wait_exponential(multiplier=1, min=10, max=60),
-    retry=retry_if_exception_type(GSPREAD_RETRY_ERRORS),
+    stop=stop_any(stop_after_attempt(5), _stop_if_breaker_open),
+    wait=wait_exponential(multiplier=1, min=settings.SHEETS_RETRY_MIN_WAIT_SECONDS, max=settings.SHEETS_RETRY_MAX_WAIT_SECONDS),
+    retry=retry_if_exception(is_outage_error),
     reraise=True,
     before_sleep=lambda retry_state: logger.warning(
         f"Retrying GSheets operation (attempt {retry_state.attempt_number}) due to: {retry_state.outcome.exception()}"
@@ -39,7 +82,271 @@ retry_gspread_operation = retry(
 )
 
 
-async def init_google_sheets_client() -> gspread_asyncio.AsyncioGspreadClientManager | None:
+def record_breaker_outcome(func):
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        try:
+            result = await func(*args, **kwargs)
+        except Exception as e:
+            if is_outage_error(e):
+                # 429 одного аккаунта пул обходит сам, общий breaker из-за него не размыкаем.
+                if not is_rotated_throttle(e):
+                    sheets_breaker.record_failure(e)
+            elif is_service_response_error(e):
+                sheets_breaker.record_success()
+            raise
+        sheets_breaker.record_success()
+        return result
+    return wrapper
+
+
+class RowKeyIndex:
+    """Ключи строк, недавно записанных в лист. Позволяет повторять запись без дублей
+    и без чтения листа перед каждым батчем."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._keys: OrderedDict[str, None] = OrderedDict()
+
+    def load(self, keys: Iterable[str]):
+        self._keys.clear()
+        for key in keys:
+            if key:
+                self.add(key)
+
+    def add(self, key: str):
+        self._keys[key] = None
+        self._keys.move_to_end(key)
+        if len(self._keys) > self.max_size:
+            self._keys.popitem(last=False)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._keys
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+
+class SheetWriteTarget:
+    """Куда писать строки логического листа: таблица, активный worksheet (с учётом
+    ротации), номер следующей свободной строки и размер сетки. Список листов
+    перечитывается раз в SHEETS_CURSOR_REFRESH_SECONDS и перед ротацией, курсор и
+    ключи строк - после сбоя или неожиданного ответа на запись. Перед каждым батчем
+    лист не читается: в лист пишет только один writer (аренда записей в sheets_queue).
+    Курсор общий для всех сервисных аккаунтов, открытые листы - свои у каждого."""
+
+    def __init__(self, sheet_name: str, spreadsheet_id: str):
+        self.sheet_name = sheet_name
+        self.spreadsheet_id = spreadsheet_id
+        self.worksheet_title: str | None = None
+        self.next_row = 0
+        self.row_count = 0
+        self.sheet_titles: set[str] = set()
+        self.refreshed_at: float | None = None
+        self.cursor_stale = False
+        self.row_keys = RowKeyIndex(settings.SHEETS_ROW_KEY_INDEX_SIZE)
+        self._prepared_worksheets: set[int] = set()
+        self._handles: Dict[str, Tuple[Any, Any]] = {}
+
+    def is_fresh(self) -> bool:
+        return self.refreshed_at is not None and time.monotonic() - self.refreshed_at < settings.SHEETS_CURSOR_REFRESH_SECONDS
+
+    def invalidate(self):
+        self.refreshed_at = None
+        self._handles.clear()
+
+
+_write_targets: Dict[str, SheetWriteTarget] = {}
+# Таблицы и их листы, открытые в текущем цикле выгрузки: (аккаунт, id таблицы) -> (таблица, листы).
+# Логические листы одной таблицы открывают её один раз за цикл.
+_open_spreadsheets: Dict[Tuple[str, str], Tuple[Any, List[Any]]] = {}
+# Когда админам последний раз сообщали об ошибке настройки по каждому листу
+_config_alerted_at: Dict[str, float] = {}
+
+
+def spreadsheet_id_for_sheet(sheet_name: str) -> str:
+    return settings.SHEETS_SPREADSHEET_ROUTING.get(sheet_name, settings.SPREADSHEET_ID)
+
+
+def get_row_key(item: dict) -> str:
+    return item.get('row_key') or f"q{item['id']}"
+
+
+def build_keyed_row(item: dict) -> List[Any]:
+    """Дополняет строку до скрытой колонки с ключом записи."""
+    row = list(item['row'])
+    key_column = settings.SHEETS_ROW_KEY_COLUMN
+    if len(row) >= key_column:
+        logger.warning(f"Row {item['id']} has {len(row)} columns and overlaps the row key column {key_column}, writing it without a key.")
+        return row
+    return row + [""] * (key_column - 1 - len(row)) + [get_row_key(item)]
+
+
+def column_letter(column: int) -> str:
+    return re.sub(r"\d", "", gspread.utils.rowcol_to_a1(1, column))
+
+
+def rollover_sort_key(title: str, sheet_name: str) -> Tuple[str, int] | None:
+    """'<лист> 2025-01-31 (2)' -> ('2025-01-31', 2); None, если это не лист ротации."""
+    match = re.fullmatch(rf"{re.escape(sheet_name)} (\d{{4}}-\d{{2}}-\d{{2}})(?: \((\d+)\))?", title)
+    if not match:
+        return None
+    return match.group(1), int(match.group(2) or 1)
+
+
+async def prepare_row_key_column(spreadsheet, worksheet):
+    key_column = settings.SHEETS_ROW_KEY_COLUMN
+    requests_body = []
+    if worksheet.col_count < key_column:
+        requests_body.append({"appendDimension": {
+            "sheetId": worksheet.id, "dimension": "COLUMNS", "length": key_column - worksheet.col_count}})
+    requests_body.append({"updateDimensionProperties": {
+        "range": {"sheetId": worksheet.id, "dimension": "COLUMNS", "startIndex": key_column - 1, "endIndex": key_column},
+        "properties": {"hiddenByUser": True},
+        "fields": "hiddenByUser"}})
+    await spreadsheet.batch_update({"requests": requests_body})
+
+
+async def open_spreadsheet(credential: SheetsCredential, spreadsheet_id: str) -> Tuple[Any, List[Any]]:
+    key = (credential.name, spreadsheet_id)
+    if key not in _open_spreadsheets:
+        agc = await credential.manager.authorize()
+        spreadsheet = await agc.open_by_key(spreadsheet_id)
+        _open_spreadsheets[key] = (spreadsheet, await spreadsheet.worksheets())
+    return _open_spreadsheets[key]
+
+
+async def refresh_write_target(credential: SheetsCredential, target: SheetWriteTarget):
+    """Выбирает активный лист (последний лист ротации) и перечитывает курсор."""
+    spreadsheet, worksheets = await open_spreadsheet(credential, target.spreadsheet_id)
+    by_title = {ws.title: ws for ws in worksheets}
+    if target.sheet_name not in by_title:
+        raise gspread.exceptions.WorksheetNotFound(target.sheet_name)
+
+    rollovers = [(key, ws) for ws in worksheets if (key := rollover_sort_key(ws.title, target.sheet_name))]
+    worksheet = max(rollovers, key=lambda pair: pair[0])[1] if rollovers else by_title[target.sheet_name]
+    if worksheet.id not in target._prepared_worksheets:
+        await prepare_row_key_column(spreadsheet, worksheet)
+        target._prepared_worksheets.add(worksheet.id)
+
+    target._handles = {credential.name: (spreadsheet, worksheet)}
+    target.worksheet_title = worksheet.title
+    target.sheet_titles = set(by_title)
+    target.row_count = worksheet.row_count
+    await reload_write_cursor(credential, target)
+    target.refreshed_at = time.monotonic()
+
+
+async def reload_write_cursor(credential: SheetsCredential, target: SheetWriteTarget):
+    """Номер свободной строки и ключи активного листа, без повторного открытия таблицы."""
+    _, worksheet = await get_write_handles(credential, target)
+    key_letter = column_letter(settings.SHEETS_ROW_KEY_COLUMN)
+    first_column, key_column = await worksheet.batch_get(["A:A", f"{key_letter}:{key_letter}"])
+    target.next_row = max(len(first_column), len(key_column)) + 1
+    target.row_keys.load(row[0] for row in key_column if row)
+    target.cursor_stale = False
+    logger.info(f"Refreshed write cursor for '{target.sheet_name}': worksheet '{worksheet.title}', "
+                f"next row {target.next_row}, {len(target.row_keys)} known row keys.")
+
+
+async def get_write_handles(credential: SheetsCredential, target: SheetWriteTarget) -> Tuple[Any, Any]:
+    """Таблица и активный лист, открытые от имени этого сервисного аккаунта."""
+    if credential.name not in target._handles:
+        spreadsheet, worksheets = await open_spreadsheet(credential, target.spreadsheet_id)
+        worksheet = next((ws for ws in worksheets if ws.title == target.worksheet_title), None)
+        if worksheet is None:
+            raise gspread.exceptions.WorksheetNotFound(target.worksheet_title)
+        target._handles[credential.name] = (spreadsheet, worksheet)
+    return target._handles[credential.name]
+
+
+async def roll_over_worksheet(credential: SheetsCredential, target: SheetWriteTarget):
+    """Переносит запись на новый датированный лист с той же строкой заголовков."""
+    spreadsheet, old_worksheet = await get_write_handles(credential, target)
+    header = (await old_worksheet.batch_get(["1:1"]))[0]
+    base_title = f"{target.sheet_name} {datetime.now(LOCAL_TIMEZONE).strftime('%Y-%m-%d')}"
+    title, suffix = base_title, 1
+    while title in target.sheet_titles:
+        suffix += 1
+        title = f"{base_title} ({suffix})"
+
+    worksheet = await spreadsheet.add_worksheet(
+        title=title, rows=settings.SHEETS_GRID_GROWTH_ROWS, cols=settings.SHEETS_ROW_KEY_COLUMN)
+    await prepare_row_key_column(spreadsheet, worksheet)
+    target._prepared_worksheets.add(worksheet.id)
+    _open_spreadsheets.pop((credential.name, target.spreadsheet_id), None)
+    next_row = 1
+    if header:
+        await worksheet.update(header, range_name="A1", value_input_option='USER_ENTERED')
+        next_row = 2
+
+    logger.warning(f"Worksheet '{target.worksheet_title}' reached {target.next_row - 1} rows, "
+                   f"rolled over '{target.sheet_name}' to new worksheet '{title}'.")
+    target._handles = {credential.name: (spreadsheet, worksheet)}
+    target.worksheet_title = title
+    target.sheet_titles.add(title)
+    target.next_row = next_row
+    target.row_count = settings.SHEETS_GRID_GROWTH_ROWS
+
+
+async def write_rows_at_cursor(credential: SheetsCredential, target: SheetWriteTarget, rows: List[List[Any]]):
+    if target.next_row - 1 + len(rows) > settings.SHEETS_MAX_ROWS_PER_WORKSHEET and target.next_row > 2:
+        # Перед созданием нового листа сверяемся с таблицей: курсор мог устареть.
+        _open_spreadsheets.pop((credential.name, target.spreadsheet_id), None)
+        await refresh_write_target(credential, target)
+        if target.next_row - 1 + len(rows) > settings.SHEETS_MAX_ROWS_PER_WORKSHEET and target.next_row > 2:
+            await roll_over_worksheet(credential, target)
+
+    spreadsheet, worksheet = await get_write_handles(credential, target)
+    last_row = target.next_row + len(rows) - 1
+    if last_row > target.row_count:
+        growth = max(last_row - target.row_count, settings.SHEETS_GRID_GROWTH_ROWS)
+        await spreadsheet.batch_update({"requests": [{"appendDimension": {
+            "sheetId": worksheet.id, "dimension": "ROWS", "length": growth}}]})
+        target.row_count += growth
+
+    response = await worksheet.update(rows, range_name=f"A{target.next_row}", value_input_option='USER_ENTERED')
+    if not is_expected_update(response, target.next_row, len(rows)):
+        # Google записал не туда или не столько, сколько ждали: перед следующим батчем перечитываем лист.
+        logger.warning(f"Unexpected update response for rows {target.next_row}-{last_row} of '{worksheet.title}': "
+                       f"{response}, re-reading the write cursor before the next batch.")
+        target.cursor_stale = True
+    target.next_row = last_row + 1
+
+
+def is_expected_update(response: Any, first_row: int, row_count: int) -> bool:
+    if not isinstance(response, dict):
+        return True
+    if response.get("updatedRows", row_count) != row_count:
+        return False
+    updated_range = response.get("updatedRange")
+    if not updated_range:
+        return True
+    start_cell = updated_range.split("!")[-1].split(":")[0]
+    return gspread.utils.a1_to_rowcol(start_cell)[0] == first_row
+
+
+class SheetsClientManager(gspread_asyncio.AsyncioGspreadClientManager):
+    """gspread_asyncio по умолчанию бесконечно повторяет 429/5xx и сетевые ошибки.
+    Пробрасываем их наверх, чтобы повторами управляли tenacity и circuit breaker."""
+
+    async def handle_gspread_error(self, e, method, args, kwargs):
+        raise e
+
+    async def handle_requests_error(self, e, method, args, kwargs):
+        raise e
+
+
+def build_client_manager(credentials_info: dict, scope: List[str]):
+    if settings.SHEETS_CLIENT == "httpx":
+        return HttpSheetsClientManager(credentials_info, scope)
+    creds = Credentials.from_service_account_info(credentials_info, scopes=scope)
+    return SheetsClientManager(lambda: creds)
+
+
+async def init_google_sheets_client() -> SheetsClientPool | None:
+    """GOOGLE_CREDENTIALS_JSON - ключ одного сервисного аккаунта или список ключей.
+    В пул попадают аккаунты, у которых есть доступ ко всем нужным таблицам."""
     logger.info("Initializing Google Sheets client...")
     if not settings.GOOGLE_CREDENTIALS_JSON:
         logger.error("GSheets credentials not found in GOOGLE_CREDENTIALS_JSON env variable. Sheets will not work.")
@@ -50,87 +357,335 @@ async def init_google_sheets_client() -> gspread_asyncio.AsyncioGspreadClientMan
 
     try:
         creds_json = json.loads(settings.GOOGLE_CREDENTIALS_JSON)
-
-        scope = [
-            "https://www.googleapis.com/auth/spreadsheets",
-            "https://www.googleapis.com/auth/drive",
-        ]
-
-        creds = Credentials.from_service_account_info(creds_json, scopes=scope)
-
-        agc_manager = gspread_asyncio.AsyncioGspreadClientManager(lambda: creds)
-        client = await agc_manager.authorize()
-        await client.open_by_key(settings.SPREADSHEET_ID)
-        logger.info("Google Sheets client initialized and spreadsheet access verified.")
-        return agc_manager
     except json.JSONDecodeError as e:
         logger.error(f"Failed to parse GOOGLE_CREDENTIALS_JSON. It might be malformed. Error: {e}")
-    except Exception as e:
-        logger.error(f"Unexpected error initializing Google Sheets client: {e}", exc_info=True)
-    return None
+        return None
+
+    scope = [
+        "https://www.googleapis.com/auth/spreadsheets",
+        "https://www.googleapis.com/auth/drive",
+    ]
+    spreadsheet_ids = {settings.SPREADSHEET_ID, *settings.SHEETS_SPREADSHEET_ROUTING.values()}
+    credentials = []
+    for index, credentials_info in enumerate(creds_json if isinstance(creds_json, list) else [creds_json]):
+        name = credentials_info.get("client_email") or f"credential-{index + 1}"
+        try:
+            agc_manager = build_client_manager(credentials_info, scope)
+            client = await agc_manager.authorize()
+            for spreadsheet_id in spreadsheet_ids:
+                await client.open_by_key(spreadsheet_id)
+            credentials.append(SheetsCredential(name, agc_manager))
+        except Exception as e:
+            logger.error(f"Sheets credential '{name}' failed to initialize and is excluded from the pool: {e}", exc_info=True)
+
+    if not credentials:
+        return None
+    logger.info(f"Google Sheets client ({settings.SHEETS_CLIENT}) initialized with {len(credentials)} credential(s) "
+                f"and access to {len(spreadsheet_ids)} spreadsheet(s) verified.")
+    return SheetsClientPool(credentials, settings.SHEETS_CREDENTIAL_STRATEGY, settings.SHEETS_CREDENTIAL_COOLDOWN_SECONDS)
 
 
 @retry_gspread_operation
-async def append_rows_to_sheet(worksheet: gspread_asyncio.AsyncioGspreadWorksheet, data: List[List[Any]]):
-    if not data:
+@record_breaker_outcome
+async def write_rows_to_sheet(sheets_pool: SheetsClientPool, sheet_name: str, items: List[dict]):
+    if not items:
         return
-    await worksheet.append_rows(data, value_input_option='USER_ENTERED')
-    logger.info(f"Successfully appended {len(data)} rows to sheet '{worksheet.title}'.")
+    target = _write_targets.setdefault(sheet_name, SheetWriteTarget(sheet_name, spreadsheet_id_for_sheet(sheet_name)))
+    credential = sheets_pool.acquire()
+    started = time.monotonic()
+    try:
+        if not target.is_fresh():
+            await refresh_write_target(credential, target)
+        elif target.cursor_stale:
+            await reload_write_cursor(credential, target)
+
+        new_items = [item for item in items if get_row_key(item) not in target.row_keys]
+        if len(new_items) < len(items):
+            logger.info(f"Skipping {len(items) - len(new_items)} rows already present in sheet '{sheet_name}'.")
+        if not new_items:
+            return
+        await write_rows_at_cursor(credential, target, [build_keyed_row(item) for item in new_items])
+    except Exception as e:
+        if is_outage_error(e):
+            # Запрос мог дойти до Google: перед повтором перечитываем курсор и ключи из листа.
+            target.cursor_stale = True
+            if sheets_pool.record_failure(credential, e):
+                e.sheets_pool_rotated = True
+        elif is_config_error(e):
+            # Лист могли удалить или переименовать: открываем таблицу заново.
+            target.invalidate()
+        raise
+    finally:
+        sheets_api_latency.record(time.monotonic() - started)
+    sheets_pool.record_success(credential)
+    for item in new_items:
+        target.row_keys.add(get_row_key(item))
+    logger.info(f"Successfully wrote {len(new_items)} rows to sheet '{target.worksheet_title}' as '{credential.name}'.")
+
 
+def is_row_data_error(error: BaseException) -> bool:
+    """400 от API означает, что Google отверг сами данные, а не лист или доступ."""
+    return isinstance(error, gspread.exceptions.APIError) and getattr(error.response, "status_code", None) == 400
 
-async def process_batch_for_sheet(application: Application, agc_manager, sheet_name: str, items: List[dict]):
-    item_ids = [item['id'] for item in items]
-    data_to_write = [json.loads(item['data_json']) for item in items]
 
+async def write_items_to_sheet(sheets_pool, sheet_name: str, items: List[dict]) -> List[Tuple[dict, Exception]]:
+    """Пишет записи в лист. Если Google отверг данные, делит батч пополам, чтобы
+    здоровые строки ушли сразу, а проблемные были найдены. Возвращает (запись, ошибка)
+    для строк, которые записать не удалось; ошибки простоя пробрасываются наверх."""
     try:
-        agc = await agc_manager.authorize()
-        spreadsheet = await agc.open_by_key(settings.SPREADSHEET_ID)
-        worksheet = await spreadsheet.worksheet(sheet_name)
-        await append_rows_to_sheet(worksheet, data_to_write)
-        await database.mark_sheets_queue_items_processed(item_ids)
+        await write_rows_to_sheet(sheets_pool, sheet_name, items)
     except Exception as e:
-        logger.error(f"Failed to write batch to '{sheet_name}': {e}. Incrementing attempts.", exc_info=True)
-        await database.increment_sheets_queue_attempts(item_ids)
+        if is_outage_error(e) or is_config_error(e):
+            raise
+        if len(items) == 1 or not is_row_data_error(e):
+            return [(item, e) for item in items]
+        middle = len(items) // 2
+        logger.warning(f"Sheet '{sheet_name}' rejected a batch of {len(items)} rows, bisecting to isolate bad rows.")
+        failed = await write_items_to_sheet(sheets_pool, sheet_name, items[:middle])
+        failed += await write_items_to_sheet(sheets_pool, sheet_name, items[middle:])
+        return failed
+    await database.mark_sheets_queue_items_processed([item['id'] for item in items])
+    return []
 
-        failed_items_count = 0
-        for item in items:
-            if item['attempts'] + 1 >= MAX_WRITE_ATTEMPTS:
-                failed_items_count += 1
 
-        if failed_items_count > 0:
-            message = (f"🚨 <b>КРИТИЧЕСКАЯ ОШИБКА GOOGLE SHEETS</b> 🚨\n"
-                       f"Не удалось записать данные в лист <b>'{html.escape(sheet_name)}'</b> после {MAX_WRITE_ATTEMPTS} попыток.\n"
-                       f"<b>Ошибка:</b> <pre>{html.escape(str(e))[:1000]}</pre>\n"
-                       f"❗️ <b>{failed_items_count} записей помечены как 'неудачные' и больше не будут обрабатываться.</b> Проверьте БД и логи.")
+async def process_batch_for_sheet(application: Application, sheets_pool, sheet_name: str, items: List[dict]) -> int:
+    """Возвращает число записей, чей статус изменился (записаны, отложены или в dead letter);
+    0 - если Google недоступен и всё осталось в очереди как было."""
+    writable_items, dead_items = [], []
+    for item in items:
+        try:
+            item['row'] = json.loads(item['data_json'])
+            writable_items.append(item)
+        except (TypeError, ValueError) as e:
+            dead_items.append((item, e))
+
+    failed_items = []
+    handled = 0
+    try:
+        if writable_items:
+            failed_items = await write_items_to_sheet(sheets_pool, sheet_name, writable_items)
+            handled = len(writable_items)
+    except Exception as e:
+        if is_config_error(e):
+            logger.error(f"Google Sheets configuration error while writing to '{sheet_name}': {e!r}. Pending items stay in queue.")
+            await report_config_error(application, sheet_name, e)
+        elif is_outage_error(e):
+            # Простой Google не засчитывается записям как неудачная попытка.
+            logger.warning(f"Google Sheets unavailable while writing to '{sheet_name}': {e}. Pending items stay in queue.")
+        else:
+            raise
+
+    retry_ids = []
+    for item, error in failed_items:
+        if item['attempts'] + 1 >= MAX_WRITE_ATTEMPTS:
+            dead_items.append((item, error))
+        else:
+            retry_ids.append(item['id'])
 
-            if settings.ADMIN_IDS:
-                for admin_id in settings.ADMIN_IDS:
-                    try:
-                        await application.bot.send_message(admin_id, message, parse_mode=ParseMode.HTML)
-                    except Exception as notify_err:
-                        logger.error(f"Failed to notify admin {admin_id}: {notify_err}")
+    if retry_ids:
+        logger.error(f"Failed to write {len(retry_ids)} rows to '{sheet_name}': {failed_items[0][1]}. Incrementing attempts.")
+        await database.increment_sheets_queue_attempts(retry_ids)
 
+    if dead_items:
+        await database.move_sheets_queue_items_to_dead_letter([(item['id'], str(error)) for item, error in dead_items])
+        message = (f"🚨 <b>КРИТИЧЕСКАЯ ОШИБКА GOOGLE SHEETS</b> 🚨\n"
+                   f"Не удалось записать данные в лист <b>'{html.escape(sheet_name)}'</b> после {MAX_WRITE_ATTEMPTS} попыток.\n"
+                   f"<b>Ошибка:</b> <pre>{html.escape(str(dead_items[0][1]))[:1000]}</pre>\n"
+                   f"❗️ <b>{len(dead_items)} записей перемещены в таблицу sheets_dead_letter</b>, остальные записи пишутся дальше. "
+                   f"Вернуть их в очередь: <code>python -m tools.sheets_dead_letter replay --all</code>")
+        await notify_admins(application, message)
+    return handled + len(items) - len(writable_items)
 
-async def batch_writer_task(application: Application, stop_event: asyncio.Event, agc_manager, bot_data):
-    logger.info("Batch writer task started.")
-    while not stop_event.is_set():
+
+async def report_config_error(application: Application, sheet_name: str, error: BaseException):
+    now = time.monotonic()
+    alerted_at = _config_alerted_at.get(sheet_name)
+    if alerted_at is not None and now - alerted_at < settings.SHEETS_CONFIG_ALERT_INTERVAL_SECONDS:
+        return
+    _config_alerted_at[sheet_name] = now
+    message = (f"⚠️ <b>Нет доступа к листу Google Sheets '{html.escape(sheet_name)}'</b>\n"
+               f"Проверьте ключ сервисного аккаунта, права доступа к таблице и название листа. "
+               f"Записи остаются в очереди и будут записаны после исправления.\n"
+               f"<b>Ошибка:</b> <pre>{html.escape(repr(error))[:1000]}</pre>")
+    await notify_admins(application, message)
+
+
+async def report_breaker_transition(application: Application, reported_state: BreakerState) -> BreakerState:
+    """Одно уведомление на размыкание и одно на восстановление, а не на каждый батч."""
+    state = sheets_breaker.state
+    if state == BreakerState.HALF_OPEN or state == reported_state:
+        return reported_state
+    if state == BreakerState.OPEN and reported_state == BreakerState.CLOSED:
+        message = (f"⚠️ <b>Google Sheets недоступен</b>\n"
+                   f"После {sheets_breaker.consecutive_failures} ошибок подряд запись приостановлена. "
+                   f"Данные копятся в очереди, проверка связи раз в {settings.SHEETS_BREAKER_RECOVERY_SECONDS} сек.\n"
+                   f"<b>Ошибка:</b> <pre>{html.escape(sheets_breaker.last_error or '')[:1000]}</pre>")
+        await notify_admins(application, message)
+        return state
+    if state == BreakerState.CLOSED and reported_state == BreakerState.OPEN:
+        await notify_admins(application, "✅ <b>Google Sheets снова доступен</b>\nЗапись из очереди возобновлена.")
+    return state
+
+
+class GoogleSheetsSink(ExportSink):
+    """Основной получатель: пишет необработанные записи в Google Sheets и помечает их is_processed.
+    Батч забирается из очереди с арендой, поэтому бот и sheets_worker.py не пишут одни и те же строки."""
+
+    name = "google_sheets"
+
+    def __init__(self, sheets_pool, worker_id: str = WORKER_ID):
+        self.sheets_pool = sheets_pool
+        self.worker_id = worker_id
+        self.reported_state = BreakerState.CLOSED
+        self._health_logged_at: float | None = None
+
+    async def pending_items(self) -> List[dict]:
+        return await database.claim_sheets_queue_batch(self.worker_id, settings.SHEETS_BATCH_SIZE,
+                                                       settings.SHEETS_CLAIM_LEASE_SECONDS)
+
+    async def export(self, application: Application, items: List[dict]) -> int:
+        logger.info(f"Found {len(items)} items in queue to write to Google Sheets.")
+        items_by_sheet = defaultdict(list)
+        for item in items:
+            items_by_sheet[item['sheet_name']].append(item)
+
+        handled = 0
+        _open_spreadsheets.clear()
         try:
-            batch = await database.get_sheets_queue_batch()
-            if batch:
-                logger.info(f"Found {len(batch)} items in queue to write to Google Sheets.")
-                items_by_sheet = defaultdict(list)
-                for item in batch:
-                    items_by_sheet[item['sheet_name']].append(item)
+            for sheet_name, sheet_items in items_by_sheet.items():
+                if not sheets_breaker.allow_request():
+                    logger.info(f"Circuit breaker is open, skipping Google Sheets write for {len(items)} queued items.")
+                    break
+                try:
+                    handled += await process_batch_for_sheet(application, self.sheets_pool, sheet_name, sheet_items)
+                finally:
+                    # Проба без обращения к API или с иной ошибкой не должна держать breaker полуоткрытым.
+                    sheets_breaker.release_probe()
+        finally:
+            # Незаписанные строки сразу возвращаем в очередь, не дожидаясь конца аренды.
+            await database.release_sheets_queue_claims(self.worker_id)
+
+        self.reported_state = await report_breaker_transition(application, self.reported_state)
+        self.log_credentials_health()
+        return handled
 
-                for sheet_name, items in items_by_sheet.items():
-                    await process_batch_for_sheet(application, agc_manager, sheet_name, items)
+    def log_credentials_health(self):
+        if not isinstance(self.sheets_pool, SheetsClientPool):
+            return
+        now = time.monotonic()
+        if self._health_logged_at is not None and now - self._health_logged_at < settings.SHEETS_METRICS_INTERVAL_SECONDS:
+            return
+        self._health_logged_at = now
+        logger.info(f"Sheets credentials health: {self.sheets_pool.format_health()}")
 
-            await asyncio.sleep(settings.BATCH_INTERVAL)
+
+def build_export_sinks(sheets_pool) -> List[ExportSink]:
+    sinks = [GoogleSheetsSink(sheets_pool)] if sheets_pool else []
+    return sinks + build_local_sinks()
+
+
+async def run_export_cycle(application: Application, sinks: List[ExportSink]) -> int:
+    handled = 0
+    for sink in sinks:
+        items = []
+        try:
+            items = await sink.pending_items()
+            if items:
+                handled += await sink.export(application, items)
         except asyncio.CancelledError:
-            logger.info("Batch writer task was cancelled.")
-            break
+            if items:
+                # Записи не помечены обработанными и останутся в очереди; уже дошедшие
+                # до таблицы строки при следующем запуске отсеются по ключу строки.
+                logger.warning(f"Shutdown interrupted export of {len(items)} items to sink '{sink.name}', "
+                               f"they stay queued for the next start.")
+            raise
         except Exception as e:
-            logger.error(f"Unhandled exception in batch_writer_task loop: {e}", exc_info=True)
-            await asyncio.sleep(60)
+            logger.error(f"Export to sink '{sink.name}' failed: {e}", exc_info=True)
+    return handled
+
+
+async def flush_on_shutdown(application: Application, sinks: List[ExportSink]):
+    """Дописывает очередь без пауз между батчами, пока есть прогресс и не вышло время."""
+    deadline = time.monotonic() + settings.SHEETS_SHUTDOWN_FLUSH_SECONDS
+    flushed = 0
+    while time.monotonic() < deadline:
+        handled = await run_export_cycle(application, sinks)
+        if not handled:
+            break
+        flushed += handled
+    logger.info(f"Shutdown flush handled {flushed} queued items.")
+
+
+async def report_queue_leftovers():
+    stats = await database.get_sheets_queue_stats()
+    if not stats:
+        logger.info("Batch writer stopped with an empty Google Sheets queue.")
+        return
+    by_sheet = ", ".join(f"'{row['sheet_name']}': {row['depth']}" for row in stats)
+    logger.warning(f"Batch writer stopped with {sum(row['depth'] for row in stats)} rows still queued ({by_sheet}). "
+                   f"They will be written after the next start.")
+
+
+async def init_google_sheets_client_with_retries(stop_event: asyncio.Event) -> SheetsClientPool | None:
+    """Повторяет инициализацию, пока Google не ответит или не придёт stop_event.
+    Без ключа или SPREADSHEET_ID повторять нечего - сразу возвращает None."""
+    if not settings.GOOGLE_CREDENTIALS_JSON or not settings.SPREADSHEET_ID:
+        return await init_google_sheets_client()
+
+    started = time.monotonic()
+    delay = settings.SHEETS_INIT_RETRY_MIN_SECONDS
+    attempt = 0
+    while not stop_event.is_set():
+        attempt += 1
+        sheets_pool = await init_google_sheets_client()
+        if sheets_pool:
+            logger.info(f"Google Sheets client ready in {time.monotonic() - started:.2f}s after {attempt} attempt(s).")
+            return sheets_pool
+        logger.warning(f"Google Sheets init attempt {attempt} failed, retrying in {delay}s. "
+                       f"New rows stay buffered in sheets_queue.")
+        try:
+            await asyncio.wait_for(stop_event.wait(), timeout=delay)
+        except asyncio.TimeoutError:
+            pass
+        delay = min(delay * 2, settings.SHEETS_INIT_RETRY_MAX_SECONDS)
+    return None
+
+
+async def start_batch_writer_when_ready(application: Application, stop_event: asyncio.Event, bot_data):
+    sheets_pool = await init_google_sheets_client_with_retries(stop_event)
+    if not sheets_pool:
+        if not settings.EXPORT_SINKS:
+            logger.warning("Google Sheets client is not available and no local sinks are configured. Recording to sheets is disabled.")
+            return
+        logger.warning("Google Sheets client is not available, starting batch writer with local sinks only.")
+    await batch_writer_task(application, stop_event, sheets_pool, bot_data)
+
+
+async def batch_writer_task(application: Application, stop_event: asyncio.Event, sheets_pool, bot_data):
+    """Останавливается по stop_event: текущий батч дописывается, затем очередь
+    дописывается ещё SHEETS_SHUTDOWN_FLUSH_SECONDS, остаток пишется в лог."""
+    sinks = build_export_sinks(sheets_pool)
+    logger.info(f"Batch writer task started with sinks: {', '.join(sink.name for sink in sinks) or 'none'}.")
+    try:
+        while not stop_event.is_set():
+            try:
+                await run_export_cycle(application, sinks)
+                await asyncio.wait_for(stop_event.wait(), timeout=settings.BATCH_INTERVAL)
+            except asyncio.TimeoutError:
+                continue
+            except Exception as e:
+                logger.error(f"Unhandled exception in batch_writer_task loop: {e}", exc_info=True)
+                await asyncio.sleep(60)
+
+        if settings.SHEETS_SHUTDOWN_FLUSH_SECONDS > 0:
+            await flush_on_shutdown(application, sinks)
+    except asyncio.CancelledError:
+        logger.info("Batch writer task was cancelled.")
+    finally:
+        try:
+            await report_queue_leftovers()
+        finally:
+            if sheets_pool:
+                await sheets_pool.aclose()
 
-    logger.info("Batch writer task finished.")
\ No newline at end of file
+    logger.info("Batch writer task finished.")
@@ -0,0 +1,69 @@
+import logging
+from array import array
+from bisect import bisect_left
+from typing import Iterable
+
+from core import database
+
+logger = logging.getLogger(__name__)
+
+LEGACY_BOT_DATA_KEY = "users_interacted"
+
+
+class InteractedUsers:
+    """Пользователи, которые хоть раз писали боту.
+
+    Источник правды - таблица interacted_users; в памяти держится отсортированный
+    array('q') (8 байт на id вместо ~60 у set[int]), проверка - бинарным поиском.
+    """
+
+    def __init__(self):
+        self._ids = array('q')
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, user_id: int) -> bool:
+        index = bisect_left(self._ids, user_id)
+        return index < len(self._ids) and self._ids[index] == user_id
+
+    async def load(self, bot_data: dict):
+        """Читает id из БД; при первом запуске переносит туда set из bot_data."""
+        legacy_ids = bot_data.get(LEGACY_BOT_DATA_KEY)
+        if legacy_ids:
+            if not await database.add_interacted_users(sorted(legacy_ids)):
+                logger.error(f"Failed to migrate {len(legacy_ids)} interacted users from bot_data, keeping the old set.")
+                self._ids = array('q', sorted(legacy_ids))
+                return
+            logger.info(f"Migrated {len(legacy_ids)} interacted users from bot_data to the database.")
+        bot_data.pop(LEGACY_BOT_DATA_KEY, None)
+        self._ids = array('q', await database.get_interacted_user_ids())
+        logger.info(f"Loaded {len(self._ids)} interacted users.")
+
+    async def add(self, user_id: int) -> bool:
+        """Добавляет пользователя; False, если он уже был или запись в БД не удалась.
+        Сначала пишем в БД, чтобы память не расходилась с источником правды."""
+        if user_id in self:
+            return False
+        if not await database.add_interacted_users([user_id]):
+            logger.error(f"Failed to save interacted user {user_id}, will retry on the next update.")
+            return False
+        # Пока шла запись, того же пользователя мог добавить параллельный апдейт.
+        index = bisect_left(self._ids, user_id)
+        if index < len(self._ids) and self._ids[index] == user_id:
+            return False
+        self._ids.insert(index, user_id)
+        return True
+
+    async def remove_many(self, user_ids: Iterable[int]) -> int:
+        to_remove = {user_id for user_id in user_ids if user_id in self}
+        if not to_remove:
+            return 0
+        if not await database.remove_interacted_users(sorted(to_remove)):
+            logger.error(f"Failed to remove {len(to_remove)} interacted users from the database, keeping them.")
+            return 0
+        self._ids = array('q', (user_id for user_id in self._ids if user_id not in to_remove))
+        return len(to_remove)
+
+
+interacted_users = InteractedUsers()
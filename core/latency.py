@@ -0,0 +1,23 @@
+import statistics
+from collections import deque
+
+
+class LatencyWindow:
+    """Последние N замеров длительности, для перцентилей в метриках."""
+
+    def __init__(self, size: int):
+        self._samples = deque(maxlen=size)
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, pct: int) -> float | None:
+        if not self._samples:
+            return None
+        if len(self._samples) == 1:
+            return self._samples[0]
+        return statistics.quantiles(self._samples, n=100, method="inclusive")[pct - 1]
+
+
+def format_latency(seconds: float | None) -> str:
+    return f"{seconds:.2f}s" if seconds is not None else "n/a"
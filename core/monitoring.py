@@ -1,16 +1,32 @@
 import asyncio
+import html
 import logging
 import time
 import os
 from datetime import datetime
 
 from telegram.ext import Application
+from telegram.constants import ParseMode
 
-from core import settings
+from core import settings, database
+from core.latency import LatencyWindow, format_latency
+from core.rate_limiter import RequestPriority
 
 logger = logging.getLogger(__name__)
 
 
+sheets_api_latency = LatencyWindow(settings.SHEETS_METRICS_LATENCY_SAMPLES)
+
+
+async def notify_admins(application: Application, message: str):
+    for admin_id in settings.ADMIN_IDS:
+        try:
+            await application.bot.send_message(admin_id, message, parse_mode=ParseMode.HTML,
+                                               rate_limit_args=RequestPriority.NOTIFICATION)
+        except Exception as notify_err:
+            logger.error(f"Failed to notify admin {admin_id}: {notify_err}")
+
+
 async def heartbeat_task(application: Application, stop_event: asyncio.Event, bot_data):
     while not stop_event.is_set():
         try:
@@ -33,4 +49,66 @@ async def heartbeat_task(application: Application, stop_event: asyncio.Event, bo
         try:
             os.remove(settings.HEARTBEAT_FILE)
         except OSError:
-            pass
\ No newline at end of file
+            pass
+
+
+async def collect_sheets_queue_metrics() -> dict:
+    """Глубина и возраст очереди и скорость записи берутся из БД, поэтому видны,
+    даже если пишет отдельный процесс; задержка API - только по этому процессу."""
+    now = time.time()
+    stats = await database.get_sheets_queue_stats()
+    oldest_created_at = min((row['oldest_created_at'] for row in stats), default=None)
+    window = settings.SHEETS_METRICS_RATE_WINDOW_SECONDS
+    written = await database.count_sheets_rows_processed_since(now - window)
+    return {
+        "depth_by_sheet": {row['sheet_name']: row['depth'] for row in stats},
+        "depth": sum(row['depth'] for row in stats),
+        "oldest_age_seconds": now - oldest_created_at if oldest_created_at else 0.0,
+        "rows_per_minute": written * 60 / window,
+        "api_latency_p50": sheets_api_latency.percentile(50),
+        "api_latency_p95": sheets_api_latency.percentile(95),
+    }
+
+
+async def sheets_lag_monitor_task(application: Application, stop_event: asyncio.Event, bot_data):
+    threshold_seconds = settings.SHEETS_LAG_ALERT_MINUTES * 60
+    lag_alert_active = False
+    while not stop_event.is_set():
+        try:
+            metrics = await collect_sheets_queue_metrics()
+            lag_minutes = metrics['oldest_age_seconds'] / 60
+            logger.info(
+                f"Sheets queue metrics: depth={metrics['depth']} {metrics['depth_by_sheet']}, "
+                f"oldest={lag_minutes:.1f} min, written={metrics['rows_per_minute']:.1f} rows/min, "
+                f"api latency p50={format_latency(metrics['api_latency_p50'])} p95={format_latency(metrics['api_latency_p95'])}"
+            )
+
+            if metrics['oldest_age_seconds'] > threshold_seconds and not lag_alert_active:
+                lag_alert_active = True
+                by_sheet = "\n".join(f"• {html.escape(name)}: {depth}" for name, depth in sorted(metrics['depth_by_sheet'].items()))
+                await notify_admins(
+                    application,
+                    f"⏳ <b>Запись в Google Sheets отстаёт</b>\n"
+                    f"Самая старая запись ждёт {lag_minutes:.0f} мин. (порог {settings.SHEETS_LAG_ALERT_MINUTES} мин.)\n"
+                    f"Скорость записи за {settings.SHEETS_METRICS_RATE_WINDOW_SECONDS // 60} мин.: {metrics['rows_per_minute']:.1f} строк/мин.\n"
+                    f"В очереди {metrics['depth']}:\n{by_sheet}"
+                )
+            elif metrics['oldest_age_seconds'] <= threshold_seconds and lag_alert_active:
+                lag_alert_active = False
+                await notify_admins(
+                    application,
+                    f"✅ <b>Запись в Google Sheets догнала очередь</b>\n"
+                    f"Отставание: {lag_minutes:.0f} мин., в очереди: {metrics['depth']}."
+                )
+
+            await asyncio.wait_for(stop_event.wait(), timeout=settings.SHEETS_METRICS_INTERVAL_SECONDS)
+
+        except asyncio.TimeoutError:
+            continue
+        except asyncio.CancelledError:
+            break
+        except Exception as e:
+            logger.error(f"Error in sheets lag monitor task: {e}", exc_info=True)
+            await asyncio.sleep(settings.SHEETS_METRICS_INTERVAL_SECONDS)
+
+    logger.info("Sheets lag monitor task finished.")
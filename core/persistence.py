@@ -0,0 +1,458 @@
+import asyncio
+import hashlib
+import io
+import json
+import logging
+import pickle
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from telegram import Bot, TelegramObject, Update
+from telegram.ext import Application, BasePersistence, PersistenceInput, PicklePersistence
+
+from core import settings
+from core.latency import LatencyWindow, format_latency
+
+logger = logging.getLogger(__name__)
+
+ConversationKey = Tuple[int | str, ...]
+_NOT_WRITTEN = object()
+# Таблица -> столбец ключа
+PERSISTENCE_TABLES = {"user_data": "user_id", "chat_data": "chat_id", "bot_data": "key", "callback_data": "id",
+                      "conversations": "key"}
+# Метки бота те же, что у PicklePersistence, поэтому читаются и данные, перенесённые из pickle-файла.
+_KNOWN_BOT_ID = "a known bot replaced by PTB's PicklePersistence"
+_UNKNOWN_BOT_ID = "an unknown bot replaced by PTB's PicklePersistence"
+
+
+def _restore_telegram_object(cls: type, state: dict, bot: Optional[Bot]) -> TelegramObject:
+    obj = cls.__new__(cls)
+    obj.__setstate__(state)
+    if bot is not None:
+        obj.set_bot(bot)
+    return obj
+
+
+class _BotPickler(pickle.Pickler):
+    """Бот не сериализуется: вместо него пишется метка, а объекты Telegram
+    сохраняются вместе с ней, чтобы после чтения снова получить бота."""
+
+    def __init__(self, bot: Optional[Bot], *args, **kwargs):
+        self._bot = bot
+        super().__init__(*args, **kwargs)
+
+    def reducer_override(self, obj: Any) -> Any:
+        if not isinstance(obj, TelegramObject):
+            return NotImplemented
+        return _restore_telegram_object, (obj.__class__, obj.__getstate__(), self._bot)
+
+    def persistent_id(self, obj: Any) -> Optional[str]:
+        if obj is self._bot and obj is not None:
+            return _KNOWN_BOT_ID
+        if isinstance(obj, Bot):
+            logger.warning("Unknown bot instance found in persistence data, it will be loaded as None.")
+            return _UNKNOWN_BOT_ID
+        return None
+
+
+class _BotUnpickler(pickle.Unpickler):
+    def __init__(self, bot: Optional[Bot], *args, **kwargs):
+        self._bot = bot
+        super().__init__(*args, **kwargs)
+
+    def persistent_load(self, pid: str) -> Optional[Bot]:
+        if pid == _KNOWN_BOT_ID:
+            return self._bot
+        if pid == _UNKNOWN_BOT_ID:
+            return None
+        raise pickle.UnpicklingError(f"Unknown persistent id in persistence data: {pid!r}")
+
+
+class SQLitePersistence(BasePersistence):
+    """Persistence в SQLite вместо одного pickle-файла.
+
+    Каждый пользователь, чат, ключ верхнего уровня bot_data и ключ разговора
+    хранится отдельной строкой. При записи сравнивается хэш сериализованных данных
+    с последним записанным, поэтому пишутся только изменившиеся ключи, и цена
+    записи не растёт с числом пользователей. user_data читается из базы при первом
+    апдейте пользователя (refresh_user_data), а не целиком при старте.
+
+    Если база пустая, а рядом лежит старый файл PicklePersistence, данные из него
+    переносятся при первом запуске.
+    """
+
+    def __init__(self, filepath: Path, migrate_from: Optional[Path] = None,
+                 store_data: Optional[PersistenceInput] = None, update_interval: float = 60):
+        super().__init__(store_data=store_data, update_interval=update_interval)
+        self.filepath = Path(filepath)
+        self.migrate_from = Path(migrate_from) if migrate_from else None
+        self._initialized = False
+        self._init_lock = asyncio.Lock()
+        self._write_lock = asyncio.Lock()
+        self._write_task: Optional[asyncio.Task] = None
+
+        self._bot_data: Optional[dict] = None
+        self._bot_data_keys: set[str] = set()
+        self._loaded_user_ids: set[int] = set()
+        # Хэши последних записанных значений: по ним отсекаются записи без изменений.
+        self._written_hashes: Dict[Tuple[str, Any], Optional[bytes]] = {}
+        # Ключи, ожидающие записи: (таблица, ключ) -> сериализованные данные или None для удаления.
+        self._dirty: Dict[Tuple[str, Any], Optional[bytes]] = {}
+
+    # --- сериализация ---
+
+    def _dumps(self, obj: Any) -> bytes:
+        buffer = io.BytesIO()
+        _BotPickler(self.bot, buffer, protocol=pickle.HIGHEST_PROTOCOL).dump(obj)
+        return buffer.getvalue()
+
+    def _loads(self, data: bytes) -> Any:
+        return _BotUnpickler(self.bot, io.BytesIO(data)).load()
+
+    def _remember_written(self, table: str, rows: List[tuple]):
+        for key, data in rows:
+            self._written_hashes[(table, key)] = hashlib.blake2b(data, digest_size=16).digest()
+
+    @staticmethod
+    def _conversation_key(name: str, key: ConversationKey) -> str:
+        return json.dumps([name, list(key)], ensure_ascii=False)
+
+    # --- работа с базой ---
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.filepath)
+        conn.execute("PRAGMA journal_mode=WAL;")
+        return conn
+
+    def _init_schema_sync(self) -> bool:
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS user_data (user_id INTEGER PRIMARY KEY, data BLOB NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS chat_data (chat_id INTEGER PRIMARY KEY, data BLOB NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS bot_data (key TEXT PRIMARY KEY, data BLOB NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS callback_data (id INTEGER PRIMARY KEY CHECK (id = 1), data BLOB NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS conversations (key TEXT PRIMARY KEY, name TEXT NOT NULL, data BLOB NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_conversations_name ON conversations (name)")
+            # Время последней записи ключа, по нему сборщик мусора находит брошенные разговоры.
+            for table in PERSISTENCE_TABLES:
+                columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+                if "updated_at" not in columns:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN updated_at REAL")
+                    conn.execute(f"UPDATE {table} SET updated_at = ?", (time.time(),))
+            is_empty = not any(
+                conn.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone()
+                for table in ("user_data", "chat_data", "bot_data", "conversations")
+            )
+        return is_empty
+
+    def _fetch_sync(self, query: str, params: tuple = ()) -> List[tuple]:
+        with self._connect() as conn:
+            return conn.execute(query, params).fetchall()
+
+    def _write_sync(self, dirty: Dict[Tuple[str, Any], Optional[bytes]]):
+        now = time.time()
+        with self._connect() as conn:
+            for (table, key), data in dirty.items():
+                if table == "conversations":
+                    if data is None:
+                        conn.execute("DELETE FROM conversations WHERE key = ?", (key,))
+                    else:
+                        conn.execute("INSERT OR REPLACE INTO conversations (key, name, data, updated_at) VALUES (?, ?, ?, ?)",
+                                     (key, json.loads(key)[0], data, now))
+                    continue
+                key_column = PERSISTENCE_TABLES[table]
+                if data is None:
+                    conn.execute(f"DELETE FROM {table} WHERE {key_column} = ?", (key,))
+                else:
+                    conn.execute(f"INSERT OR REPLACE INTO {table} ({key_column}, data, updated_at) VALUES (?, ?, ?)",
+                                 (key, data, now))
+            conn.commit()
+
+    async def _ensure_initialized(self):
+        if self._initialized:
+            return
+        async with self._init_lock:
+            if self._initialized:
+                return
+            is_empty = await asyncio.to_thread(self._init_schema_sync)
+            if is_empty and self.migrate_from and self.migrate_from.exists():
+                await self._migrate_from_pickle()
+            self._initialized = True
+
+    async def _migrate_from_pickle(self):
+        logger.info(f"Migrating persistence data from {self.migrate_from} to {self.filepath}...")
+        legacy = PicklePersistence(filepath=self.migrate_from)
+        if self.bot is not None:
+            legacy.set_bot(self.bot)
+        dirty: Dict[Tuple[str, Any], Optional[bytes]] = {}
+        for user_id, data in (await legacy.get_user_data()).items():
+            dirty[("user_data", user_id)] = self._dumps(data)
+        for chat_id, data in (await legacy.get_chat_data()).items():
+            dirty[("chat_data", chat_id)] = self._dumps(data)
+        for key, value in (await legacy.get_bot_data()).items():
+            dirty[("bot_data", key)] = self._dumps(value)
+        callback_data = await legacy.get_callback_data()
+        if callback_data is not None:
+            dirty[("callback_data", 1)] = self._dumps(callback_data)
+        for name, conversation in (legacy.conversations or {}).items():
+            for key, state in conversation.items():
+                dirty[("conversations", self._conversation_key(name, key))] = self._dumps(state)
+        await asyncio.to_thread(self._write_sync, dirty)
+        logger.info(f"Migrated {len(dirty)} persistence keys from the pickle file.")
+
+    # --- сборка мусора ---
+
+    async def get_stale_conversations(self, name: str, older_than: float) -> List[Tuple[ConversationKey, int]]:
+        """Ключи разговора name, не менявшиеся с older_than, и размер их данных в байтах."""
+        await self._ensure_initialized()
+        rows = await asyncio.to_thread(
+            self._fetch_sync,
+            "SELECT key, length(data) FROM conversations WHERE name = ? AND updated_at < ? ORDER BY updated_at",
+            (name, older_than),
+        )
+        return [(tuple(json.loads(key)[1]), size) for key, size in rows]
+
+    async def get_stale_user_data(self, older_than: float) -> List[Tuple[int, int]]:
+        await self._ensure_initialized()
+        return await asyncio.to_thread(
+            self._fetch_sync,
+            "SELECT user_id, length(data) FROM user_data WHERE updated_at < ? ORDER BY updated_at",
+            (older_than,),
+        )
+
+    # --- отложенная запись ---
+
+    def _mark(self, table: str, key: Any, data: Optional[bytes]):
+        digest = hashlib.blake2b(data, digest_size=16).digest() if data is not None else None
+        if self._written_hashes.get((table, key), _NOT_WRITTEN) == digest and (table, key) not in self._dirty:
+            return
+        self._dirty[(table, key)] = data
+        self._written_hashes[(table, key)] = digest
+        self._schedule_write()
+
+    def _schedule_write(self):
+        # Application обновляет persistence пачкой корутин через gather:
+        # собираем их изменения и пишем одной транзакцией.
+        if self._write_task is None or self._write_task.done():
+            self._write_task = asyncio.create_task(self._write_dirty())
+            # Ошибка уже записана в лог, а ключи остались в очереди до следующего flush().
+            self._write_task.add_done_callback(lambda task: task.cancelled() or task.exception())
+
+    async def _write_dirty(self):
+        await asyncio.sleep(0)
+        await self._ensure_initialized()
+        async with self._write_lock:
+            if not self._dirty:
+                return
+            dirty, self._dirty = self._dirty, {}
+            try:
+                await asyncio.to_thread(self._write_sync, dirty)
+            except sqlite3.Error as e:
+                logger.error(f"Failed to write {len(dirty)} persistence keys: {e}", exc_info=True)
+                # Вернём ключи в очередь записи, не затирая более свежие изменения.
+                for key, data in dirty.items():
+                    self._dirty.setdefault(key, data)
+                raise
+
+    # --- BasePersistence ---
+
+    async def get_user_data(self) -> Dict[int, dict]:
+        await self._ensure_initialized()
+        return {}
+
+    async def get_chat_data(self) -> Dict[int, dict]:
+        await self._ensure_initialized()
+        rows = await asyncio.to_thread(self._fetch_sync, "SELECT chat_id, data FROM chat_data")
+        self._remember_written("chat_data", rows)
+        return {chat_id: self._loads(data) for chat_id, data in rows}
+
+    async def get_bot_data(self) -> dict:
+        await self._ensure_initialized()
+        if self._bot_data is None:
+            rows = await asyncio.to_thread(self._fetch_sync, "SELECT key, data FROM bot_data")
+            self._remember_written("bot_data", rows)
+            self._bot_data = {key: self._loads(data) for key, data in rows}
+            self._bot_data_keys = set(self._bot_data)
+        return self._bot_data
+
+    async def get_callback_data(self) -> Optional[Any]:
+        await self._ensure_initialized()
+        rows = await asyncio.to_thread(self._fetch_sync, "SELECT data FROM callback_data WHERE id = 1")
+        return self._loads(rows[0][0]) if rows else None
+
+    async def get_conversations(self, name: str) -> Dict[ConversationKey, object]:
+        await self._ensure_initialized()
+        rows = await asyncio.to_thread(self._fetch_sync, "SELECT key, data FROM conversations WHERE name = ?", (name,))
+        self._remember_written("conversations", rows)
+        return {tuple(json.loads(key)[1]): self._loads(data) for key, data in rows}
+
+    async def update_conversation(self, name: str, key: ConversationKey, new_state: Optional[object]) -> None:
+        data = self._dumps(new_state) if new_state is not None else None
+        self._mark("conversations", self._conversation_key(name, key), data)
+
+    async def _load_user_data(self, user_id: int) -> Optional[dict]:
+        await self._ensure_initialized()
+        rows = await asyncio.to_thread(self._fetch_sync, "SELECT data FROM user_data WHERE user_id = ?", (user_id,))
+        self._loaded_user_ids.add(user_id)
+        if not rows:
+            return None
+        self._remember_written("user_data", [(user_id, rows[0][0])])
+        return self._loads(rows[0][0])
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        if user_id not in self._loaded_user_ids:
+            # Данные пользователя меняли, не прочитав из базы: не затираем сохранённые ключи.
+            stored = await self._load_user_data(user_id) or {}
+            data = {**stored, **data}
+        self._mark("user_data", user_id, self._dumps(data))
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        self._mark("chat_data", chat_id, self._dumps(data))
+
+    async def update_bot_data(self, data: dict) -> None:
+        for key in self._bot_data_keys - set(data):
+            self._mark("bot_data", key, None)
+        for key, value in data.items():
+            self._mark("bot_data", key, self._dumps(value))
+        self._bot_data_keys = set(data)
+
+    async def update_callback_data(self, data: Any) -> None:
+        self._mark("callback_data", 1, self._dumps(data))
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        self._mark("chat_data", chat_id, None)
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._loaded_user_ids.discard(user_id)
+        self._mark("user_data", user_id, None)
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        if user_id in self._loaded_user_ids:
+            return
+        stored = await self._load_user_data(user_id)
+        if stored:
+            for key, value in stored.items():
+                user_data.setdefault(key, value)
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    async def flush(self) -> None:
+        if self._write_task and not self._write_task.done():
+            await self._write_task
+        await self._write_dirty()
+
+
+class PersistenceWriteBehind:
+    """Отложенная запись persistence вместо flush() на каждое изменение.
+
+    Изменённые ключи отмечаются через mark_dirty(): после каждого апдейта -
+    user_data и chat_data его пользователя и чата (их же Application передаст
+    в update_persistence). Запись идёт в фоне не чаще раза в interval_seconds
+    или сразу, когда накопилось max_dirty_keys изменений, и обязательно при
+    остановке бота.
+    """
+
+    def __init__(self, interval_seconds: float, max_dirty_keys: int, latency_samples: int):
+        self.interval_seconds = interval_seconds
+        self.max_dirty_keys = max_dirty_keys
+        self._dirty_keys: set = set()
+        self._flush_requested = asyncio.Event()
+        self.flush_latency = LatencyWindow(latency_samples)
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.last_dirty_count = 0
+        self.max_dirty_count = 0
+
+    def mark_dirty(self, key: Any):
+        self._dirty_keys.add(key)
+        self.max_dirty_count = max(self.max_dirty_count, len(self._dirty_keys))
+        if len(self._dirty_keys) >= self.max_dirty_keys:
+            self._flush_requested.set()
+
+    def mark_update(self, update: Update):
+        if update.effective_user:
+            self.mark_dirty(("user_data", update.effective_user.id))
+        if update.effective_chat:
+            self.mark_dirty(("chat_data", update.effective_chat.id))
+
+    @property
+    def dirty_count(self) -> int:
+        return len(self._dirty_keys)
+
+    async def flush(self, application: Application):
+        if not self._dirty_keys or not application.persistence:
+            return
+        dirty_keys, self._dirty_keys = self._dirty_keys, set()
+        dirty_count = len(dirty_keys)
+        self._flush_requested.clear()
+        started = time.monotonic()
+        try:
+            # update_persistence() передаёт в persistence всё изменённое с прошлого раза,
+            # flush() дожидается записи на диск.
+            await application.update_persistence()
+            await application.persistence.flush()
+        except Exception as e:
+            self.failed_flushes += 1
+            # Ключи остаются отмеченными, следующий flush повторит запись.
+            self._dirty_keys |= dirty_keys
+            logger.error(f"Write-behind flush of {dirty_count} dirty keys failed: {e}", exc_info=True)
+            return
+        finally:
+            self.flush_latency.record(time.monotonic() - started)
+        self.flushes += 1
+        self.last_dirty_count = dirty_count
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "dirty": self.dirty_count,
+            "last_dirty": self.last_dirty_count,
+            "max_dirty": self.max_dirty_count,
+            "flush_p50": self.flush_latency.percentile(50),
+            "flush_p95": self.flush_latency.percentile(95),
+        }
+
+
+write_behind = PersistenceWriteBehind(
+    interval_seconds=settings.PERSISTENCE_FLUSH_INTERVAL_SECONDS,
+    max_dirty_keys=settings.PERSISTENCE_FLUSH_MAX_DIRTY_KEYS,
+    latency_samples=settings.SHEETS_METRICS_LATENCY_SAMPLES,
+)
+
+
+async def persistence_write_behind_task(application: Application, stop_event: asyncio.Event, bot_data):
+    last_metrics_log = time.monotonic()
+    while not stop_event.is_set():
+        try:
+            stop_waiter = asyncio.create_task(stop_event.wait())
+            flush_waiter = asyncio.create_task(write_behind._flush_requested.wait())
+            try:
+                await asyncio.wait([stop_waiter, flush_waiter], timeout=write_behind.interval_seconds,
+                                   return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                stop_waiter.cancel()
+                flush_waiter.cancel()
+            await write_behind.flush(application)
+
+            if time.monotonic() - last_metrics_log >= settings.PERSISTENCE_METRICS_LOG_SECONDS:
+                last_metrics_log = time.monotonic()
+                metrics = write_behind.metrics()
+                logger.info(
+                    f"Persistence write-behind metrics: flushes={metrics['flushes']} failed={metrics['failed_flushes']}, "
+                    f"dirty last={metrics['last_dirty']} max={metrics['max_dirty']}, "
+                    f"flush p50={format_latency(metrics['flush_p50'])} p95={format_latency(metrics['flush_p95'])}"
+                )
+        except asyncio.CancelledError:
+            break
+        except Exception as e:
+            logger.error(f"Error in persistence write-behind task: {e}", exc_info=True)
+            await asyncio.sleep(write_behind.interval_seconds)
+
+    await write_behind.flush(application)
+    logger.info("Persistence write-behind task finished.")
@@ -0,0 +1,99 @@
+"""Сборка мусора в persistence: брошенные разговоры и user_data.
+
+Пользователь, бросивший анкету или опрос на середине, оставляет в persistence
+состояние разговора и частично заполненный user_data навсегда: conversation_timeout
+есть не у всех разговоров и не переживает перезапуск. Периодическая задача находит
+ключи, которые не менялись дольше TTL своего разговора, и удаляет их пачками.
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, List, Set
+
+from telegram.ext import Application, ContextTypes, ConversationHandler
+
+from core import settings
+from core.persistence import SQLitePersistence
+
+logger = logging.getLogger(__name__)
+
+# Пользователи с апдейтами после прошлого прохода: их не трогаем, даже если
+# изменения ещё не дошли до persistence.
+recently_active_user_ids: Set[int] = set()
+
+
+def mark_user_active(user_id: int):
+    recently_active_user_ids.add(user_id)
+
+
+def get_persistent_conversation_handlers(application: Application) -> List[ConversationHandler]:
+    return [
+        handler for handlers in application.handlers.values() for handler in handlers
+        if isinstance(handler, ConversationHandler) and handler.persistent
+    ]
+
+
+async def save_persistence(application: Application):
+    await application.update_persistence()
+    await application.persistence.flush()
+
+
+async def collect_persistence_garbage(application: Application) -> Dict[str, Dict[str, int]]:
+    """Удаляет устаревшие ключи разговоров и user_data. Возвращает отчёт
+    {разговор или "user_data": {"keys": ..., "bytes": ...}}."""
+    persistence = application.persistence
+    # Сначала сохраняем текущее состояние, чтобы время записи ключей было актуальным.
+    await save_persistence(application)
+    now = time.time()
+    skip_user_ids = set(recently_active_user_ids)
+    recently_active_user_ids.clear()
+    report: Dict[str, Dict[str, int]] = {}
+    live_user_ids: Set[int] = set()
+
+    for handler in get_persistent_conversation_handlers(application):
+        ttl = settings.CONVERSATION_GC_TTL_SECONDS.get(handler.name, settings.CONVERSATION_GC_DEFAULT_TTL_SECONDS)
+        stale = [
+            (key, size) for key, size in await persistence.get_stale_conversations(handler.name, now - ttl)
+            if key[-1] not in skip_user_ids
+        ]
+        # Публичного API для удаления состояния нет; pop из словаря разговоров
+        # отмечает ключ, и Application удалит его из persistence при следующем сохранении.
+        conversations = handler._conversations
+        for start in range(0, len(stale), settings.PERSISTENCE_GC_BATCH_SIZE):
+            for key, _ in stale[start:start + settings.PERSISTENCE_GC_BATCH_SIZE]:
+                conversations.pop(key, None)
+            await save_persistence(application)
+            await asyncio.sleep(0)
+        if stale:
+            report[handler.name] = {"keys": len(stale), "bytes": sum(size for _, size in stale)}
+        live_user_ids.update(key[-1] for key in conversations)
+
+    stale_users = [
+        (user_id, size) for user_id, size in await persistence.get_stale_user_data(now - settings.USER_DATA_GC_TTL_SECONDS)
+        if user_id not in live_user_ids and user_id not in skip_user_ids
+    ]
+    for start in range(0, len(stale_users), settings.PERSISTENCE_GC_BATCH_SIZE):
+        for user_id, _ in stale_users[start:start + settings.PERSISTENCE_GC_BATCH_SIZE]:
+            application.drop_user_data(user_id)
+        await save_persistence(application)
+        await asyncio.sleep(0)
+    if stale_users:
+        report["user_data"] = {"keys": len(stale_users), "bytes": sum(size for _, size in stale_users)}
+    return report
+
+
+async def persistence_gc_job(context: ContextTypes.DEFAULT_TYPE):
+    application = context.application
+    if not isinstance(application.persistence, SQLitePersistence):
+        logger.info("Persistence GC skipped: it needs SQLitePersistence to know when keys were last written.")
+        return
+    started = time.monotonic()
+    report = await collect_persistence_garbage(application)
+    if not report:
+        logger.info("Persistence GC: nothing to evict.")
+        return
+    total_keys = sum(item["keys"] for item in report.values())
+    total_bytes = sum(item["bytes"] for item in report.values())
+    details = ", ".join(f"{name}: {item['keys']} keys / {item['bytes']} B" for name, item in sorted(report.items()))
+    logger.info(f"Persistence GC evicted {total_keys} keys, reclaimed {total_bytes} bytes "
+                f"in {time.monotonic() - started:.2f}s ({details}).")
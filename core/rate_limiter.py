@@ -0,0 +1,184 @@
+"""Общий лимитер запросов к Bot API.
+
+Все отправки идут через ExtBot, поэтому лимитер, установленный в Application,
+видит рассылки, уведомления админов и менеджеров и ответы пользователям вместе.
+Он соблюдает общий бюджет сообщений в секунду и бюджет на чат и выдаёт очередь
+по приоритету: сначала ответы пользователям, затем уведомления, рассылки последними.
+Приоритет передаётся через rate_limit_args, по умолчанию - INTERACTIVE.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from datetime import timedelta
+from enum import IntEnum
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Tuple, Union
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter, ContextTypes
+
+from core import settings
+from core.latency import LatencyWindow, format_latency
+
+logger = logging.getLogger(__name__)
+
+# Лимиты Telegram касаются сообщений: отправка и редактирование. Остальные
+# методы (answerCallbackQuery, deleteMessage, getChat...) идут без очереди.
+LIMITED_ENDPOINT_PREFIXES = ("send", "copy", "forward", "edit")
+# Бюджет на чат расходуют только новые сообщения, правки ограничены общим бюджетом.
+PER_CHAT_ENDPOINT_PREFIXES = ("send", "copy", "forward")
+
+
+class RequestPriority(IntEnum):
+    INTERACTIVE = 0
+    NOTIFICATION = 1
+    BULK = 2
+
+
+class BotRateLimiter(BaseRateLimiter[RequestPriority]):
+    def __init__(self, max_per_second: float, private_chat_per_second: float, group_chat_per_minute: float,
+                 chat_burst: int, max_retries: int, latency_samples: int):
+        self._interval = 1 / max_per_second
+        self._private_interval = 1 / private_chat_per_second
+        self._group_interval = 60 / group_chat_per_minute
+        self._chat_burst = chat_burst
+        self._max_retries = max_retries
+        self._next_slot = 0.0
+        self._paused_until = 0.0
+        # Теоретическое время следующего сообщения в чат (GCRA); допускает всплеск из chat_burst сообщений.
+        self._chat_next_at: Dict[int, float] = {}
+        # Чистка словаря выше идёт, когда он вырастает до этого размера; порог удваивается
+        # по числу живых записей, поэтому на одну отправку приходится O(1) в среднем.
+        self._prune_at = settings.BOT_API_CHAT_STATE_MAX_ENTRIES
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self.queue_delay = {priority: LatencyWindow(latency_samples) for priority in RequestPriority}
+        self.requests = {priority: 0 for priority in RequestPriority}
+        self.retry_after_count = 0
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        if self._dispatcher:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+        for _, _, future in self._waiters:
+            future.cancel()
+        self._waiters.clear()
+
+    def _reserve_chat(self, chat_id: int) -> float:
+        interval = self._group_interval if chat_id < 0 else self._private_interval
+        now = time.monotonic()
+        next_at = max(self._chat_next_at.get(chat_id, now), now)
+        delay = max(0.0, next_at - (self._chat_burst - 1) * interval - now)
+        self._chat_next_at[chat_id] = next_at + interval
+        if len(self._chat_next_at) > self._prune_at:
+            self._chat_next_at = {key: value for key, value in self._chat_next_at.items() if value > now}
+            self._prune_at = max(settings.BOT_API_CHAT_STATE_MAX_ENTRIES, 2 * len(self._chat_next_at))
+        return delay
+
+    async def _acquire_slot(self, priority: RequestPriority):
+        now = time.monotonic()
+        if not self._waiters and max(self._next_slot, self._paused_until) <= now:
+            self._next_slot = now + self._interval
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), future))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        self._wakeup.set()
+        await future
+
+    async def _dispatch(self):
+        while True:
+            if not self._waiters:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            delay = max(self._next_slot, self._paused_until) - time.monotonic()
+            if delay > 0:
+                # Пока ждём, в голову очереди может встать запрос с более высоким приоритетом.
+                await asyncio.sleep(delay)
+                continue
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+            future.set_result(None)
+            self._next_slot = time.monotonic() + self._interval
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Union[bool, Dict[str, Any], List[Dict[str, Any]]]]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[RequestPriority],
+    ) -> Union[bool, Dict[str, Any], List[Dict[str, Any]]]:
+        if not endpoint.startswith(LIMITED_ENDPOINT_PREFIXES):
+            return await callback(*args, **kwargs)
+        priority = RequestPriority(rate_limit_args) if rate_limit_args is not None else RequestPriority.INTERACTIVE
+        chat_id = data.get("chat_id")
+        attempt = 0
+        while True:
+            queued_at = time.monotonic()
+            if isinstance(chat_id, int) and endpoint.startswith(PER_CHAT_ENDPOINT_PREFIXES):
+                delay = self._reserve_chat(chat_id)
+                if delay:
+                    await asyncio.sleep(delay)
+            await self._acquire_slot(priority)
+            self.queue_delay[priority].record(time.monotonic() - queued_at)
+            self.requests[priority] += 1
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                self.retry_after_count += 1
+                retry_after = e.retry_after
+                seconds = retry_after.total_seconds() if isinstance(retry_after, timedelta) else float(retry_after)
+                # Флуд-контроль может сработать на весь бот, поэтому останавливаем всю очередь.
+                self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+                if attempt >= self._max_retries:
+                    raise
+                attempt += 1
+                logger.warning(f"Bot API flood control on {endpoint}, retrying in {seconds}s (attempt {attempt}).")
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "waiting": len(self._waiters),
+            "retry_after": self.retry_after_count,
+            "requests": {priority.name.lower(): count for priority, count in self.requests.items()},
+            "queue_delay_p50": {priority.name.lower(): window.percentile(50) for priority, window in self.queue_delay.items()},
+            "queue_delay_p95": {priority.name.lower(): window.percentile(95) for priority, window in self.queue_delay.items()},
+        }
+
+
+def create_rate_limiter() -> BotRateLimiter:
+    return BotRateLimiter(
+        max_per_second=settings.BOT_API_MAX_MESSAGES_PER_SECOND,
+        private_chat_per_second=settings.BOT_API_PRIVATE_CHAT_PER_SECOND,
+        group_chat_per_minute=settings.BOT_API_GROUP_CHAT_PER_MINUTE,
+        chat_burst=settings.BOT_API_CHAT_BURST,
+        max_retries=settings.BOT_API_MAX_RETRIES,
+        latency_samples=settings.BOT_API_LATENCY_SAMPLES,
+    )
+
+
+async def rate_limiter_metrics_job(context: ContextTypes.DEFAULT_TYPE):
+    rate_limiter = context.bot.rate_limiter
+    if not isinstance(rate_limiter, BotRateLimiter):
+        return
+    metrics = rate_limiter.metrics()
+    delays = ", ".join(
+        f"{name} p50={format_latency(metrics['queue_delay_p50'][name])} p95={format_latency(metrics['queue_delay_p95'][name])}"
+        for name in metrics['requests']
+    )
+    logger.info(f"Bot API rate limiter metrics: waiting={metrics['waiting']}, requests={metrics['requests']}, "
+                f"retry_after={metrics['retry_after']}, queue delay {delays}")
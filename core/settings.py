@@ -1,3 +1,4 @@
+import json
 import os
 from pathlib import Path
 from dotenv import load_dotenv
@@ -30,22 +31,128 @@ CANDIDATE_NOSHOW_SHEET_NAME = "Кандидаты (передумали)"
 
 
 BATCH_INTERVAL = 30
+SHEETS_BATCH_SIZE = 50
+# "gspread" - gspread_asyncio в пуле потоков, "httpx" - нативный async-клиент (core/sheets_http.py)
+SHEETS_CLIENT = os.getenv("SHEETS_CLIENT", "gspread")
+SHEETS_HTTP_TIMEOUT_SECONDS = 30
+SHEETS_HTTP_MAX_CONNECTIONS = 4
+# Несколько сервисных аккаунтов: в GOOGLE_CREDENTIALS_JSON можно передать список ключей.
+# "round_robin" или "least_throttled" (реже всех упиравшийся в квоту)
+SHEETS_CREDENTIAL_STRATEGY = os.getenv("SHEETS_CREDENTIAL_STRATEGY", "round_robin")
+SHEETS_CREDENTIAL_COOLDOWN_SECONDS = 60
+# JSON {"Имя листа": "ID таблицы"}; листы без маршрута пишутся в SPREADSHEET_ID
+raw_spreadsheet_routing = os.getenv("SHEETS_SPREADSHEET_ROUTING", "")
+try:
+    SHEETS_SPREADSHEET_ROUTING = {str(k): str(v) for k, v in json.loads(raw_spreadsheet_routing).items()} if raw_spreadsheet_routing else {}
+except (ValueError, AttributeError):
+    SHEETS_SPREADSHEET_ROUTING = {}
+SHEETS_RETRY_MIN_WAIT_SECONDS = 10
+SHEETS_RETRY_MAX_WAIT_SECONDS = 60
+SHEETS_BREAKER_FAILURE_THRESHOLD = 3
+SHEETS_BREAKER_RECOVERY_SECONDS = 300
+# Ошибки настройки (доступ, ключ, имя листа) не расходуют попытки; напоминание админам не чаще раза в час
+SHEETS_CONFIG_ALERT_INTERVAL_SECONDS = 60 * 60
+SHEETS_ROW_KEY_COLUMN = 50
+SHEETS_ROW_KEY_INDEX_SIZE = 20000
+SHEETS_CURSOR_REFRESH_SECONDS = 10 * 60
+SHEETS_MAX_ROWS_PER_WORKSHEET = 50000
+SHEETS_GRID_GROWTH_ROWS = 1000
+# При остановке бота writer дописывает очередь не дольше этого времени (0 - не дописывать)
+SHEETS_SHUTDOWN_FLUSH_SECONDS = int(os.getenv("SHEETS_SHUTDOWN_FLUSH_SECONDS", "15"))
+# Запас на текущий батч сверх времени дописывания, после него writer отменяется
+SHEETS_SHUTDOWN_GRACE_SECONDS = 10
+# false - очередь разбирает отдельный процесс sheets_worker.py, бот только ставит записи в очередь
+SHEETS_WRITER_IN_BOT = os.getenv("SHEETS_WRITER_IN_BOT", "true").lower() in ("1", "true", "yes")
+# На сколько writer забирает батч себе; после истечения записи может забрать другой процесс
+SHEETS_CLAIM_LEASE_SECONDS = 10 * 60
+# Повторы фоновой инициализации клиента Sheets при старте (экспоненциально до максимума)
+SHEETS_INIT_RETRY_MIN_SECONDS = 5
+SHEETS_INIT_RETRY_MAX_SECONDS = 5 * 60
+SHEETS_METRICS_INTERVAL_SECONDS = 60
+SHEETS_METRICS_RATE_WINDOW_SECONDS = 5 * 60
+SHEETS_METRICS_LATENCY_SAMPLES = 500
+# Алерт админам, если самая старая необработанная запись ждёт дольше N минут
+SHEETS_LAG_ALERT_MINUTES = int(os.getenv("SHEETS_LAG_ALERT_MINUTES", "15"))
+
+# Локальные копии всего, что уходит в Google Sheets: "csv"
+EXPORT_SINKS = [name.strip() for name in os.getenv("EXPORT_SINKS", "").split(',') if name.strip()]
+EXPORT_DIR = BASE_DIR / "exports"
+EXPORT_BATCH_SIZE = 500
 
 EXIT_INTERVIEW_COOLDOWN_SECONDS = 60 * 60 * 24 * 7
+CANDIDATE_CHECK_INFO_TTL_SECONDS = 60 * 60 * 24 * 30
+TTL_STORE_EXPIRE_INTERVAL_SECONDS = 60 * 10
+ADMIN_SESSION_TTL_SECONDS = 60 * 30
+ADMIN_SESSION_MAX_ENTRIES = 100
+# Активное сообщение и последние сообщения бота по чатам: в памяти, вне user_data
+UI_STATE_MAX_CHATS = 20000
+UI_STATE_KEEP_MESSAGES = 5
+# true - сохранять это состояние в UI_STATE_FILE при остановке и читать при старте
+UI_STATE_PERSIST = os.getenv("UI_STATE_PERSIST", "true").lower() in ("1", "true", "yes")
 FEEDBACK_DELAY_SECONDS = 1800
+# Сколько копий новой анкеты отправляется менеджерам и админам одновременно
+CANDIDATE_SUMMARY_FANOUT_CONCURRENCY = 8
 ONBOARDING_FOLLOWUP_SECONDS = 60 * 60 * 24 * 7
 
 PID_FILE = BASE_DIR / "bot.pid"
 HEARTBEAT_FILE = BASE_DIR / "heartbeat.txt"
 PING_FILE = BASE_DIR / "ping.txt"
 PERSISTENCE_FILE = BASE_DIR / "bot_persistence.pkl"
+# "sqlite" - построчное хранение с записью только изменённых ключей, "pickle" - прежний файл целиком
+PERSISTENCE_BACKEND = os.getenv("PERSISTENCE_BACKEND", "sqlite").strip().lower()
+PERSISTENCE_DB_FILE = BASE_DIR / "bot_persistence.sqlite"
+UI_STATE_FILE = BASE_DIR / "ui_state.json"
+# Отложенная запись persistence: не чаще раза в N секунд или сразу после M изменённых ключей
+PERSISTENCE_FLUSH_INTERVAL_SECONDS = int(os.getenv("PERSISTENCE_FLUSH_INTERVAL_SECONDS", "10"))
+PERSISTENCE_FLUSH_MAX_DIRTY_KEYS = int(os.getenv("PERSISTENCE_FLUSH_MAX_DIRTY_KEYS", "200"))
+PERSISTENCE_METRICS_LOG_SECONDS = 300
+# Сколько ждать последнего flush отложенной записи при остановке
+PERSISTENCE_SHUTDOWN_GRACE_SECONDS = int(os.getenv("PERSISTENCE_SHUTDOWN_GRACE_SECONDS", "10"))
 DATABASE_FILE = BASE_DIR / "bot_database.sqlite"
 
 HEARTBEAT_INTERVAL_SECONDS = 30
 TELEGRAM_INACTIVITY_THRESHOLD_SECONDS = 60 * 10
 CONVERSATION_TIMEOUT_SECONDS = 60 * 60 * 3
 
-ACTIVE_MESSAGE_ID_KEY = "active_message_id"
+# Фоновые рассылки: лимит Telegram - около 30 сообщений в секунду на бота
+BROADCAST_MESSAGES_PER_SECOND = float(os.getenv("BROADCAST_MESSAGES_PER_SECOND", "20"))
+BROADCAST_MAX_ATTEMPTS = 3
+BROADCAST_BATCH_SIZE = 100
+BROADCAST_PROGRESS_INTERVAL_SECONDS = 10
+# Если статус получателя не записался в БД, рассылка ждёт и повторяет запись, а не шлёт дальше
+BROADCAST_DB_RETRY_MIN_SECONDS = 5
+BROADCAST_DB_RETRY_MAX_SECONDS = 60
+
+# Общий лимитер Bot API: сообщений в секунду на бота, на личный чат и в минуту на группу
+BOT_API_MAX_MESSAGES_PER_SECOND = float(os.getenv("BOT_API_MAX_MESSAGES_PER_SECOND", "25"))
+BOT_API_PRIVATE_CHAT_PER_SECOND = 1
+BOT_API_GROUP_CHAT_PER_MINUTE = 20
+# Сколько сообщений подряд можно отправить в один чат без ожидания
+BOT_API_CHAT_BURST = 3
+BOT_API_MAX_RETRIES = 2
+BOT_API_CHAT_STATE_MAX_ENTRIES = 10000
+BOT_API_LATENCY_SAMPLES = 500
+BOT_API_METRICS_LOG_SECONDS = 300
+
+# Сборка мусора в persistence: разговор, не менявшийся дольше TTL, считается брошенным
+PERSISTENCE_GC_INTERVAL_SECONDS = 60 * 60 * 6
+PERSISTENCE_GC_BATCH_SIZE = 500
+CONVERSATION_GC_DEFAULT_TTL_SECONDS = 60 * 60 * 24 * 7
+CONVERSATION_GC_TTL_SECONDS = {
+    "recruitment_conv": 60 * 60 * 24,
+    "onboarding_conv": 60 * 60 * 24,
+    "manager_reg_conv": 60 * 60 * 24,
+    "bot_feedback_conv": 60 * 60 * 24,
+    "admin_conv": 60 * 60 * 24,
+    "climate_survey_conv": 60 * 60 * 24 * 3,
+    "exit_interview_conv": 60 * 60 * 24 * 7,
+    "main_conversation_handler": 60 * 60 * 24 * 7,
+    # Эти разговоры запускаются задачами и ждут ответа кандидата днями
+    "candidate_feedback_conv": 60 * 60 * 24 * 14,
+    "onboarding_followup_conv": 60 * 60 * 24 * 14,
+}
+# user_data без изменений дольше этого срока удаляется, если у пользователя нет активного разговора
+USER_DATA_GC_TTL_SECONDS = 60 * 60 * 24 * 14
 
 CALLBACK_START_ONBOARDING = "start_onboarding"
 CALLBACK_START_EXIT = "start_exit_interview"
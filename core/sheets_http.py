@@ -0,0 +1,208 @@
+"""Асинхронный клиент Google Sheets REST API поверх httpx.
+
+gspread_asyncio выполняет синхронные вызовы requests в пуле потоков (том же, что
+использует database.execute_query) и не держит keep-alive между вызовами. Этот
+клиент работает прямо в event loop: один пул соединений (HTTP/2, если установлен
+h2), токен сервисного аккаунта обновляется сам. Повторяет ту часть интерфейса
+gspread_asyncio, которую использует core/g_sheets.py, и бросает
+gspread.exceptions.APIError, поэтому retry и circuit breaker работают без изменений.
+
+h2 - необязательная зависимость: её нет в requirements.txt и в offline_packages,
+без неё клиент работает по HTTP/1.1. Для HTTP/2: pip install h2.
+"""
+import asyncio
+import importlib.util
+import logging
+import time
+from typing import Any, Dict, List
+from urllib.parse import quote
+
+import gspread
+import httpx
+from google.auth import crypt, jwt
+from google.auth.exceptions import RefreshError
+
+from core import settings
+
+logger = logging.getLogger(__name__)
+
+SHEETS_API_URL = "https://sheets.googleapis.com/v4/spreadsheets"
+DEFAULT_TOKEN_URI = "https://oauth2.googleapis.com/token"
+JWT_GRANT_TYPE = "urn:ietf:params:oauth:grant-type:jwt-bearer"
+TOKEN_LIFETIME_SECONDS = 3600
+# Обновляем токен заранее, чтобы он не истёк посреди запроса.
+TOKEN_REFRESH_MARGIN_SECONDS = 300
+
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+class TokenRefreshError(RefreshError):
+    """Google отказал в выдаче токена (invalid_grant, удалённый ключ, неверный аккаунт).
+    Это ошибка настройки, а не данных: строки не должны уходить в dead letter."""
+
+
+def absolute_range_name(sheet_title: str, range_name: str) -> str:
+    return f"'{sheet_title.replace(chr(39), chr(39) * 2)}'!{range_name}"
+
+
+class ServiceAccountTokenSource:
+    """Access token сервисного аккаунта: подписанный JWT обменивается на токен
+    в token_uri, токен кэшируется до истечения срока."""
+
+    def __init__(self, credentials_info: dict, scopes: List[str], http: httpx.AsyncClient):
+        self.signer = crypt.RSASigner.from_service_account_info(credentials_info)
+        self.service_account_email = credentials_info["client_email"]
+        self.token_uri = credentials_info.get("token_uri", DEFAULT_TOKEN_URI)
+        self.scopes = " ".join(scopes)
+        self.http = http
+        self._token: str | None = None
+        self._expires_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def _is_valid(self) -> bool:
+        return self._token is not None and time.time() < self._expires_at - TOKEN_REFRESH_MARGIN_SECONDS
+
+    def invalidate(self):
+        self._token = None
+
+    async def get_token(self) -> str:
+        if self._is_valid():
+            return self._token
+        async with self._lock:
+            if not self._is_valid():
+                await self._refresh()
+            return self._token
+
+    async def _refresh(self):
+        issued_at = int(time.time())
+        assertion = jwt.encode(self.signer, {
+            "iss": self.service_account_email,
+            "scope": self.scopes,
+            "aud": self.token_uri,
+            "iat": issued_at,
+            "exp": issued_at + TOKEN_LIFETIME_SECONDS,
+        })
+        response = await self.http.post(self.token_uri, data={"grant_type": JWT_GRANT_TYPE, "assertion": assertion.decode()})
+        if response.status_code == 429 or response.status_code >= 500:
+            raise gspread.exceptions.APIError(response)
+        if response.status_code != 200:
+            raise TokenRefreshError(f"Token request for {self.service_account_email} failed with "
+                                    f"{response.status_code}: {response.text[:500]}")
+        payload = response.json()
+        self._token = payload["access_token"]
+        self._expires_at = issued_at + payload.get("expires_in", TOKEN_LIFETIME_SECONDS)
+        logger.info(f"Refreshed Google access token for {self.service_account_email}.")
+
+
+class HttpSheetsClient:
+    def __init__(self, credentials_info: dict, scopes: List[str]):
+        self.http = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            timeout=settings.SHEETS_HTTP_TIMEOUT_SECONDS,
+            limits=httpx.Limits(max_connections=settings.SHEETS_HTTP_MAX_CONNECTIONS,
+                                max_keepalive_connections=settings.SHEETS_HTTP_MAX_CONNECTIONS),
+        )
+        self.tokens = ServiceAccountTokenSource(credentials_info, scopes, self.http)
+
+    async def request(self, method: str, url: str, **kwargs) -> Dict[str, Any]:
+        response = None
+        for attempt in range(2):
+            headers = {"Authorization": f"Bearer {await self.tokens.get_token()}"}
+            response = await self.http.request(method, url, headers=headers, **kwargs)
+            # Токен мог быть отозван раньше срока: обновляем его и повторяем запрос один раз.
+            if response.status_code == 401 and attempt == 0:
+                self.tokens.invalidate()
+                continue
+            break
+        if response.status_code >= 400:
+            raise gspread.exceptions.APIError(response)
+        return response.json()
+
+    async def open_by_key(self, key: str) -> "HttpSpreadsheet":
+        metadata = await self.request("GET", f"{SHEETS_API_URL}/{key}", params={"fields": "spreadsheetId,properties.title"})
+        return HttpSpreadsheet(self, key, metadata["properties"]["title"])
+
+    async def aclose(self):
+        await self.http.aclose()
+
+
+class HttpSpreadsheet:
+    def __init__(self, client: HttpSheetsClient, key: str, title: str):
+        self.client = client
+        self.id = key
+        self.title = title
+        self.url = f"{SHEETS_API_URL}/{key}"
+
+    async def batch_update(self, body: dict) -> dict:
+        return await self.client.request("POST", f"{self.url}:batchUpdate", json=body)
+
+    async def worksheets(self) -> List["HttpWorksheet"]:
+        metadata = await self.client.request("GET", self.url, params={"fields": "sheets.properties"})
+        return [HttpWorksheet(self, sheet["properties"]) for sheet in metadata.get("sheets", [])]
+
+    async def worksheet(self, title: str) -> "HttpWorksheet":
+        for worksheet in await self.worksheets():
+            if worksheet.title == title:
+                return worksheet
+        raise gspread.exceptions.WorksheetNotFound(title)
+
+    async def add_worksheet(self, title: str, rows: int, cols: int, index: int | None = None) -> "HttpWorksheet":
+        properties = {"title": title, "gridProperties": {"rowCount": rows, "columnCount": cols}}
+        if index is not None:
+            properties["index"] = index
+        response = await self.batch_update({"requests": [{"addSheet": {"properties": properties}}]})
+        return HttpWorksheet(self, response["replies"][0]["addSheet"]["properties"])
+
+
+class HttpWorksheet:
+    def __init__(self, spreadsheet: HttpSpreadsheet, properties: dict):
+        self.spreadsheet = spreadsheet
+        self.id = properties["sheetId"]
+        self.title = properties["title"]
+        grid = properties.get("gridProperties", {})
+        self.row_count = grid.get("rowCount", 0)
+        self.col_count = grid.get("columnCount", 0)
+
+    def _values_url(self, range_name: str) -> str:
+        return f"{self.spreadsheet.url}/values/{quote(absolute_range_name(self.title, range_name), safe='')}"
+
+    async def update(self, values: List[List[Any]], range_name: str = "A1", value_input_option: str = "RAW") -> dict:
+        return await self.spreadsheet.client.request(
+            "PUT", self._values_url(range_name),
+            params={"valueInputOption": value_input_option},
+            json={"majorDimension": "ROWS", "values": values},
+        )
+
+    async def append_rows(self, values: List[List[Any]], value_input_option: str = "RAW") -> dict:
+        return await self.spreadsheet.client.request(
+            "POST", f"{self._values_url('A1')}:append",
+            params={"valueInputOption": value_input_option, "insertDataOption": "INSERT_ROWS"},
+            json={"majorDimension": "ROWS", "values": values},
+        )
+
+    async def batch_get(self, ranges: List[str]) -> List[List[List[Any]]]:
+        response = await self.spreadsheet.client.request(
+            "GET", f"{self.spreadsheet.url}/values:batchGet",
+            params=[("ranges", absolute_range_name(self.title, range_name)) for range_name in ranges],
+        )
+        return [value_range.get("values", []) for value_range in response.get("valueRanges", [])]
+
+
+class HttpSheetsClientManager:
+    """Замена AsyncioGspreadClientManager: authorize() отдаёт один общий клиент."""
+
+    def __init__(self, credentials_info: dict, scopes: List[str]):
+        self.credentials_info = credentials_info
+        self.scopes = scopes
+        self._client: HttpSheetsClient | None = None
+
+    async def authorize(self) -> HttpSheetsClient:
+        if self._client is None:
+            self._client = HttpSheetsClient(self.credentials_info, self.scopes)
+            logger.info(f"Created httpx Google Sheets client (HTTP/2: {'on' if HTTP2_AVAILABLE else 'off, h2 is not installed'}).")
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
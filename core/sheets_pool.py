@@ -0,0 +1,100 @@
+import logging
+import time
+from typing import Dict, List
+
+import gspread
+
+logger = logging.getLogger(__name__)
+
+ROUND_ROBIN = "round_robin"
+LEAST_THROTTLED = "least_throttled"
+
+
+class SheetsCredential:
+    """Один сервисный аккаунт со своим клиентом и статистикой здоровья."""
+
+    def __init__(self, name: str, manager):
+        self.name = name
+        self.manager = manager
+        self.successes = 0
+        self.failures = 0
+        self.throttled = 0
+        self.last_throttled_at: float | None = None
+        self.cooldown_until = 0.0
+        self.last_error: str | None = None
+
+    def is_cooling_down(self, now: float) -> bool:
+        return now < self.cooldown_until
+
+    def health(self) -> Dict[str, object]:
+        return {
+            "name": self.name,
+            "successes": self.successes,
+            "failures": self.failures,
+            "throttled": self.throttled,
+            "cooling_down": self.is_cooling_down(time.monotonic()),
+            "last_error": self.last_error,
+        }
+
+
+class SheetsClientPool:
+    """Пул сервисных аккаунтов для записи в Google Sheets. Квота Sheets API считается
+    на пользователя, поэтому несколько аккаунтов поднимают общий потолок записи.
+    Аккаунт, получивший 429, уходит на паузу cooldown_seconds; если на паузе все,
+    берётся тот, что был ограничен раньше остальных."""
+
+    def __init__(self, credentials: List[SheetsCredential], strategy: str = ROUND_ROBIN, cooldown_seconds: float = 60):
+        if not credentials:
+            raise ValueError("Sheets client pool needs at least one credential.")
+        if strategy not in (ROUND_ROBIN, LEAST_THROTTLED):
+            logger.error(f"Unknown Sheets credential strategy '{strategy}', falling back to {ROUND_ROBIN}.")
+            strategy = ROUND_ROBIN
+        self.credentials = credentials
+        self.strategy = strategy
+        self.cooldown_seconds = cooldown_seconds
+        self._next_index = 0
+
+    def acquire(self) -> SheetsCredential:
+        now = time.monotonic()
+        available = [c for c in self.credentials if not c.is_cooling_down(now)]
+        if not available:
+            return min(self.credentials, key=lambda c: c.cooldown_until)
+        # Начинаем обход с разных аккаунтов, чтобы равные по здоровью делили нагрузку.
+        start = self._next_index % len(available)
+        self._next_index += 1
+        rotated = available[start:] + available[:start]
+        if self.strategy == LEAST_THROTTLED:
+            return min(rotated, key=lambda c: c.last_throttled_at or 0.0)
+        return rotated[0]
+
+    def record_success(self, credential: SheetsCredential):
+        credential.successes += 1
+
+    def record_failure(self, credential: SheetsCredential, error: BaseException) -> bool:
+        """True, если это 429 и в пуле есть другой аккаунт не на паузе: повтор пойдёт через него."""
+        credential.failures += 1
+        credential.last_error = str(error)[:300]
+        if isinstance(error, gspread.exceptions.APIError) and getattr(error.response, "status_code", None) == 429:
+            credential.throttled += 1
+            credential.last_throttled_at = time.monotonic()
+            credential.cooldown_until = credential.last_throttled_at + self.cooldown_seconds
+            logger.warning(f"Sheets credential '{credential.name}' was rate limited, "
+                           f"pausing it for {self.cooldown_seconds} seconds.")
+            now = time.monotonic()
+            return any(not c.is_cooling_down(now) for c in self.credentials if c is not credential)
+        return False
+
+    def health(self) -> List[Dict[str, object]]:
+        return [credential.health() for credential in self.credentials]
+
+    def format_health(self) -> str:
+        return "; ".join(
+            f"{h['name']}: {'cooling down' if h['cooling_down'] else 'ok'}, "
+            f"{h['successes']} ok / {h['failures']} failed / {h['throttled']} throttled"
+            for h in self.health()
+        )
+
+    async def aclose(self):
+        for credential in self.credentials:
+            if hasattr(credential.manager, "aclose"):
+                await credential.manager.aclose()
@@ -0,0 +1,124 @@
+import asyncio
+import csv
+import json
+import logging
+import re
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from telegram.ext import Application
+
+from core import settings, database
+
+logger = logging.getLogger(__name__)
+
+# Ширина данных ограничена скрытой колонкой с ключом строки, поэтому локальные
+# выгрузки имеют фиксированный набор колонок и одинаковую схему во всех файлах.
+LOCAL_EXPORT_COLUMNS = settings.SHEETS_ROW_KEY_COLUMN - 1
+LOCAL_EXPORT_HEADER = ["queue_id", "row_key", "exported_at"] + [f"c{i:02d}" for i in range(1, LOCAL_EXPORT_COLUMNS + 1)]
+
+try:
+    LOCAL_TIMEZONE = ZoneInfo(settings.MOSCOW_TIMEZONE)
+except ZoneInfoNotFoundError:
+    LOCAL_TIMEZONE = ZoneInfo("UTC")
+
+
+class ExportSink:
+    """Получатель записей из sheets_queue. Writer по очереди спрашивает у каждого
+    получателя необработанные записи и отдаёт их ему на выгрузку."""
+
+    name = "sink"
+
+    async def pending_items(self) -> List[dict]:
+        raise NotImplementedError
+
+    async def export(self, application: Application, items: List[dict]) -> int:
+        """Возвращает число обработанных записей."""
+        raise NotImplementedError
+
+
+class LocalFileSink(ExportSink):
+    """Локальная выгрузка по собственному курсору (id последней выгруженной записи),
+    независимо от того, записана ли строка в Google Sheets. Файлы ротируются по дням.
+    Копии уже выгруженных строк (бэкфилл в новый лист, повтор из dead letter) получают
+    новый id, но тот же row_key, поэтому выгруженные ключи запоминаются вместе с курсором
+    и повторно не пишутся. Гарантия at-least-once: после падения между записью файла
+    и сохранением курсора строки могут повториться, их можно отфильтровать по row_key."""
+
+    def __init__(self, export_dir: Path):
+        self.export_dir = export_dir
+        self._last_id: int | None = None
+
+    async def pending_items(self) -> List[dict]:
+        if self._last_id is None:
+            self._last_id = await database.get_export_cursor(self.name)
+        return await database.get_sheets_queue_after(self._last_id, settings.EXPORT_BATCH_SIZE)
+
+    async def export(self, application: Application, items: List[dict]) -> int:
+        now = datetime.now(LOCAL_TIMEZONE)
+        exported_at = now.strftime("%Y-%m-%d %H:%M:%S")
+        records_by_sheet: Dict[str, List[list]] = defaultdict(list)
+        exported_keys = await database.get_exported_row_keys(self.name, [item['row_key'] for item in items if item.get('row_key')])
+        new_keys = set()
+        for item in items:
+            row_key = item.get('row_key')
+            if row_key and (row_key in exported_keys or row_key in new_keys):
+                continue
+            try:
+                row = json.loads(item['data_json'])
+            except (TypeError, ValueError):
+                logger.warning(f"Skipping malformed queue item {item['id']} in {self.name} export.")
+                continue
+            cells = [str(value) for value in row[:LOCAL_EXPORT_COLUMNS]]
+            cells += [""] * (LOCAL_EXPORT_COLUMNS - len(cells))
+            records_by_sheet[item['sheet_name']].append([item['id'], row_key or "", exported_at] + cells)
+            if row_key:
+                new_keys.add(row_key)
+
+        await asyncio.to_thread(self.write_records, records_by_sheet, now.strftime("%Y-%m-%d"))
+        self._last_id = items[-1]['id']
+        if not await database.set_export_cursor(self.name, self._last_id, list(new_keys)):
+            logger.warning(f"Could not save {self.name} export cursor, rows after {self._last_id} may repeat after restart.")
+        logger.info(f"Exported {sum(map(len, records_by_sheet.values()))} of {len(items)} queue items to {self.name} sink.")
+        return len(items)
+
+    def sheet_dir(self, sheet_name: str) -> Path:
+        path = self.export_dir / re.sub(r"[^\w\-]+", "_", sheet_name).strip("_")
+        path.mkdir(parents=True, exist_ok=True)
+        return path
+
+    def write_records(self, records_by_sheet: Dict[str, List[list]], day: str):
+        raise NotImplementedError
+
+
+class CsvSink(LocalFileSink):
+    name = "csv"
+
+    def write_records(self, records_by_sheet: Dict[str, List[list]], day: str):
+        for sheet_name, records in records_by_sheet.items():
+            path = self.sheet_dir(sheet_name) / f"{day}.csv"
+            is_new = not path.exists()
+            with open(path, "a", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                if is_new:
+                    writer.writerow(LOCAL_EXPORT_HEADER)
+                writer.writerows(records)
+
+
+LOCAL_SINKS = {
+    CsvSink.name: CsvSink,
+}
+
+
+def build_local_sinks() -> List[ExportSink]:
+    sinks = []
+    for sink_name in settings.EXPORT_SINKS:
+        sink_class = LOCAL_SINKS.get(sink_name)
+        if not sink_class:
+            logger.error(f"Unknown export sink '{sink_name}' in EXPORT_SINKS, skipping it.")
+            continue
+        sinks.append(sink_class(settings.EXPORT_DIR))
+    return sinks
@@ -0,0 +1,112 @@
+import heapq
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from core import settings, database
+
+logger = logging.getLogger(__name__)
+
+
+class TTLStore:
+    """Ключ-значение со сроком жизни: в памяти словарь и min-heap по времени
+    истечения, копия в таблице ttl_store, чтобы записи переживали перезапуск.
+
+    Устаревшие записи снимаются с вершины кучи при каждом обращении и периодическим
+    expire(), без обхода всех ключей. Значения должны сериализоваться в JSON.
+    Записи, которые не удалось сохранить в БД, expire() пробует записать снова.
+    """
+
+    def __init__(self, namespace: str, ttl_seconds: float):
+        self.namespace = namespace
+        self.ttl_seconds = ttl_seconds
+        self._values: Dict[str, Tuple[Any, float]] = {}
+        self._expiry_heap: List[Tuple[float, str]] = []
+        self._unsaved: set[str] = set()
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def _put(self, key: str, value: Any, expires_at: float):
+        self._values[key] = (value, expires_at)
+        heapq.heappush(self._expiry_heap, (expires_at, key))
+
+    def _pop_expired(self, now: float) -> List[str]:
+        expired = []
+        while self._expiry_heap and self._expiry_heap[0][0] <= now:
+            expires_at, key = heapq.heappop(self._expiry_heap)
+            # В куче остаются устаревшие пары для перезаписанных ключей: удаляем,
+            # только если срок совпадает с актуальным.
+            entry = self._values.get(key)
+            if entry and entry[1] == expires_at:
+                del self._values[key]
+                expired.append(key)
+        return expired
+
+    async def load(self, legacy_entries: Optional[Dict[Any, dict]] = None) -> bool:
+        """Читает живые записи из БД. legacy_entries - старый словарь из bot_data
+        с полем timestamp, он переносится в хранилище. False, если перенести его
+        не удалось: записи доступны только в памяти, и старый ключ удалять нельзя."""
+        now = time.time()
+        entries = []
+        migrated = True
+        if legacy_entries:
+            entries = [(str(key), value, value.get('timestamp', now) + self.ttl_seconds)
+                       for key, value in legacy_entries.items()]
+            migrated = await database.ttl_store_set_many(self.namespace, entries)
+            if migrated:
+                logger.info(f"Migrated {len(entries)} '{self.namespace}' entries from bot_data.")
+            else:
+                logger.error(f"Failed to migrate {len(entries)} '{self.namespace}' entries from bot_data, keeping the old key.")
+        await database.ttl_store_delete_expired(self.namespace, now)
+        self._values.clear()
+        self._expiry_heap.clear()
+        self._unsaved.clear()
+        for row in await database.ttl_store_load(self.namespace):
+            self._put(row['key'], row['value'], row['expires_at'])
+        if not migrated:
+            for key, value, expires_at in entries:
+                if expires_at > now:
+                    self._put(key, value, expires_at)
+                    self._unsaved.add(key)
+        logger.info(f"Loaded {len(self._values)} '{self.namespace}' entries.")
+        return migrated
+
+    async def set(self, key: Any, value: Any, ttl_seconds: Optional[float] = None) -> bool:
+        """False, если запись не попала в БД: она есть только в памяти до следующего expire()."""
+        key = str(key)
+        expires_at = time.time() + (ttl_seconds if ttl_seconds is not None else self.ttl_seconds)
+        self._put(key, value, expires_at)
+        if not await database.ttl_store_set_many(self.namespace, [(key, value, expires_at)]):
+            logger.error(f"Failed to save '{self.namespace}' entry {key}, will retry on the next expiry run.")
+            self._unsaved.add(key)
+            return False
+        self._unsaved.discard(key)
+        return True
+
+    async def _save_unsaved(self):
+        self._unsaved &= self._values.keys()
+        if not self._unsaved:
+            return
+        entries = [(key, *self._values[key]) for key in self._unsaved]
+        if await database.ttl_store_set_many(self.namespace, entries):
+            logger.info(f"Saved {len(entries)} previously unsaved '{self.namespace}' entries.")
+            self._unsaved.clear()
+        else:
+            logger.error(f"Still failing to save {len(entries)} '{self.namespace}' entries.")
+
+    def get(self, key: Any) -> Optional[Any]:
+        self._pop_expired(time.time())
+        entry = self._values.get(str(key))
+        return entry[0] if entry else None
+
+    async def expire(self) -> int:
+        now = time.time()
+        expired = self._pop_expired(now)
+        if expired:
+            await database.ttl_store_delete_expired(self.namespace, now)
+        await self._save_unsaved()
+        return len(expired)
+
+
+candidate_check_store = TTLStore("candidate_check_info", settings.CANDIDATE_CHECK_INFO_TTL_SECONDS)
@@ -0,0 +1,114 @@
+import json
+import logging
+import os
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional
+
+from core import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ChatUIState:
+    __slots__ = ("active_message_id", "bot_message_ids")
+
+    def __init__(self, active_message_id: Optional[int] = None, bot_message_ids: Optional[List[int]] = None):
+        self.active_message_id = active_message_id
+        self.bot_message_ids = bot_message_ids or []
+
+
+class UIStateStore:
+    """Служебное состояние интерфейса по чатам: активное сообщение меню и последние
+    сообщения бота для очистки. Раньше лежало в user_data и делало его изменённым
+    почти на каждое сообщение бота; здесь это LRU в памяти, который при остановке
+    можно сбросить в небольшой JSON-файл и прочитать при старте."""
+
+    def __init__(self, max_chats: int, keep_messages: int):
+        self.max_chats = max_chats
+        self.keep_messages = keep_messages
+        self._chats: OrderedDict[int, ChatUIState] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._chats)
+
+    def _get(self, chat_id: int, create: bool) -> Optional[ChatUIState]:
+        state = self._chats.get(chat_id)
+        if state is None:
+            if not create:
+                return None
+            state = self._chats[chat_id] = ChatUIState()
+            while len(self._chats) > self.max_chats:
+                self._chats.popitem(last=False)
+        self._chats.move_to_end(chat_id)
+        return state
+
+    def active_message_id(self, chat_id: int) -> Optional[int]:
+        state = self._get(chat_id, create=False)
+        return state.active_message_id if state else None
+
+    def set_active_message_id(self, chat_id: int, message_id: int):
+        self._get(chat_id, create=True).active_message_id = message_id
+
+    def add_bot_message(self, chat_id: int, message_id: int):
+        state = self._get(chat_id, create=True)
+        state.bot_message_ids.append(message_id)
+        del state.bot_message_ids[:-self.keep_messages]
+
+    def pop_bot_messages(self, chat_id: int) -> List[int]:
+        state = self._get(chat_id, create=False)
+        if not state:
+            return []
+        message_ids, state.bot_message_ids = state.bot_message_ids, []
+        return message_ids
+
+    def clear(self, chat_id: int):
+        self._chats.pop(chat_id, None)
+
+    def save(self, path: Path):
+        data = {str(chat_id): [state.active_message_id, state.bot_message_ids] for chat_id, state in self._chats.items()}
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, path)
+            logger.info(f"Saved UI state for {len(data)} chats.")
+        except OSError as e:
+            logger.error(f"Failed to save UI state to {path}: {e}")
+
+    def load(self, path: Path):
+        if not path.exists():
+            return
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to load UI state from {path}: {e}")
+            return
+        if not isinstance(data, dict):
+            logger.error(f"Failed to load UI state from {path}: expected an object, got {type(data).__name__}.")
+            return
+        for chat_id, entry in data.items():
+            state = self._parse_entry(chat_id, entry)
+            if state is None:
+                logger.warning(f"Skipping malformed UI state entry for chat {chat_id!r}: {entry!r}")
+                continue
+            self._chats[int(chat_id)] = state
+        while len(self._chats) > self.max_chats:
+            self._chats.popitem(last=False)
+        logger.info(f"Loaded UI state for {len(self._chats)} chats.")
+
+    def _parse_entry(self, chat_id: str, entry) -> Optional[ChatUIState]:
+        try:
+            int(chat_id)
+            active_message_id, bot_message_ids = entry
+        except (TypeError, ValueError):
+            return None
+        if active_message_id is not None and not isinstance(active_message_id, int):
+            return None
+        if not isinstance(bot_message_ids, list) or not all(isinstance(message_id, int) for message_id in bot_message_ids):
+            return None
+        return ChatUIState(active_message_id, bot_message_ids[-self.keep_messages:])
+
+
+ui_state = UIStateStore(settings.UI_STATE_MAX_CHATS, settings.UI_STATE_KEEP_MESSAGES)
@@ -17,20 +17,25 @@ from telegram.error import BadRequest, Forbidden
 
 from models import AdminState
 from core import settings, database
+from core.session_cache import SessionCache
+from core.broadcast import start_broadcast, has_running_broadcast
 from utils.helpers import (
     safe_answer_callback_query,
     get_id_from_input,
     send_new_menu_message,
     send_or_edit_message,
-    set_user_commands
+    set_user_commands,
+    clear_user_state
 )
 from utils.keyboards import (
     RESTAURANT_OPTIONS,
     get_admin_menu_keyboard,
 )
-
 logger = logging.getLogger(__name__)
 
+# Список кандидатов, который видит каждый админ на экране "на рассмотрении"; в persistence не сохраняется.
+pending_tasks_cache = SessionCache(settings.ADMIN_SESSION_MAX_ENTRIES, settings.ADMIN_SESSION_TTL_SECONDS)
+
 
 async def edit_admin_message(query: CallbackQuery, text: str, reply_markup: InlineKeyboardMarkup = None):
     try:
@@ -225,7 +230,7 @@ async def add_id_received(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             text = f"❌ Ошибка: не удалось найти пользователя {user_id_to_add} или он не запускал бота. ({e})"
     keyboard = InlineKeyboardMarkup([[InlineKeyboardButton("⬅️ Назад в меню", callback_data=settings.CALLBACK_ADMIN_BACK)]])
     await send_or_edit_message(update, context, text, keyboard)
-    context.user_data.clear()
+    clear_user_state(update, context)
     return AdminState.MENU
 
 
@@ -240,7 +245,7 @@ async def admin_list_pending_candidates(update: Update, context: ContextTypes.DE
     candidates_by_restaurant = defaultdict(list)
     for task in pending_tasks:
         candidates_by_restaurant[task['restaurant_name']].append(task)
-    context.application.bot_data['admin_pending_tasks'] = {task['id']: task for task in pending_tasks}
+    pending_tasks_cache.set(query.from_user.id, {task['id']: task for task in pending_tasks})
     text_parts = ["<b>Кандидаты на рассмотрении:</b>"]
     buttons = []
     for restaurant_name, candidates in sorted(candidates_by_restaurant.items()):
@@ -257,7 +262,7 @@ async def handle_candidate_action_menu(update: Update, context: ContextTypes.DEF
     query = update.callback_query
     await safe_answer_callback_query(query)
     feedback_id = query.data.replace("cand_act_", "")
-    all_tasks = context.application.bot_data.get('admin_pending_tasks', {})
+    all_tasks = pending_tasks_cache.get(query.from_user.id) or {}
     task = all_tasks.get(feedback_id)
     if not task:
         await query.answer("Задача этого кандидата уже неактуальна.", show_alert=True)
@@ -277,7 +282,7 @@ async def handle_admin_delete_candidate(update: Update, context: ContextTypes.DE
     query = update.callback_query
     await safe_answer_callback_query(query)
     feedback_id = query.data.replace("cand_del_", "")
-    all_tasks = context.application.bot_data.get('admin_pending_tasks', {})
+    all_tasks = pending_tasks_cache.get(query.from_user.id) or {}
     task = all_tasks.get(feedback_id)
     if not task:
         await query.answer("Кандидат не найден.", show_alert=True)
@@ -328,7 +333,7 @@ async def show_stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Admi
 
 async def broadcast_climate_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> AdminState:
     query = update.callback_query
-    if context.bot_data.get('broadcast_in_progress', False):
+    if await has_running_broadcast():
         await query.answer("❗️ Рассылка уже запущена.", show_alert=True)
         return await admin_panel_start(update, context)
     active_ids = await database.get_active_employees()
@@ -350,21 +355,15 @@ async def handle_broadcast_confirmation(update: Update, context: ContextTypes.DE
     if query.data == "admin_broadcast_cancel":
         await edit_admin_message(query, "Рассылка отменена.", None); await asyncio.sleep(1)
         return await admin_panel_start(update, context)
-    context.bot_data['broadcast_in_progress'] = True
     users = context.user_data.get('broadcast_list', [])
-    await edit_admin_message(query, f"Начинаю рассылку для {len(users)} сотрудников...", None)
-    success, fail = 0, 0
     keyboard = InlineKeyboardMarkup([
         [InlineKeyboardButton("📊 Пройти опрос", callback_data=settings.CALLBACK_START_CLIMATE)]])
     text = "Привет! 👋 Предлагаем пройти анонимный опрос, чтобы мы лучше понимали климат в команде."
-    for user_id in users:
-        try:
-            await context.bot.send_message(user_id, text, reply_markup=keyboard); success += 1
-            await asyncio.sleep(0.1)
-        except (Forbidden, BadRequest): fail += 1
-    report = f"✅ Рассылка завершена.\nУспешно: {success}, Неуспешно: {fail}"
-    await context.bot.send_message(update.effective_chat.id, report)
-    logger.info(f"Climate survey broadcast finished. Success: {success}, Failed: {fail}")
-    context.bot_data['broadcast_in_progress'] = False
-    context.user_data.clear()
+    # Отправка идёт в фоне; прогресс админ видит в отдельном сообщении.
+    job_id = await start_broadcast(context.application, "climate_survey", text, keyboard, update.effective_user.id, users)
+    if job_id is None:
+        await edit_admin_message(query, "❗️ Не удалось создать рассылку, попробуйте позже.", None)
+    else:
+        await edit_admin_message(query, f"Рассылка #{job_id} для {len(users)} сотрудников запущена.", None)
+    clear_user_state(update, context)
     return await admin_panel_start(update, context)
\ No newline at end of file
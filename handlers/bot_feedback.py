@@ -15,7 +15,7 @@ from telegram.constants import ParseMode
 from models import MainMenuState
 from core import settings
 from utils.helpers import get_user_data_from_update, add_to_sheets_queue, get_now, safe_answer_callback_query, \
-    send_or_edit_message
+    send_or_edit_message, clear_user_state, set_active_message
 from handlers.common import cancel
 
 logger = logging.getLogger(__name__)
@@ -32,7 +32,7 @@ FEEDBACK_TYPES = {
 async def start_feedback_submission(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     query = update.callback_query
     await safe_answer_callback_query(query)
-    context.user_data[settings.ACTIVE_MESSAGE_ID_KEY] = query.message.message_id
+    set_active_message(query.message)
 
     keyboard = [
         [InlineKeyboardButton("🐞 Ошибка (Баг)", callback_data="fb_bug")],
@@ -75,7 +75,7 @@ async def description_received(update: Update, context: ContextTypes.DEFAULT_TYP
     text = "✅ Ваше сообщение принято! Спасибо за ваш вклад. Мы рассмотрим его в ближайшее время."
     await send_or_edit_message(update, context, text)
 
-    context.user_data.clear()
+    clear_user_state(update, context)
     return ConversationHandler.END
 
 
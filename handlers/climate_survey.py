@@ -20,7 +20,8 @@ from utils.helpers import (
     safe_answer_callback_query,
     send_or_edit_message,
     add_to_sheets_queue,
-    get_now
+    get_now,
+    clear_user_state
 )
 from utils.keyboards import (
     RESTAURANT_OPTIONS,
@@ -38,7 +39,7 @@ logger = logging.getLogger(__name__)
 async def start_climate_survey_flow(update: Update, context: ContextTypes.DEFAULT_TYPE) -> ClimateState:
     query = update.callback_query
     await safe_answer_callback_query(query)
-    context.user_data.clear()
+    clear_user_state(update, context)
     context.user_data['_in_climate_survey'] = True
     context.user_data['chat_id'] = query.message.chat_id
 
@@ -65,7 +66,7 @@ async def climate_employment_status_selected(update: Update, context: ContextTyp
 
     if query.data == "climate_employed_no":
         await send_or_edit_message(update, context, "Спасибо за честность. Этот опрос предназначен для действующих сотрудников. Хорошего дня!")
-        context.user_data.clear()
+        clear_user_state(update, context)
         return ConversationHandler.END
 
     keyboard = build_inline_keyboard(RESTAURANT_OPTIONS, columns=2)
@@ -261,7 +262,7 @@ async def climate_final_question_answered(update: Update, context: ContextTypes.
         update, context,
         "✅ <b>Опрос завершен!</b>\n\nБольшое спасибо за твой вклад! 🙏 Твои ответы помогут нам сделать рабочую среду в «Марчеллис» еще лучше."
     )
-    context.user_data.clear()
+    clear_user_state(update, context)
 
 
 climate_survey_conversation_handler = ConversationHandler(
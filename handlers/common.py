@@ -2,6 +2,7 @@ import html
 import logging
 import time
 import traceback
+from typing import List
 
 logger = logging.getLogger(__name__)
 
@@ -11,23 +12,35 @@ from telegram.constants import ParseMode
 from telegram.error import BadRequest, Forbidden
 
 from core import settings, database
+from core.interacted_users import interacted_users
+from core.persistence import write_behind
+from core.persistence_gc import mark_user_active
+from core.rate_limiter import RequestPriority
 from utils.helpers import (
     get_user_data_from_update,
     send_new_menu_message,
     cleanup_chat,
-    send_transient_message  # Возвращаем импорт
+    send_transient_message,  # Возвращаем импорт
+    clear_user_state
 )
 
 
 async def handle_blocked_user(user_id: int, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handles logic when a user has blocked the bot."""
     logger.warning(f"User {user_id} has blocked the bot. Aborting interaction and cleaning up data.")
-    await database.delete_user_data(user_id)
-    interacted_set = context.bot_data.setdefault("users_interacted", set())
-    interacted_set.discard(user_id)
+    await handle_blocked_users([user_id])
     return ConversationHandler.END
 
 
+async def handle_blocked_users(user_ids: List[int]):
+    """Cleans up data of several users who blocked the bot, e.g. found during a broadcast."""
+    for user_id in user_ids:
+        await database.delete_user_data(user_id)
+    removed = await interacted_users.remove_many(user_ids)
+    if len(user_ids) > 1:
+        logger.info(f"Cleaned up {len(user_ids)} users who blocked the bot, {removed} removed from interacted users.")
+
+
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     user = update.effective_user
     if not user:
@@ -40,8 +53,7 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
 
     await cleanup_chat(context, user.id)
 
-    if context.user_data:
-        context.user_data.clear()
+    clear_user_state(update, context)
 
     try:
         from handlers.main_menu import start
@@ -92,7 +104,8 @@ async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> N
     if settings.ADMIN_IDS:
         for admin_id in settings.ADMIN_IDS:
             try:
-                await context.bot.send_message(chat_id=admin_id, text=message, parse_mode=ParseMode.HTML)
+                await context.bot.send_message(chat_id=admin_id, text=message, parse_mode=ParseMode.HTML,
+                                               rate_limit_args=RequestPriority.NOTIFICATION)
             except Exception as e:
                 logger.critical(f"CRITICAL: Failed to send error notification to admin {admin_id}: {e}")
 
@@ -109,6 +122,9 @@ async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> N
 
 
 async def update_timestamp_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user:
+        mark_user_active(update.effective_user.id)
+    write_behind.mark_update(update)
     if hasattr(context.application, "bot_data") and 'last_telegram_update_ts' in context.application.bot_data:
         context.application.bot_data['last_telegram_update_ts'] = time.time()
 
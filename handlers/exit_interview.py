@@ -19,13 +19,17 @@ from telegram.error import Forbidden, BadRequest
 
 from models import ExitState
 from core import settings, database, stickers
+from core.interacted_users import interacted_users
+from core.rate_limiter import RequestPriority
 from utils.helpers import (
     get_user_data_from_update,
     safe_answer_callback_query,
     send_or_edit_message,
     add_to_sheets_queue,
     get_now,
-    cleanup_chat
+    cleanup_chat,
+    clear_user_state,
+    set_active_message
 )
 from utils.keyboards import (
     RESTAURANT_OPTIONS,
@@ -93,8 +97,7 @@ async def handle_chat_member(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
     logger.info(f"User {target_user_name} ({target_user_id}) left or was banned from chat {member_update.chat.title}.")
 
-    users_interacted = context.bot_data.get("users_interacted", set())
-    if target_user_id not in users_interacted:
+    if target_user_id not in interacted_users:
         logger.info(f"User {target_user_id} has not interacted with the bot before. Skipping exit interview invite.")
         return
 
@@ -113,7 +116,7 @@ async def handle_chat_member(update: Update, context: ContextTypes.DEFAULT_TYPE)
                  "Если это связано с увольнением, мы будем очень благодарны за обратную связь. Если нет — просто нажми вторую кнопку.",
             reply_markup=keyboard
         )
-        context.user_data[settings.ACTIVE_MESSAGE_ID_KEY] = sent_message.message_id
+        set_active_message(sent_message)
         logger.info(f"Sent exit clarification to user {target_user_name} (ID: {target_user_id}).")
 
         context.job_queue.run_once(
@@ -164,10 +167,10 @@ async def handle_quit_clarification(update: Update, context: ContextTypes.DEFAUL
 async def start_exit_interview_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> ExitState:
     query = update.callback_query
     await safe_answer_callback_query(query)
-    context.user_data.clear()
+    clear_user_state(update, context)
     context.user_data['_in_exit_interview'] = True
     context.user_data['chat_id'] = query.message.chat_id
-    context.user_data[settings.ACTIVE_MESSAGE_ID_KEY] = query.message.message_id
+    set_active_message(query.message)
 
 
     await send_or_edit_message(update, context, "Спасибо тебе за готовность помочь! 🙏 Давай начнем.", None)
@@ -293,7 +296,8 @@ async def exit_comments_received(update: Update, context: ContextTypes.DEFAULT_T
     )
     for admin_id in settings.ADMIN_IDS:
         try:
-            await context.bot.send_message(admin_id, admin_message, parse_mode=ParseMode.HTML)
+            await context.bot.send_message(admin_id, admin_message, parse_mode=ParseMode.HTML,
+                                           rate_limit_args=RequestPriority.NOTIFICATION)
         except Exception as e:
             logger.error(f"Failed to send exit interview summary to admin {admin_id}: {e}")
 
@@ -304,7 +308,7 @@ async def exit_comments_received(update: Update, context: ContextTypes.DEFAULT_T
     await asyncio.sleep(0.5)
     await context.bot.send_sticker(chat_id=user_id, sticker=stickers.SUCCESS_DOG)
 
-    context.user_data.clear()
+    clear_user_state(update, context)
     return ConversationHandler.END
 
 
@@ -15,6 +15,7 @@ from telegram.constants import ParseMode
 
 from models import CandidateFeedbackState, OnboardingFollowupState
 from core import settings, database
+from core.rate_limiter import RequestPriority
 from utils.helpers import (
     safe_answer_callback_query,
     send_or_edit_message,
@@ -22,7 +23,9 @@ from utils.helpers import (
     build_inline_keyboard,
     get_now,
     get_user_data_from_update,
-    send_new_menu_message
+    send_new_menu_message,
+    clear_user_state,
+    set_active_message
 )
 from utils.keyboards import CANDIDATE_FEEDBACK_RATING_OPTIONS, YES_NO_OPTIONS, RESTAURANT_OPTIONS
 from handlers.common import cancel, prompt_to_use_button
@@ -68,7 +71,7 @@ async def schedule_onboarding_noshow_check(context: ContextTypes.DEFAULT_TYPE):
 
     try:
         sent_message = await context.bot.send_message(candidate_id, text, reply_markup=keyboard)
-        context.user_data[settings.ACTIVE_MESSAGE_ID_KEY] = sent_message.message_id
+        set_active_message(sent_message)
         context.user_data['candidate_id_for_noshow'] = candidate_id
     except Exception as e:
         logger.error(f"Failed to send onboarding no-show check to {candidate_id}: {e}")
@@ -127,7 +130,8 @@ async def leaving_reason_received(update: Update, context: ContextTypes.DEFAULT_
                         text=message,
                         reply_to_message_id=task['message_id'],
                         parse_mode=ParseMode.HTML,
-                        allow_sending_without_reply=True
+                        allow_sending_without_reply=True,
+                        rate_limit_args=RequestPriority.NOTIFICATION
                     )
                 except Exception as e:
                     logger.error(f"Failed to send leaving reason to manager/admin {task['manager_id']}: {e}")
@@ -161,8 +165,8 @@ onboarding_followup_conversation_handler = ConversationHandler(
 async def start_candidate_feedback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> CandidateFeedbackState:
     query = update.callback_query
     await safe_answer_callback_query(query)
-    context.user_data.clear()
-    context.user_data[settings.ACTIVE_MESSAGE_ID_KEY] = query.message.message_id
+    clear_user_state(update, context)
+    set_active_message(query.message)
 
     keyboard = build_inline_keyboard(CANDIDATE_FEEDBACK_RATING_OPTIONS, columns=5)
     text = "<b>Вопрос 1/4:</b> Как в целом прошло интервью? Пожалуйста, оцени от 1 (плохо) до 5 (отлично)."
@@ -267,7 +271,8 @@ async def additional_comments_received(update: Update, context: ContextTypes.DEF
                     text=admin_message,
                     parse_mode=ParseMode.HTML,
                     reply_to_message_id=task['message_id'],
-                    allow_sending_without_reply=True
+                    allow_sending_without_reply=True,
+                    rate_limit_args=RequestPriority.NOTIFICATION
                 )
             except Exception as e:
                 logger.error(f"Failed to send candidate feedback to admin {task['manager_id']}: {e}")
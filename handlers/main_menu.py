@@ -12,10 +12,12 @@ from telegram.error import Forbidden
 
 from models import MainMenuState, FeedbackState, ManagerFeedbackState
 from core import settings, database, stickers
+from core.rate_limiter import RequestPriority
 from utils.helpers import (
     safe_answer_callback_query, add_user_to_interacted,
     get_user_data_from_update, send_new_menu_message, send_or_edit_message,
-    set_user_commands
+    set_user_commands,
+    clear_user_state
 )
 from utils.keyboards import get_manager_menu_keyboard, get_pending_feedback_keyboard
 from handlers.common import handle_blocked_user, cancel
@@ -150,7 +152,8 @@ async def receive_and_forward_feedback(update: Update, context: ContextTypes.DEF
                    f"<b>Сообщение:</b>\n<pre>{html.escape(feedback_text)}</pre>")
         for admin_id in settings.ADMIN_IDS:
             try:
-                await context.bot.send_message(admin_id, message, parse_mode=ParseMode.HTML)
+                await context.bot.send_message(admin_id, message, parse_mode=ParseMode.HTML,
+                                               rate_limit_args=RequestPriority.NOTIFICATION)
             except Exception as e:
                 logger.error(f"Failed to forward feedback to admin {admin_id}: {e}")
 
@@ -162,5 +165,5 @@ async def receive_and_forward_feedback(update: Update, context: ContextTypes.DEF
                                    "К сожалению, функция отправки сообщений сейчас не работает. Попробуй, пожалуйста, позже."
                                    )
 
-    context.user_data.clear()
+    clear_user_state(update, context)
     return ConversationHandler.END
\ No newline at end of file
@@ -16,13 +16,16 @@ from telegram.constants import ParseMode
 
 from models import ManagerRegistrationState
 from core import settings, database, stickers
+from core.rate_limiter import RequestPriority
 from utils.helpers import (
     get_user_data_from_update,
     safe_answer_callback_query,
     send_or_edit_message,
     send_transient_message,
     add_user_to_interacted,
-    set_user_commands
+    set_user_commands,
+    clear_user_state,
+    set_active_message
 )
 from utils.keyboards import (
     RESTAURANT_OPTIONS,
@@ -41,7 +44,7 @@ async def register_manager_start(update: Update, context: ContextTypes.DEFAULT_T
         return ConversationHandler.END
 
     await add_user_to_interacted(user.id, context)
-    context.user_data.clear()
+    clear_user_state(update, context)
 
     if user.id in settings.ADMIN_IDS:
         if update.message:
@@ -57,7 +60,7 @@ async def register_manager_start(update: Update, context: ContextTypes.DEFAULT_T
 
     if update.message:
         sent_message = await update.message.reply_text(text, reply_markup=keyboard, parse_mode=ParseMode.HTML)
-        context.user_data[settings.ACTIVE_MESSAGE_ID_KEY] = sent_message.message_id
+        set_active_message(sent_message)
     elif update.callback_query:
         await send_or_edit_message(update, context, text, keyboard)
 
@@ -119,14 +122,15 @@ async def full_name_received(update: Update, context: ContextTypes.DEFAULT_TYPE)
         )
         for admin_id in settings.ADMIN_IDS:
             try:
-                await context.bot.send_sticker(chat_id=admin_id, sticker=stickers.CONTACT_MANAGER)
+                await context.bot.send_sticker(chat_id=admin_id, sticker=stickers.CONTACT_MANAGER,
+                                               rate_limit_args=RequestPriority.NOTIFICATION)
                 await asyncio.sleep(0.3)
                 await context.bot.send_message(admin_id, message, reply_markup=approval_keyboard,
-                                               parse_mode=ParseMode.HTML)
+                                               parse_mode=ParseMode.HTML, rate_limit_args=RequestPriority.NOTIFICATION)
             except Exception as e:
                 logger.error(f"Failed to send manager approval request to admin {admin_id}: {e}")
 
-    context.user_data.clear()
+    clear_user_state(update, context)
     return ConversationHandler.END
 
 
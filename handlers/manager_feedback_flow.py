@@ -1,6 +1,7 @@
+import asyncio
 import html
+import json
 import logging
-import time
 from datetime import datetime, timedelta
 
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton, User
@@ -13,6 +14,8 @@ from telegram.error import BadRequest
 
 from models import ManagerFeedbackState, MainMenuState
 from core import settings, database
+from core.ttl_store import candidate_check_store
+from core.rate_limiter import RequestPriority
 from utils.helpers import (
     safe_answer_callback_query,
     add_to_sheets_queue,
@@ -210,13 +213,12 @@ async def process_manager_feedback(context: ContextTypes.DEFAULT_TYPE, respondin
         reply_text_parts.append(f"<i>Решение принял(а): {responding_user.mention_html()}</i>")
         reply_text = "\n".join(reply_text_parts)
 
-        context.bot_data.setdefault('candidate_check_info', {})[candidate_id] = {
+        await candidate_check_store.set(candidate_id, {
             "position": job_data.get('position', '—'),
             "full_name": job_data.get('full_name', '—'),
             "address": job_data.get('address', '—'),
             "phone": job_data.get('phone', '—'),
-            "timestamp": time.time()
-        }
+        })
         keyboard = InlineKeyboardMarkup([
             [InlineKeyboardButton("📄 Проверка кандидата", callback_data=f"check_candidate_{candidate_id}")]
         ])
@@ -243,29 +245,62 @@ async def process_manager_feedback(context: ContextTypes.DEFAULT_TYPE, respondin
         else:
             logger.info(f"Intermediate status '{status}' for candidate {candidate_id}. Tasks remain for now.")
 
-        for task in all_tasks_for_candidate:
-            try:
-                await context.bot.send_message(
+        await propagate_decision(context, all_tasks_for_candidate, reply_text, responding_user, is_final_decision)
+
+
+async def propagate_decision(context: ContextTypes.DEFAULT_TYPE, tasks: list, reply_text: str,
+                             responding_user: User, is_final_decision: bool):
+    """Рассылает решение по кандидату всем получателям анкеты параллельно, в пределах
+    общего лимитера. После окончательного решения сводка у остальных получателей
+    одной правкой теряет кнопку и получает отметку, кто обработал кандидата."""
+    processed_note = f"\n\n<i>(Обработано: {responding_user.mention_html()})</i>"
+
+    async def send_reply(task: dict):
+        try:
+            await context.bot.send_message(
+                chat_id=task['manager_id'],
+                text=reply_text,
+                reply_to_message_id=task['message_id'],
+                parse_mode=ParseMode.HTML,
+                allow_sending_without_reply=True,
+                rate_limit_args=RequestPriority.NOTIFICATION
+            )
+        except BadRequest as e:
+            if "message to reply not found" not in str(e).lower():
+                logger.warning(f"Could not send feedback update to manager {task['manager_id']} (BadRequest): {e}")
+        except Exception as e:
+            logger.error(f"Failed to send feedback reply to manager {task['manager_id']}: {e}")
+
+    async def mark_processed(task: dict):
+        try:
+            summary_text = json.loads(task['job_data_json']).get('summary_text')
+            if summary_text:
+                # Без reply_markup правка текста заодно убирает кнопку.
+                await context.bot.edit_message_text(
+                    text=summary_text + processed_note,
                     chat_id=task['manager_id'],
-                    text=reply_text,
-                    reply_to_message_id=task['message_id'],
+                    message_id=task['message_id'],
                     parse_mode=ParseMode.HTML,
-                    allow_sending_without_reply=True
+                    rate_limit_args=RequestPriority.NOTIFICATION
                 )
-                if is_final_decision and task['manager_id'] != responding_user.id:
-                    original_message = await context.bot.edit_message_reply_markup(
-                        chat_id=task['manager_id'],
-                        message_id=task['message_id'],
-                        reply_markup=None
-                    )
-                    await context.bot.edit_message_text(
-                         text=f"{original_message.text}\n\n<i>(Обработано: {responding_user.mention_html()})</i>",
-                         chat_id=task['manager_id'],
-                         message_id=task['message_id'],
-                         parse_mode=ParseMode.HTML
-                    )
-            except BadRequest as e:
-                if "message to reply not found" not in str(e).lower():
-                    logger.warning(f"Could not send feedback update to manager {task['manager_id']} (BadRequest): {e}")
-            except Exception as e:
-                logger.error(f"Failed to send feedback reply to manager {task['manager_id']}: {e}")
\ No newline at end of file
+            else:
+                # Задачи, созданные до сохранения текста сводки: только убираем кнопку.
+                await context.bot.edit_message_reply_markup(
+                    chat_id=task['manager_id'],
+                    message_id=task['message_id'],
+                    reply_markup=None,
+                    rate_limit_args=RequestPriority.NOTIFICATION
+                )
+        except BadRequest as e:
+            if "message to edit not found" not in str(e).lower():
+                logger.warning(f"Could not mark summary as processed for manager {task['manager_id']} (BadRequest): {e}")
+        except Exception as e:
+            logger.error(f"Failed to mark summary as processed for manager {task['manager_id']}: {e}")
+
+    updates = [send_reply(task) for task in tasks]
+    if is_final_decision:
+        updates.extend(mark_processed(task) for task in tasks if task['manager_id'] != responding_user.id)
+    # Сбой одной копии не должен прерывать остальные.
+    for result in await asyncio.gather(*updates, return_exceptions=True):
+        if isinstance(result, Exception):
+            logger.error(f"Failed to propagate decision to a summary copy: {result}", exc_info=result)
\ No newline at end of file
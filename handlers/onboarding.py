@@ -15,6 +15,7 @@ from telegram.constants import ParseMode
 
 from models import OnboardingState
 from core import settings, database, stickers
+from core.rate_limiter import RequestPriority
 from utils.helpers import (
     get_user_data_from_update,
     safe_answer_callback_query,
@@ -23,7 +24,8 @@ from utils.helpers import (
     add_user_to_interacted,
     get_now,
     format_user_for_sheets,
-    cleanup_chat
+    cleanup_chat,
+    clear_user_state
 )
 from utils.keyboards import (
     RESTAURANT_OPTIONS,
@@ -40,7 +42,7 @@ logger = logging.getLogger(__name__)
 async def start_onboarding_flow(update: Update, context: ContextTypes.DEFAULT_TYPE) -> OnboardingState:
     user_id, user_name, _ = get_user_data_from_update(update)
     await add_user_to_interacted(user_id, context)
-    context.user_data.clear()
+    clear_user_state(update, context)
     context.user_data['conversations'] = {'onboarding_conv': True}
 
     logger.info(f"User {user_name} ({user_id}) started onboarding flow.")
@@ -196,7 +198,8 @@ async def interest_reason_received(update: Update, context: ContextTypes.DEFAULT
     if settings.ADMIN_IDS:
         for admin_id in settings.ADMIN_IDS:
             try:
-                await context.bot.send_message(chat_id=admin_id, text=admin_message, parse_mode=ParseMode.HTML)
+                await context.bot.send_message(chat_id=admin_id, text=admin_message, parse_mode=ParseMode.HTML,
+                                               rate_limit_args=RequestPriority.NOTIFICATION)
             except Exception as e:
                 logger.error(f"Failed to send onboarding feedback summary to admin {admin_id}: {e}")
 
@@ -238,7 +241,7 @@ async def interest_reason_received(update: Update, context: ContextTypes.DEFAULT
         disable_web_page_preview=True
     )
 
-    context.user_data.clear()
+    clear_user_state(update, context)
     return ConversationHandler.END
 
 
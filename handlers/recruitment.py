@@ -18,6 +18,8 @@ from telegram.error import BadRequest, Forbidden
 
 from models import RecruitmentState
 from core import settings, database, stickers
+from core.ttl_store import candidate_check_store
+from core.rate_limiter import RequestPriority
 from utils.helpers import (
     get_user_data_from_update,
     safe_answer_callback_query,
@@ -26,7 +28,9 @@ from utils.helpers import (
     add_to_sheets_queue,
     add_user_to_interacted,
     get_now,
-    format_user_for_sheets
+    format_user_for_sheets,
+    clear_user_state,
+    set_active_message
 )
 from utils.keyboards import (
     RECRUITMENT_POSITION_OPTIONS,
@@ -77,7 +81,7 @@ async def start_recruitment_flow(update: Update, context: ContextTypes.DEFAULT_T
     user = update.effective_user
     logger.info(f"User {user.id} starting RECRUITMENT flow with deeplink.")
     await add_user_to_interacted(user.id, context)
-    context.user_data.clear()
+    clear_user_state(update, context)
     context.user_data['conversations'] = {'recruitment_conv': True} # Флаг для /start
 
     if update.message:
@@ -129,7 +133,7 @@ async def start_recruitment_flow(update: Update, context: ContextTypes.DEFAULT_T
         parse_mode=ParseMode.HTML,
         reply_markup=ReplyKeyboardRemove()
     )
-    context.user_data[settings.ACTIVE_MESSAGE_ID_KEY] = sent_message.message_id
+    set_active_message(sent_message)
 
     return RecruitmentState.FULL_NAME
 
@@ -171,7 +175,7 @@ async def age_received(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
         await send_or_edit_message(update, context,
                                    "К сожалению, мы можем принять на работу только с 16 лет. Спасибо за твой интерес, будем рады видеть тебя в будущем! 🙏"
                                    )
-        context.user_data.clear()
+        clear_user_state(update, context)
         return ConversationHandler.END
 
     if age > 100:
@@ -707,7 +711,7 @@ async def judged_before_received(update: Update, context: ContextTypes.DEFAULT_T
     final_text = f"Спасибо, {html.escape(first_name)}! Твоя анкета принята. Менеджер скоро свяжется с тобой. Хорошего дня!"
     await send_or_edit_message(update, context, final_text, None)
 
-    context.user_data.clear()
+    clear_user_state(update, context)
     return ConversationHandler.END
 
 
@@ -817,7 +821,9 @@ async def send_recruitment_results(context: ContextTypes.DEFAULT_TYPE):
         "interview_restaurant_code": interview_restaurant_code_suffix,
         "interview_restaurant_name": user_data.get('preselected_restaurant_name', 'Не указан'),
         "preferred_restaurant_codes": user_data.get('preferred_restaurant_codes', []),
-        "recruitment_report": full_report_text
+        "recruitment_report": full_report_text,
+        # Текст сводки, чтобы после решения отметить её одной правкой, не запрашивая исходное сообщение
+        "summary_text": summary_text
     }
 
     # --- Регистрация кандидата в БД как НЕАКТИВНОГО ---
@@ -830,27 +836,13 @@ async def send_recruitment_results(context: ContextTypes.DEFAULT_TYPE):
     )
     logger.info(f"Candidate {chat_id} registered in the system as inactive.")
 
-    for recipient_id in recipients:
-        try:
-            feedback_id = str(uuid.uuid4())
-            keyboard = InlineKeyboardMarkup([[
-                InlineKeyboardButton("📄 Посмотреть полную анкету", callback_data=f"show_full_report_{feedback_id}")
-            ]])
-
-            sent_message = await context.bot.send_message(recipient_id, summary_text, parse_mode=ParseMode.HTML,
-                                                          reply_markup=keyboard)
-
-            await database.add_pending_feedback(
-                feedback_id=feedback_id,
-                manager_id=recipient_id,
-                message_id=sent_message.message_id,
-                candidate_id=chat_id,
-                candidate_name=user_data.get('full_name', 'Кандидат'),
-                job_data=job_context_for_managers,
-                created_at=get_now().timestamp()
-            )
-        except Exception as e:
-            logger.error(f"Ошибка отправки анкеты и создания задачи для получателя {recipient_id}: {e}")
+    # Рассылка менеджерам не задерживает ответ кандидату: user_data к этому моменту
+    # уже не нужен, всё необходимое передаётся в задачу.
+    context.application.create_task(
+        send_candidate_summary(context.bot, recipients, summary_text, chat_id,
+                               user_data.get('full_name', 'Кандидат'), job_context_for_managers),
+        name=f"candidate_summary_{chat_id}"
+    )
 
     if context.job_queue:
         job_context_for_candidate = {"candidate_id": chat_id}
@@ -860,6 +852,34 @@ async def send_recruitment_results(context: ContextTypes.DEFAULT_TYPE):
         logger.info(f"Scheduled candidate feedback for candidate {chat_id}")
 
 
+async def send_candidate_summary(bot, recipients: set, summary_text: str, candidate_id: int, candidate_name: str,
+                                 job_data: dict):
+    """Отправляет сводку по анкете всем получателям параллельно (не больше
+    CANDIDATE_SUMMARY_FANOUT_CONCURRENCY одновременно) и затем одной записью
+    создаёт задачи pending_feedback для тех, кому сообщение дошло."""
+    semaphore = asyncio.Semaphore(settings.CANDIDATE_SUMMARY_FANOUT_CONCURRENCY)
+
+    async def send_to(recipient_id: int):
+        feedback_id = str(uuid.uuid4())
+        keyboard = InlineKeyboardMarkup([[
+            InlineKeyboardButton("📄 Посмотреть полную анкету", callback_data=f"show_full_report_{feedback_id}")
+        ]])
+        async with semaphore:
+            try:
+                sent_message = await bot.send_message(recipient_id, summary_text, parse_mode=ParseMode.HTML,
+                                                      reply_markup=keyboard, rate_limit_args=RequestPriority.NOTIFICATION)
+            except Exception as e:
+                logger.error(f"Ошибка отправки анкеты получателю {recipient_id}: {e}")
+                return None
+        return feedback_id, recipient_id, sent_message.message_id
+
+    results = await asyncio.gather(*(send_to(recipient_id) for recipient_id in recipients))
+    tasks = [result for result in results if result]
+    if not await database.add_pending_feedback_many(tasks, candidate_id, candidate_name, job_data,
+                                                    get_now().timestamp()):
+        logger.error(f"Failed to create pending feedback tasks for candidate {candidate_id}.")
+
+
 async def show_full_recruitment_report(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     query = update.callback_query
     await safe_answer_callback_query(query)
@@ -897,7 +917,7 @@ async def send_candidate_check_info(update: Update, context: ContextTypes.DEFAUL
     query = update.callback_query
     await safe_answer_callback_query(query)
     candidate_id = int(query.data.replace("check_candidate_", ""))
-    check_data = context.bot_data.get('candidate_check_info', {}).get(candidate_id)
+    check_data = candidate_check_store.get(candidate_id)
 
     if not check_data:
         await query.edit_message_text("Данные для проверки не найдены (возможно, они устарели).")
@@ -1,6 +1,7 @@
 import asyncio
 import logging
 import os
+import signal
 import time
 from datetime import timedelta
 
@@ -21,9 +22,16 @@ from telegram.ext import (
 
 from models import AdminState, MainMenuState, FeedbackState, ManagerFeedbackState
 from core import settings, database, g_sheets
+from core.persistence import SQLitePersistence, persistence_write_behind_task, write_behind
+from core.interacted_users import interacted_users
+from core.ttl_store import candidate_check_store
+from core.ui_state import ui_state
+from core.persistence_gc import persistence_gc_job
+from core.broadcast import broadcast_worker_task
+from core.rate_limiter import create_rate_limiter, rate_limiter_metrics_job
 from core.logging_config import setup_logging
-from core.monitoring import heartbeat_task
-from handlers.common import error_handler, update_timestamp_handler, cancel
+from core.monitoring import heartbeat_task, sheets_lag_monitor_task
+from handlers.common import error_handler, update_timestamp_handler, cancel, handle_blocked_users
 from handlers.recruitment import recruitment_conversation_handler, show_full_recruitment_report, \
     send_candidate_check_info
 from handlers.onboarding import onboarding_conversation_handler
@@ -66,42 +74,48 @@ logger = setup_logging(__name__)
 
 background_tasks = set()
 stop_event = asyncio.Event()
+SHEETS_WRITER_TASK_NAME = "sheets_batch_writer"
+WRITE_BEHIND_TASK_NAME = "persistence_write_behind"
 
 
-async def cleanup_bot_data(context: ContextTypes.DEFAULT_TYPE):
-    now = time.time()
-    bot_data = context.bot_data
-    cleanup_count = 0
-    if 'candidate_check_info' in bot_data:
-        thirty_days_ago = now - timedelta(days=30).total_seconds()
-        keys_to_delete = [
-            cid for cid, data in bot_data['candidate_check_info'].items()
-            if data.get('timestamp', 0) < thirty_days_ago
-        ]
-        for key in keys_to_delete:
-            del bot_data['candidate_check_info'][key]
-            cleanup_count += 1
-
-    if cleanup_count > 0:
-        logger.info(f"Bot data cleanup: Removed {cleanup_count} old entries.")
+async def expire_ttl_entries(context: ContextTypes.DEFAULT_TYPE):
+    expired = await candidate_check_store.expire()
+    if expired > 0:
+        logger.info(f"TTL store cleanup: Removed {expired} expired candidate check entries.")
 
 
 async def post_init(application: Application):
     global background_tasks, stop_event
     application.bot_data.setdefault("last_telegram_update_ts", time.time())
+    legacy_keys = [key for key in ("users_interacted", "candidate_check_info", "admin_pending_tasks", "broadcast_in_progress")
+                   if key in application.bot_data]
+    await interacted_users.load(application.bot_data)
+    # Старый ключ удаляем, только когда записи уже лежат в ttl_store.
+    if await candidate_check_store.load(application.bot_data.get("candidate_check_info")):
+        application.bot_data.pop("candidate_check_info", None)
+    application.bot_data.pop("admin_pending_tasks", None)
+    # Флаг прежней синхронной рассылки: теперь идущие рассылки хранятся в broadcast_jobs.
+    application.bot_data.pop("broadcast_in_progress", None)
+    if settings.UI_STATE_PERSIST:
+        ui_state.load(settings.UI_STATE_FILE)
+    # Старые ключи удалены из bot_data: сохраняем это, не дожидаясь интервала persistence.
+    for key in legacy_keys:
+        if key not in application.bot_data:
+            write_behind.mark_dirty(("bot_data", key))
 
     if not all([settings.TOKEN, settings.GOOGLE_CREDENTIALS_JSON, settings.SPREADSHEET_ID, settings.ADMIN_IDS]):
         logger.critical("CRITICAL ERROR: One or more required environment variables are missing or invalid.")
 
-    agc_manager = await g_sheets.init_google_sheets_client()
-    if not agc_manager:
-        logger.warning("Google Sheets client failed to initialize. Recording to sheets is disabled.")
-
     loop = asyncio.get_running_loop()
 
-    if agc_manager:
+    if not settings.SHEETS_WRITER_IN_BOT:
+        logger.info("In-bot Sheets writer is disabled, sheets_queue is consumed by sheets_worker.py.")
+    else:
+        # Авторизация в Google не задерживает запуск бота: клиент поднимается в фоне,
+        # а записи до этого копятся в sheets_queue.
         writer_task = loop.create_task(
-            g_sheets.batch_writer_task(application, stop_event, agc_manager, application.bot_data)
+            g_sheets.start_batch_writer_when_ready(application, stop_event, application.bot_data),
+            name=SHEETS_WRITER_TASK_NAME
         )
         background_tasks.add(writer_task)
         writer_task.add_done_callback(background_tasks.discard)
@@ -112,14 +126,47 @@ async def post_init(application: Application):
     background_tasks.add(heartbeat_bg_task)
     heartbeat_bg_task.add_done_callback(background_tasks.discard)
 
+    write_behind_task = loop.create_task(
+        persistence_write_behind_task(application, stop_event, application.bot_data),
+        name=WRITE_BEHIND_TASK_NAME
+    )
+    background_tasks.add(write_behind_task)
+    write_behind_task.add_done_callback(background_tasks.discard)
+
+    lag_monitor_task = loop.create_task(
+        sheets_lag_monitor_task(application, stop_event, application.bot_data)
+    )
+    background_tasks.add(lag_monitor_task)
+    lag_monitor_task.add_done_callback(background_tasks.discard)
+
+    # Продолжает рассылки, прерванные перезапуском, и ждёт новых.
+    broadcast_task = loop.create_task(
+        broadcast_worker_task(application, stop_event, application.bot_data, on_blocked=handle_blocked_users)
+    )
+    background_tasks.add(broadcast_task)
+    broadcast_task.add_done_callback(background_tasks.discard)
+
     if application.job_queue:
         application.job_queue.run_repeating(
-            cleanup_bot_data,
-            interval=timedelta(hours=24),
+            expire_ttl_entries,
+            interval=timedelta(seconds=settings.TTL_STORE_EXPIRE_INTERVAL_SECONDS),
             first=timedelta(seconds=10),
-            name="cleanup_bot_data"
+            name="expire_ttl_entries"
+        )
+        logger.info("Scheduled periodic TTL store expiry.")
+        application.job_queue.run_repeating(
+            persistence_gc_job,
+            interval=timedelta(seconds=settings.PERSISTENCE_GC_INTERVAL_SECONDS),
+            first=timedelta(minutes=5),
+            name="persistence_gc"
+        )
+        logger.info("Scheduled periodic persistence GC.")
+        application.job_queue.run_repeating(
+            rate_limiter_metrics_job,
+            interval=timedelta(seconds=settings.BOT_API_METRICS_LOG_SECONDS),
+            first=timedelta(seconds=settings.BOT_API_METRICS_LOG_SECONDS),
+            name="rate_limiter_metrics"
         )
-        logger.info("Scheduled periodic bot_data cleanup.")
 
     logger.info(f"Bot post-initialization complete. {len(background_tasks)} background tasks started.")
 
@@ -129,6 +176,17 @@ async def on_shutdown(application: Application):
     logger.info("--- Initiating graceful shutdown sequence ---")
     if not stop_event.is_set():
         stop_event.set()
+    writer_tasks = [task for task in background_tasks if task.get_name() == SHEETS_WRITER_TASK_NAME]
+    if writer_tasks:
+        drain_timeout = settings.SHEETS_SHUTDOWN_FLUSH_SECONDS + settings.SHEETS_SHUTDOWN_GRACE_SECONDS
+        logger.info(f"Waiting up to {drain_timeout}s for the Sheets writer to drain...")
+        _, still_running = await asyncio.wait(writer_tasks, timeout=drain_timeout)
+        if still_running:
+            logger.warning("Sheets writer did not finish in time, cancelling its in-flight batch.")
+    write_behind_tasks = [task for task in background_tasks if task.get_name() == WRITE_BEHIND_TASK_NAME]
+    if write_behind_tasks:
+        # Последний flush отложенной записи, пока persistence ещё открыт.
+        await asyncio.wait(write_behind_tasks, timeout=settings.PERSISTENCE_SHUTDOWN_GRACE_SECONDS)
     if background_tasks:
         logger.info(f"Cancelling {len(background_tasks)} background tasks...")
         for task in list(background_tasks):
@@ -140,6 +198,8 @@ async def on_shutdown(application: Application):
         except asyncio.CancelledError:
             logger.info("Gather was cancelled, this is expected.")
         background_tasks.clear()
+    if settings.UI_STATE_PERSIST:
+        ui_state.save(settings.UI_STATE_FILE)
     logger.info("--- Bot shutdown complete ---")
 
 
@@ -150,18 +210,31 @@ async def reason_received(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     return ConversationHandler.END
 
 
+def log_startup_phase(phase: str, phase_started: float) -> float:
+    now = time.monotonic()
+    logger.info(f"Startup phase '{phase}' took {now - phase_started:.2f}s.")
+    return now
+
+
 async def main() -> None:
     logger.info("--- Bot Starting Up ---")
+    startup_started = phase_started = time.monotonic()
 
     await database.init_db()
     logger.info("Database initialization complete.")
     logger.info(f"Bot process started with PID: {os.getpid()}.")
+    phase_started = log_startup_phase("database", phase_started)
 
-    persistence = PicklePersistence(filepath=settings.PERSISTENCE_FILE)
+    if settings.PERSISTENCE_BACKEND == "pickle":
+        persistence = PicklePersistence(filepath=settings.PERSISTENCE_FILE)
+    else:
+        persistence = SQLitePersistence(filepath=settings.PERSISTENCE_DB_FILE, migrate_from=settings.PERSISTENCE_FILE)
+    logger.info(f"Using {type(persistence).__name__} for bot persistence.")
     application = (
         Application.builder()
         .token(settings.TOKEN)
         .persistence(persistence)
+        .rate_limiter(create_rate_limiter())
         .post_init(post_init)
         .post_shutdown(on_shutdown)
         .read_timeout(30).write_timeout(30).connect_timeout(30)
@@ -300,18 +373,28 @@ async def main() -> None:
     application.add_handler(admin_conversation_handler)
     application.add_handler(main_conversation_handler)
     application.add_error_handler(error_handler)
+    phase_started = log_startup_phase("handlers", phase_started)
 
     logger.info("Starting bot polling...")
 
     await application.initialize()
+    phase_started = log_startup_phase("initialize", phase_started)
+    # post_init и post_shutdown сам вызывает только run_polling, при ручном запуске - мы.
+    await application.post_init(application)
+    phase_started = log_startup_phase("post_init", phase_started)
     await application.start()
     await application.updater.start_polling(allowed_updates=Update.ALL_TYPES)
+    log_startup_phase("start_polling", phase_started)
+    logger.info(f"Bot is up in {time.monotonic() - startup_started:.2f}s.")
 
-    await stop_event.wait()
-
-    await application.updater.stop()
-    await application.stop()
-    await application.shutdown()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop_event.set)
+    try:
+        await stop_event.wait()
+    finally:
+        await application.updater.stop()
+        await application.stop()
+        await application.post_shutdown(application)
+        await application.shutdown()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,65 @@
+"""Отдельный процесс записи в Google Sheets.
+
+Разбирает sheets_queue из той же SQLite-базы, что и бот, чтобы большие выгрузки
+не делили event loop и пул потоков с обработкой апдейтов. В боте при этом
+выставляется SHEETS_WRITER_IN_BOT=false.
+
+Запуск из корня проекта:
+    python sheets_worker.py
+"""
+import asyncio
+import os
+import signal
+
+from telegram.ext import Application
+
+from core import settings, database, g_sheets
+from core.logging_config import setup_logging
+from core.rate_limiter import create_rate_limiter
+
+logger = setup_logging(__name__)
+
+
+async def main() -> None:
+    logger.info(f"--- Sheets worker starting up (PID {os.getpid()}, id {g_sheets.WORKER_ID}) ---")
+    if settings.SHEETS_WRITER_IN_BOT:
+        # Claim не даёт взять одну запись дважды, но курсоры строк у процессов свои,
+        # и запись по диапазонам из двух процессов может перезаписать чужие строки.
+        logger.warning("SHEETS_WRITER_IN_BOT is enabled: set it to false for the bot while this worker runs, "
+                       "two writers must not write to the same spreadsheet.")
+
+    await database.init_db()
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    sheets_pool = await g_sheets.init_google_sheets_client_with_retries(stop_event)
+    if not sheets_pool and not settings.EXPORT_SINKS:
+        logger.critical("Google Sheets client failed to initialize and no local export sinks are configured, exiting.")
+        return
+
+    # Бот нужен только для уведомлений админам, апдейты воркер не получает. Уведомления
+    # отправляются с rate_limit_args, поэтому лимитер нужен и здесь.
+    application = Application.builder().token(settings.TOKEN).updater(None).rate_limiter(create_rate_limiter()).build()
+    async with application:
+        writer = asyncio.create_task(
+            g_sheets.batch_writer_task(application, stop_event, sheets_pool, application.bot_data)
+        )
+        await stop_event.wait()
+        logger.info("Stop requested, draining the Sheets writer...")
+        drain_timeout = settings.SHEETS_SHUTDOWN_FLUSH_SECONDS + settings.SHEETS_SHUTDOWN_GRACE_SECONDS
+        _, still_running = await asyncio.wait([writer], timeout=drain_timeout)
+        if still_running:
+            logger.warning("Sheets writer did not finish in time, cancelling its in-flight batch.")
+            writer.cancel()
+            await asyncio.gather(writer, return_exceptions=True)
+
+    logger.info("--- Sheets worker stopped ---")
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except Exception as e:
+        logger.critical(f"Sheets worker failed due to an unhandled exception: {e}", exc_info=True)
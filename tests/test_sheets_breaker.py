@@ -0,0 +1,95 @@
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from benchmarks.fake_sheets import FakeResponse
+from core import database, g_sheets
+from core.circuit_breaker import BreakerState, CircuitBreaker
+from core.sheets_pool import SheetsClientPool, SheetsCredential
+
+
+class FakeBot:
+    def __init__(self):
+        self.messages = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.messages.append((chat_id, text))
+
+
+class FakeApplication:
+    def __init__(self):
+        self.bot = FakeBot()
+
+
+class HalfOpenProbeTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.database_file = database.DATABASE_FILE
+        database.DATABASE_FILE = Path(self.tmp.name) / "bot_database.sqlite"
+        await database.init_db()
+        self.breaker = g_sheets.sheets_breaker
+        self.breaker.record_success()
+
+    async def asyncTearDown(self):
+        self.breaker.record_success()
+        database.DATABASE_FILE = self.database_file
+        self.tmp.cleanup()
+
+    def open_breaker_past_recovery(self):
+        self.breaker.state = BreakerState.OPEN
+        self.breaker.opened_at = time.monotonic() - self.breaker.recovery_timeout - 1
+
+    def test_release_probe_allows_next_probe(self):
+        breaker = CircuitBreaker("test", failure_threshold=1, recovery_timeout=0)
+        breaker.record_failure(TimeoutError())
+        self.assertTrue(breaker.allow_request())
+        self.assertFalse(breaker.allow_request())
+        breaker.release_probe()
+        self.assertTrue(breaker.allow_request())
+
+    async def test_probe_without_api_call_does_not_block_breaker(self):
+        await database.execute_query(
+            "INSERT INTO sheets_queue (sheet_name, data_json, created_at, row_key) VALUES (?, ?, ?, ?)",
+            ("test sheet", "{not json", time.time(), "malformed-row"))
+        self.open_breaker_past_recovery()
+
+        sink = g_sheets.GoogleSheetsSink(sheets_pool=object(), worker_id="test-worker")
+        items = await sink.pending_items()
+        await sink.export(FakeApplication(), items)
+
+        self.assertEqual(self.breaker.state, BreakerState.HALF_OPEN)
+        self.assertTrue(self.breaker.allow_request())
+
+    async def test_non_outage_error_closes_breaker(self):
+        self.open_breaker_past_recovery()
+        self.assertTrue(self.breaker.allow_request())
+
+        @g_sheets.record_breaker_outcome
+        async def missing_worksheet():
+            raise g_sheets.gspread.exceptions.WorksheetNotFound("test sheet")
+
+        with self.assertRaises(g_sheets.gspread.exceptions.WorksheetNotFound):
+            await missing_worksheet()
+        self.assertEqual(self.breaker.state, BreakerState.CLOSED)
+        self.assertTrue(self.breaker.allow_request())
+
+    async def test_throttle_rotated_by_pool_does_not_open_breaker(self):
+        pool = SheetsClientPool([SheetsCredential("sa-1", None), SheetsCredential("sa-2", None)], cooldown_seconds=60)
+
+        @g_sheets.record_breaker_outcome
+        async def throttled_write():
+            error = g_sheets.gspread.exceptions.APIError(FakeResponse(429, "Rate limit exceeded."))
+            if pool.record_failure(pool.acquire(), error):
+                error.sheets_pool_rotated = True
+            raise error
+
+        for _ in range(2):
+            with self.assertRaises(g_sheets.gspread.exceptions.APIError):
+                await throttled_write()
+        # Первый 429 пул обошёл, второй пришёлся на последний свободный аккаунт.
+        self.assertEqual(self.breaker.consecutive_failures, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
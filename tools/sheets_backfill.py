@@ -0,0 +1,129 @@
+"""Восстановление листа Google Sheets из локального архива sheets_queue.
+
+Берёт уже записанные строки листа за период (по дате постановки в очередь),
+читает их страницами и либо ставит копии обратно в очередь, либо пишет
+в таблицу напрямую крупными батчами с ограничением частоты запросов.
+
+Запуск из корня проекта:
+    python -m tools.sheets_backfill enqueue --sheet "exit interview" --from 2025-01-01 --to 2025-01-31
+    python -m tools.sheets_backfill write --sheet "exit interview" --from 2025-01-01 --to-sheet "exit interview (копия)"
+
+Режим write пишет в лист по собственному курсору, не согласованному с ботом
+и sheets_worker.py. Если писать в лист, куда они пишут сейчас, записи разных
+процессов затирают друг друга и данные теряются без ошибок. Поэтому write
+работает только с отдельным листом в --to-sheet. Чтобы восстановить сам живой лист,
+используйте enqueue: копии запишет тот же процесс, что пишет остальные строки.
+
+Копии сохраняют ключи строк, поэтому повторный запуск не создаёт дублей в листе.
+Если лист очистили, пока бот работал, бот заметит это не сразу: курсор и ключи
+листа он перечитывает раз в SHEETS_CURSOR_REFRESH_SECONDS. Перед enqueue
+подождите это время или перезапустите бота; режим write читает лист заново.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from datetime import datetime, timedelta
+
+from core import settings, database, g_sheets
+from core.sinks import LOCAL_TIMEZONE
+
+
+def parse_day(value: str) -> datetime:
+    return datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=LOCAL_TIMEZONE)
+
+
+def print_progress(done: int, total: int, last_id: int, started: float):
+    elapsed = time.monotonic() - started
+    rate = done / elapsed if elapsed else 0.0
+    print(f"  {done}/{total} строк ({done * 100 // max(total, 1)}%), последний id {last_id}, {rate:.0f} строк/с")
+
+
+def is_live_sheet(title: str, source_sheet: str) -> bool:
+    """Лист, в который пишут бот и sheets_worker.py, включая его датированные продолжения."""
+    live_sheets = {value for name, value in vars(settings).items() if name.endswith("_SHEET_NAME")} | {source_sheet}
+    return any(title == name or g_sheets.rollover_sort_key(title, name) for name in live_sheets)
+
+
+async def backfill(args):
+    since = parse_day(args.date_from).timestamp()
+    until = (parse_day(args.date_to) + timedelta(days=1)).timestamp() if args.date_to else time.time() + 1
+    target_sheet = args.to_sheet or args.sheet
+    if args.command == "write" and is_live_sheet(target_sheet, args.sheet):
+        print(f"Лист '{target_sheet}' сейчас пополняет бот, прямая запись затрёт его строки. "
+              f"Укажите отдельный лист в --to-sheet или используйте режим enqueue.")
+        sys.exit(2)
+    total = await database.count_sheets_queue_archive(args.sheet, since, until)
+    print(f"Строк в архиве для '{args.sheet}': {total}, режим {args.command}, лист назначения '{target_sheet}'")
+    if not total:
+        return
+
+    sheets_pool = None
+    if args.command == "write":
+        sheets_pool = await g_sheets.init_google_sheets_client()
+        if not sheets_pool:
+            print("Не удалось подключиться к Google Sheets.")
+            sys.exit(1)
+
+    request_interval = 60 / args.requests_per_minute if args.requests_per_minute else 0
+    last_request_at = 0.0
+    after_id, done, skipped = args.after_id, 0, 0
+    started = time.monotonic()
+    try:
+        while True:
+            page = await database.get_sheets_queue_archive_page(args.sheet, since, until, after_id, args.page_size)
+            if not page:
+                break
+
+            wait = last_request_at + request_interval - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            last_request_at = time.monotonic()
+
+            if args.command == "enqueue":
+                if not await database.enqueue_sheets_queue_copies([row['id'] for row in page], target_sheet):
+                    print(f"Ошибка БД. Продолжить можно с --after-id {after_id}")
+                    sys.exit(1)
+            else:
+                items = []
+                for row in page:
+                    try:
+                        items.append({'id': row['id'], 'row': json.loads(row['data_json']), 'row_key': row['row_key']})
+                    except (TypeError, ValueError):
+                        skipped += 1
+                try:
+                    await g_sheets.write_rows_to_sheet(sheets_pool, target_sheet, items)
+                except Exception as e:
+                    print(f"Ошибка записи: {e}\nПродолжить можно с --after-id {after_id}")
+                    sys.exit(1)
+
+            after_id = page[-1]['id']
+            done += len(page)
+            print_progress(done, total, after_id, started)
+    finally:
+        if sheets_pool:
+            await sheets_pool.aclose()
+
+    print(f"Готово: {done} строк" + (f", пропущено битых: {skipped}" if skipped else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Восстановление листа Google Sheets из архива sheets_queue")
+    parser.add_argument("command", choices=["enqueue", "write"],
+                        help="enqueue - поставить копии в очередь, write - записать в таблицу напрямую")
+    parser.add_argument("--sheet", required=True, help="Лист, строки которого берутся из архива")
+    parser.add_argument("--to-sheet", help="Куда писать, если не в тот же лист; для write обязателен и не должен быть живым листом")
+    parser.add_argument("--from", dest="date_from", required=True, help="Первый день, ГГГГ-ММ-ДД")
+    parser.add_argument("--to", dest="date_to", help="Последний день включительно, ГГГГ-ММ-ДД; по умолчанию - сегодня")
+    parser.add_argument("--page-size", type=int, default=500, help="Строк в одной странице и одном запросе")
+    parser.add_argument("--requests-per-minute", type=float, default=30, help="0 - без ограничения")
+    parser.add_argument("--after-id", type=int, default=0, help="Продолжить после этого id очереди")
+
+    args = parser.parse_args()
+    asyncio.run(database.init_db())
+    asyncio.run(backfill(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Просмотр и повторная отправка записей, которые не удалось записать в Google Sheets.
+
+Запуск из корня проекта:
+    python -m tools.sheets_dead_letter list [--sheet NAME] [--limit N]
+    python -m tools.sheets_dead_letter replay [ID ...] [--sheet NAME] [--all]
+"""
+import argparse
+import asyncio
+import sys
+from datetime import datetime
+
+from core import database
+
+
+async def list_items(sheet_name: str | None, limit: int):
+    total = await database.count_sheets_dead_letter()
+    items = await database.get_sheets_dead_letter_items(limit=limit, sheet_name=sheet_name)
+    print(f"В dead letter записей: {total}")
+    for item in items:
+        failed_at = datetime.fromtimestamp(item['failed_at']).strftime("%Y-%m-%d %H:%M:%S")
+        print(f"[{item['id']}] {item['sheet_name']} | попыток: {item['attempts']} | {failed_at}")
+        print(f"    ошибка: {(item['error'] or '')[:300]}")
+        print(f"    данные: {item['data_json'][:300]}")
+
+
+async def replay_items(item_ids: list[int], sheet_name: str | None, replay_all: bool):
+    if not item_ids and not sheet_name and not replay_all:
+        print("Укажите ID записей, --sheet или --all.")
+        sys.exit(1)
+    count = await database.replay_sheets_dead_letter(item_ids or None, sheet_name)
+    print(f"Возвращено в очередь: {count}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dead letter очередь Google Sheets")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    list_parser = subparsers.add_parser("list", help="Показать записи")
+    list_parser.add_argument("--sheet", help="Только записи для указанного листа")
+    list_parser.add_argument("--limit", type=int, default=50)
+
+    replay_parser = subparsers.add_parser("replay", help="Вернуть записи в sheets_queue")
+    replay_parser.add_argument("ids", nargs="*", type=int)
+    replay_parser.add_argument("--sheet", help="Только записи для указанного листа")
+    replay_parser.add_argument("--all", action="store_true", help="Вернуть все записи")
+
+    args = parser.parse_args()
+    asyncio.run(database.init_db())
+    if args.command == "list":
+        asyncio.run(list_items(args.sheet, args.limit))
+    else:
+        asyncio.run(replay_items(args.ids, args.sheet, args.all))
+
+
+if __name__ == "__main__":
+    main()
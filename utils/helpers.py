@@ -23,6 +23,8 @@ from telegram.error import BadRequest, Forbidden, TelegramError
 from telegram.ext import ContextTypes
 
 from core import settings, database
+from core.interacted_users import interacted_users
+from core.ui_state import ui_state
 
 logger = logging.getLogger(__name__)
 
@@ -35,7 +37,7 @@ except ZoneInfoNotFoundError:
 
 async def cleanup_chat(context: ContextTypes.DEFAULT_TYPE, chat_id: int):
     """Удаляет последние N сообщений бота, чтобы очистить чат."""
-    message_ids = context.user_data.pop('last_bot_messages', [])
+    message_ids = ui_state.pop_bot_messages(chat_id)
     for msg_id in message_ids:
         try:
             await context.bot.delete_message(chat_id=chat_id, message_id=msg_id)
@@ -45,10 +47,19 @@ async def cleanup_chat(context: ContextTypes.DEFAULT_TYPE, chat_id: int):
 
 def add_bot_message_to_cleanup_list(context: ContextTypes.DEFAULT_TYPE, message: Message):
     """Добавляет ID сообщения в список для последующей очистки."""
-    if 'last_bot_messages' not in context.user_data:
-        context.user_data['last_bot_messages'] = []
-    context.user_data['last_bot_messages'].append(message.message_id)
-    context.user_data['last_bot_messages'] = context.user_data['last_bot_messages'][-5:]
+    ui_state.add_bot_message(message.chat_id, message.message_id)
+
+
+def set_active_message(message: Message):
+    """Запоминает сообщение, которое send_or_edit_message будет редактировать."""
+    ui_state.set_active_message_id(message.chat_id, message.message_id)
+
+
+def clear_user_state(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Сбрасывает user_data и служебное состояние интерфейса чата."""
+    context.user_data.clear()
+    if update.effective_chat:
+        ui_state.clear(update.effective_chat.id)
 
 
 def get_now() -> datetime:
@@ -112,15 +123,8 @@ async def set_user_commands(user_id: int, bot: Bot):
 
 async def add_user_to_interacted(user_id: int, context: ContextTypes.DEFAULT_TYPE):
     if user_id == 0: return
-    interacted_set = context.bot_data.setdefault("users_interacted", set())
-    if user_id not in interacted_set:
-        interacted_set.add(user_id)
-        logger.info(f"Added user {user_id} to interacted set. Current size: {len(interacted_set)}")
-        if context.application.persistence:
-            try:
-                await context.application.persistence.flush()
-            except Exception as e:
-                logger.error(f"Error flushing persistence after adding user: {e}")
+    if user_id not in interacted_users and await interacted_users.add(user_id):
+        logger.info(f"Added user {user_id} to interacted users. Current size: {len(interacted_users)}")
 
 
 async def safe_answer_callback_query(query: Optional[CallbackQuery]):
@@ -151,7 +155,7 @@ async def send_or_edit_message(
 ):
     chat_id = update.effective_chat.id
     user_message_id = update.message.message_id if update.message else None
-    active_message_id = context.user_data.get(settings.ACTIVE_MESSAGE_ID_KEY)
+    active_message_id = ui_state.active_message_id(chat_id)
     new_message = None
 
     if active_message_id:
@@ -183,7 +187,7 @@ async def send_or_edit_message(
             pass
 
     if new_message:
-        context.user_data[settings.ACTIVE_MESSAGE_ID_KEY] = new_message.message_id
+        set_active_message(new_message)
         add_bot_message_to_cleanup_list(context, new_message)
 
 
@@ -201,7 +205,7 @@ async def send_new_menu_message(
             reply_markup=reply_markup,
             parse_mode=ParseMode.HTML
         )
-        context.user_data[settings.ACTIVE_MESSAGE_ID_KEY] = new_message.message_id
+        set_active_message(new_message)
         add_bot_message_to_cleanup_list(context, new_message)
     except (Forbidden, BadRequest) as e:
         logger.error(f"Failed to send new menu message to {chat_id}: {e}")